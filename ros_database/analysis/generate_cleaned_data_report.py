@@ -1,21 +1,36 @@
 """Generates a listing with file stats on cleaned data
 
 This is to check processing and is not required.
+
+Each station file is read once and all metrics are computed from a single
+set of boolean masks.  Precipitation categories (precip, trace, zero, nan)
+are cross-tabulated against precipitation types with one matrix product.
+Stations are processed in parallel and the report is written as one table.
+
+Usage
+-----
+  python -m ros_database.analysis.generate_cleaned_data_report cleaned_data_report.csv --jobs 8
 """
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import warnings
 from typing import Union, List
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
 #from pandas.errors import DtypeWarning
 
 from ros_database.filepath import SURFOBS_CLEAN_PATH
 from ros_database.processing.surface import load_station_combined_data
+from ros_database.processing.extract_precip_events import PTYPES
 
 
 REQUIRED_COLUMNS = ['relh', 'drct', 'p01i', 'mslp', 't2m', 'd2m', 'wspd',
                     'psurf', 'UP', 'RA', 'FZRA', 'SOLID', 'uwnd', 'vwnd']
 
+PRECIP_CATEGORIES = ['precip', 'trace', 'zero', 'nan']
+
 def is_duplicate_records(df):
     return (df.duplicated() & df.index.duplicated()).any()
 
@@ -49,11 +64,6 @@ def date_range_to_string(df):
     tbeg, tend = get_date_range(df)
     return f"{tbeg.isoformat()}, {tend.isoformat()}"
 
-    
-def any_ptype(df):
-    """Returns a boolean array with True if trace precip"""
-    columns = ['UP', 'FZRA', 'RA', 'SOLID']
-    return df[columns].any(axis=1)
 
 
 def data_and_ptype(df, columns=REQUIRED_COLUMNS):
@@ -125,21 +135,111 @@ def count_ptype_with_precip_isnan(df):
     return (precip_isnan(df) & any_ptype(df)).sum()
 
 
-def get_inventory(fp: Union[str, Path]) --> dict:
-    """Returns an inventory report for a single station"""
-    
-    
-def generate_cleaned_data_report():
-    """Creates a inventory report for cleaned data"""
+def precip_categories(df) -> np.ndarray:
+    """Returns (n, 4) boolean array with columns for PRECIP_CATEGORIES"""
+    return np.column_stack([is_precip(df), is_trace(df),
+                            is_zero_precip(df), precip_isnan(df)])
+
 
+def ptype_indicators(df) -> np.ndarray:
+    """Returns (n, 5) integer array with columns for any ptype and each of
+    PTYPES.  Missing ptype columns are treated as False"""
+    ptypes = df.reindex(columns=PTYPES).fillna(False).astype(bool).to_numpy()
+    return np.column_stack([ptypes.any(axis=1), ptypes]).astype(np.int64)
+
+
+def get_inventory_from_dataframe(df) -> dict:
+    """Returns inventory metrics for a station DataFrame
+
+    Metrics are record count, date range, number of duplicate records,
+    missing values for each of REQUIRED_COLUMNS, counts of each precipitation
+    category and counts of each category with any ptype and with each ptype,
+    e.g. trace_any_ptype, zero_FZRA
+    """
+    inventory = {'nrecord': count_records(df)}
+    if len(df) > 0:
+        inventory['start'], inventory['end'] = get_date_range(df)
+    else:
+        inventory['start'], inventory['end'] = pd.NaT, pd.NaT
+    inventory['nduplicate'] = int((df.duplicated() & df.index.duplicated()).sum())
+
+    missing = df.reindex(columns=REQUIRED_COLUMNS).isna().sum()
+    inventory.update({f'missing_{col}': int(n) for col, n in missing.items()})
+
+    if 'p01i' not in df:
+        df = df.assign(p01i=np.nan)
+    categories = precip_categories(df)
+    ptypes = ptype_indicators(df)
+    inventory.update({f'n{category}': int(n)
+                      for category, n in zip(PRECIP_CATEGORIES, categories.sum(axis=0))})
+    inventory['nany_ptype'] = int(ptypes[:, 0].sum())
+
+    crosstab = categories.T.astype(np.int64) @ ptypes
+    for i, category in enumerate(PRECIP_CATEGORIES):
+        for j, ptype in enumerate(['any_ptype'] + PTYPES):
+            inventory[f'{category}_{ptype}'] = int(crosstab[i, j])
+    return inventory
+
+
+def get_inventory(fp: Union[str, Path]) -> dict:
+    """Returns an inventory report for a single station"""
     warnings.simplefilter("ignore")
-    
-    for fp in SURFOBS_CLEAN_PATH.glob('*.clean.csv'):
+    fp = Path(fp)
+    inventory = {'station': fp.name.split('.')[0]}
+    try:
         df = load_station_combined_data(fp)
-        print(f"{fp.name}, {count_records(df):6d}, "
-              f"{date_range_to_string(df)}, "
-              f"{is_duplicate_records(df)}")
+        inventory.update(get_inventory_from_dataframe(df))
+        inventory['error'] = None
+    except Exception as err:
+        inventory['error'] = f"{type(err).__name__}: {err}"
+    return inventory
+
+
+def generate_cleaned_data_report(outfile: Union[str, Path, None] = None,
+                                 filepaths: Union[List[Path], None] = None,
+                                 jobs: int = 1,
+                                 verbose: bool = False) -> pd.DataFrame:
+    """Creates a inventory report for cleaned data
+
+    :outfile: path to write report as csv.  Report is not written if None
+    :filepaths: station files.  Default is all clean files in SURFOBS_CLEAN_PATH
+    :jobs: number of worker processes
+    :verbose: verbose output
+
+    :returns: DataFrame indexed by station
+    """
+    if filepaths is None:
+        filepaths = sorted(SURFOBS_CLEAN_PATH.glob('*.clean.csv'))
+
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor:
+        mapper = executor.map if executor else map
+        inventories = []
+        for inventory in mapper(get_inventory, filepaths):
+            if verbose: print(f"{inventory['station']}, {inventory.get('nrecord')}, "
+                              f"{inventory.get('start')}, {inventory.get('end')}, "
+                              f"{inventory.get('nduplicate')}")
+            inventories.append(inventory)
+
+    report = pd.DataFrame(inventories)
+    if len(report) > 0:
+        report = report.set_index('station').sort_index()
+    if outfile is not None:
+        Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+        report.to_csv(outfile)
+    return report
 
 
 if __name__ == "__main__":
-    generate_cleaned_data_report()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Creates an inventory report for "
+                                     f"cleaned data in {SURFOBS_CLEAN_PATH}")
+    parser.add_argument("outfile", type=str,
+                        help="Path to write report as csv")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of worker processes (default 1)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    generate_cleaned_data_report(args.outfile, jobs=args.jobs, verbose=args.verbose)
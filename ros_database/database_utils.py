@@ -1,3 +1,5 @@
+from functools import partial
+
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -6,9 +8,20 @@ import matplotlib.dates as mdates
 
 import numpy as np
 import pandas as pd
+import xarray as xr
+
+from ros_database.processing.surface import (read_iowa_mesonet_file, load_station_metadata,
+                                             read_station_columns)
+from ros_database.processing.file_cache import cached_map
+from ros_database.processing.extract_precip_events import PTYPES
+from ros_database.filepath import SURFOBS_HOURLY_PATH, SURFOBS_REPORT_PATH
+
+SEASONS = {
+    "winter": [10, 11, 12, 1, 2, 3, 4],
+    "all": list(range(1, 13)),
+    }
 
-from ros_database.processing.surface import read_iowa_mesonet_file, load_station_metadata
-from ros_database.filepath import SURFOBS_HOURLY_PATH
+PTYPE_COUNT_CACHE = SURFOBS_REPORT_PATH / "monthly_ptype_counts.cache.pkl"
 
 # Datbase analysis
 def get_name(df):
@@ -29,18 +42,175 @@ def make_observation_counts(station_paths, columns=["t2m"], outfile="aross.datab
     counts_all.to_csv(outfile)
 
 
-def make_station_event_counts(season="winter"):
-    """Count number of events per station by type"""
+def daily_observation_counts(fp, columns=["t2m"]):
+    """Counts valid observations per day reading only the time index and columns
+
+    :fp: path to station file
+    :columns: observations are valid if all columns are valid
+
+    :returns: first day as days since 1970-01-01 and array of daily counts
+    """
+    df = read_station_columns(fp, columns)
+    valid = df.reindex(columns=columns).notna().all(axis=1).to_numpy()
+    days = df.index.values.astype("datetime64[D]").astype(np.int64)
+    if len(days) == 0:
+        return 0, np.zeros(0, dtype=np.int16)
+    first = days.min()
+    counts = np.bincount(days[valid] - first, minlength=days.max() - first + 1)
+    return first, counts.astype(np.int16)
+
+
+def _stack_records(results, trailing_shape, dtype):
+    """Stacks per-station (start, counts) records on a common period axis
+
+    :results: dict of (start, counts) for each station, where start is the
+              first period as an integer and counts has shape
+              (nperiod,) + trailing_shape
+    :trailing_shape: shape of counts after the period axis
+    :dtype: dtype of stacked array
+
+    :returns: first and last (exclusive) periods and array with shape
+              (last - first, nstation) + trailing_shape.  Periods outside a
+              station record are zero
+    """
+    records = [(start, len(counts)) for start, counts in results.values() if len(counts) > 0]
+    first = min((start for start, _ in records), default=0)
+    last = max((start + n for start, n in records), default=0)
+
+    stacked = np.zeros((last - first, len(results)) + tuple(trailing_shape), dtype=dtype)
+    for j, (start, counts) in enumerate(results.values()):
+        stacked[start - first:start - first + len(counts), j] = counts
+    return first, last, stacked
+
+
+def make_observation_count_matrix(station_paths, columns=["t2m"],
+                                  outfile="aross.database.daily_observation_counts.npz",
+                                  cache_path=None, jobs=1, progress=False):
+    """Writes a compact day by station matrix of daily observation counts
+
+    Counts are int16, with zero for days outside a station record.  The npz
+    file contains counts, days (datetime64[D]), stations and columns.  Load
+    with load_observation_count_matrix.
+
+    :station_paths: list of station files
+    :columns: observations are valid if all columns are valid
+    :outfile: path to npz file
+    :cache_path: path to per-station cache, see ros_database.processing.file_cache
+    :jobs: number of worker processes
+    """
+    results = cached_map(partial(daily_observation_counts, columns=list(columns)),
+                         station_paths, cache_path=cache_path,
+                         params={"columns": list(columns)}, jobs=jobs, progress=progress)
+    stations = np.array([fp.name.split(".")[0] for fp in results])
+    first, last, matrix = _stack_records(results, (), np.int16)
+    np.savez_compressed(outfile, counts=matrix,
+                        days=np.arange(first, last).astype("datetime64[D]"),
+                        stations=stations, columns=np.array(columns))
+    return outfile
+
+
+def load_observation_count_matrix(fp="aross.database.daily_observation_counts.npz"):
+    """Loads daily observation counts as a DataFrame indexed by day with a
+    column for each station, as used by heatmap"""
+    with np.load(fp) as npz:
+        return pd.DataFrame(npz["counts"],
+                            index=pd.DatetimeIndex(npz["days"], name="time"),
+                            columns=npz["stations"])
+
 
-    # Get station metadata
-    indices = []
-    data = []
-    for fp in SURFOBS_HOURLY_PATH.glob("*.hourly.csv"):
-        df = read_iowa_mesonet_file(fp) 
-        indices.append(get_stationid(df)) 
-        data.append(get_total_events(df, season))
+def monthly_ptype_counts(fp):
+    """Counts hours with each precipitation type per month reading only the
+    time index and PTYPES columns
 
-    total_events = pd.DataFrame(data, index=indices)
+    :fp: path to hourly station file
+
+    :returns: first month as months since 1970-01 and (nmonth, nptype) array
+              of hour counts
+    """
+    df = read_station_columns(fp, PTYPES)
+    ptypes = df.reindex(columns=PTYPES).fillna(False).astype(bool).to_numpy()
+    months = df.index.values.astype("datetime64[M]").astype(np.int64)
+    if len(months) == 0:
+        return 0, np.zeros((0, len(PTYPES)), dtype=np.int16)
+    first = months.min()
+    nmonth = months.max() - first + 1
+    counts = np.column_stack([np.bincount(months[ptypes[:, i]] - first, minlength=nmonth)
+                              for i in range(len(PTYPES))])
+    return first, counts.astype(np.int16)
+
+
+def make_ptype_count_cube(station_paths=None,
+                          outfile="aross.database.monthly_ptype_counts.nc",
+                          cache_path=PTYPE_COUNT_CACHE, jobs=1, progress=False):
+    """Makes a month by station by ptype cube of precipitation type hour counts
+
+    Per-station counts are cached with the modification time and size of each
+    hourly file, see ros_database.processing.file_cache, so updating the cube
+    only reads stations that changed.  Months outside a station record are
+    zero.
+
+    :station_paths: list of hourly station files.  Default is all files in
+                    SURFOBS_HOURLY_PATH
+    :outfile: path to write cube as netcdf.  Not written if None
+    :cache_path: path to per-station cache.  No cache is used if None
+    :jobs: number of worker processes
+
+    :returns: xarray.DataArray with dimensions (month, station, ptype)
+    """
+    if station_paths is None:
+        station_paths = sorted(SURFOBS_HOURLY_PATH.glob("*.hourly.csv"))
+    results = cached_map(monthly_ptype_counts, station_paths, cache_path=cache_path,
+                         jobs=jobs, progress=progress)
+    stations = [fp.name.split(".")[0] for fp in results]
+    first, last, cube = _stack_records(results, (len(PTYPES),), np.int16)
+    months = np.arange(first, last).astype("datetime64[M]").astype("datetime64[ns]")
+    da = xr.DataArray(cube, dims=["month", "station", "ptype"],
+                      coords={"month": months, "station": stations, "ptype": PTYPES},
+                      name="ptype_hours",
+                      attrs={"long_name": "number of hours with precipitation type in month"})
+    if outfile is not None:
+        da.to_netcdf(outfile, encoding={"ptype_hours": {"zlib": True}})
+    return da
+
+
+def load_ptype_count_cube(fp="aross.database.monthly_ptype_counts.nc"):
+    """Loads month by station by ptype hour count cube"""
+    with xr.open_dataarray(fp) as da:
+        return da.load()
+
+
+def season_ptype_counts(cube, season="winter", years=None):
+    """Sums ptype hour counts over months in a season
+
+    :cube: DataArray from make_ptype_count_cube
+    :season: name of season in SEASONS or a list of months, e.g. [12, 1, 2]
+    :years: optional (start, end) years, inclusive, selecting months by
+            calendar year
+
+    :returns: DataFrame indexed by station with a column for each ptype
+    """
+    months = SEASONS[season] if isinstance(season, str) else list(season)
+    if years is not None:
+        cube = cube.sel(month=slice(str(years[0]), str(years[-1])))
+    in_season = cube.month.dt.month.isin(months).values
+    counts = cube.isel(month=in_season).sum("month").astype(np.int64)
+    return counts.to_pandas()
+
+
+def make_station_event_counts(season="winter", cube=None, cache_path=PTYPE_COUNT_CACHE,
+                              jobs=1):
+    """Count number of events per station by type
+
+    Counts are reduced from the monthly ptype count cube, which is updated for
+    changed hourly files.
+
+    :season: name of season in SEASONS or a list of months
+    :cube: month by station by ptype DataArray.  Default is make_ptype_count_cube
+    """
+    if cube is None:
+        cube = make_ptype_count_cube(outfile=None, cache_path=cache_path, jobs=jobs)
+    total_events = season_ptype_counts(cube, season=season)
+    total_events.columns.name = None
     # Generate summary columns for Rain on Snow (ROS) and Total number of events
     total_events["ROS"] = total_events[["RA","FZRA"]].sum(axis=1)
     total_events["Total"] = total_events[["RA","FZRA","SOLID"]].sum(axis=1)
@@ -48,7 +218,8 @@ def make_station_event_counts(season="winter"):
     # Get station metadata and merge coordinates with total_events
     stations = load_station_metadata()
     total_events = total_events.join(stations[['longitude', 'latitude']])
-    total_events.to_csv(f"station_event_counts_{season}.csv")
+    name = season if isinstance(season, str) else "".join(f"{m:02d}" for m in season)
+    total_events.to_csv(f"station_event_counts_{name}.csv")
 
 
 def get_total_events(df, season): 
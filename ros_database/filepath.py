@@ -32,16 +32,30 @@ SURFOBS_CLEAN_PATH = SURFOBS_PATH / "clean"
 SURFOBS_HOURLY_PATH = SURFOBS_PATH / "hourly"
 # Path to combined surface obs path
 SURFOBS_COMBINED_PATH = SURFOBS_PATH / "combined"
+# Path to combined surface obs joined with reanalysis station series
+SURFOBS_REANALYSIS_COMBINED_PATH = SURFOBS_PATH / "combined_reanalysis"
+# Path to snow on ground for stations merged from multiple sources
+STATIONS_SNOW_ON_GROUND = SURFOBS_PATH / "snow_on_ground" / "stations.snow_on_ground.nc"
 # Paths to ASOS station events database
 SURFOBS_EVENTS_PATH = SURFOBS_PATH / "events"
+# Consolidated catalog of events for all stations
+SURFOBS_EVENT_CATALOG = SURFOBS_PATH / "event_catalog" / "aross.events.sqlite"
+# Database reports and cached per-station aggregates
+SURFOBS_REPORT_PATH = SURFOBS_PATH / "reports"
 
 # Reanalysis data extracted for stations
 STATIONS_SURFACE_REANALYSIS = ERA5_DATAPATH / 'surface' / 'stations' / 'hourly'
 STATIONS_UPPER_AIR_REANALYSIS = ERA5_DATAPATH / 'pressure_levels' / 'stations' / 'hourly'
+# Reanalysis daily climatology extracted for stations
+STATIONS_CLIMATOLOGY = ERA5_DATAPATH / 'climatology' / 'stations'
 
 # IMS Snow cover files
 # IMS_PATH = AROSS_PATH / 'IMS_Daily_NorthernHemisphere_Snow' / 'original' / '4km'
 IMS_PATH = AROSS_PATH / '..' / 'ims_snowcover'
+# Cached IMS land masks
+IMS_LAND_MASK_PATH = IMS_PATH / 'land_mask'
+# Gridded IMS time cubes cropped to the station domain
+IMS_CUBE_PATH = IMS_PATH / 'cube'
 
 # ASOS metadata path
 ASOS_METADATA_PATH = SURFOBS_PATH / 'metadata' / 'aross.asos_stations.metadata.csv'
@@ -0,0 +1,10 @@
+"""IMS surface codes
+
+Codes are the flag values of IMS_Surface_Values in IMS netcdf files and the
+digits in ASCII grids.  0 is used for missing values.
+"""
+MISSING = 0
+OPEN_SEA = 1
+LAND = 2
+SEA_ICE = 3
+SNOW = 4
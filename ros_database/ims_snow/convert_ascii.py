@@ -0,0 +1,145 @@
+"""Batch conversion of IMS ASCII grids to NetCDF or to the IMS Zarr cube
+
+IMS data before 2004 (24 km) and before 2014 (4 km) are only available as
+gzipped ASCII grids.  Files are decoded in a process pool and either written
+as per-day CF NetCDF files, with uint8 surface codes and compression, or
+appended to the gridded IMS cube for the station domain.
+
+Usage
+-----
+To convert 24 km files to NetCDF
+
+  python -m ros_database.ims_snow.convert_ascii /path/to/ims*_24km_*.asc.gz --outdir /path/to/netcdf
+
+To append 24 km files to the cube
+
+  python -m ros_database.ims_snow.convert_ascii /path/to/ims*_24km_*.asc.gz --to zarr --resolution 24km
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Union
+import warnings
+
+import xarray as xr
+
+from ros_database.ims_snow.get_snow_cover import load_ascii_grid, timestamp_from_filepath
+from ros_database.ims_snow.cube import build_cube
+
+FORMATS = ["netcdf", "zarr"]
+
+MAX_WORKERS = 4
+
+
+def netcdf_filepath(filepath: Union[str, Path],
+                    outdir: Union[str, Path, None] = None) -> Path:
+    """Returns path to NetCDF file for an ASCII file"""
+    filepath = Path(filepath)
+    outdir = filepath.parent if outdir is None else Path(outdir)
+    return outdir / filepath.name.replace(".asc.gz", ".nc")
+
+
+def convert_ascii_file(filepath: Union[str, Path],
+                       outdir: Union[str, Path, None] = None,
+                       clobber: bool = False) -> Path:
+    """Converts an IMS ASCII file to CF NetCDF
+
+    :returns: path to NetCDF file
+    """
+    fout = netcdf_filepath(filepath, outdir=outdir)
+    if fout.exists() and not clobber:
+        return fout
+    ds = load_ascii_grid(filepath)
+    fout.parent.mkdir(parents=True, exist_ok=True)
+    ds.to_netcdf(fout)
+    return fout
+
+
+def open_ascii_surface_cover(filepath: Union[str, Path]) -> xr.DataArray:
+    """Returns surface cover from an IMS ASCII file as a (time, y, x) DataArray"""
+    da = load_ascii_grid(filepath).surface_cover
+    return da.drop_vars([c for c in da.coords if c not in da.dims])
+
+
+def convert_ascii_files(filepaths: List[Union[str, Path]],
+                        to: str = "netcdf",
+                        outdir: Union[str, Path, None] = None,
+                        resolution: str = "24km",
+                        store: Union[str, Path, None] = None,
+                        lon=None,
+                        lat=None,
+                        jobs: int = MAX_WORKERS,
+                        clobber: bool = False,
+                        verbose: bool = False) -> dict:
+    """Converts IMS ASCII files to per-day NetCDF or appends them to the IMS cube
+
+    Parameters
+    ----------
+    filepaths : list of paths to gzipped ASCII files
+    to : netcdf or zarr
+    outdir : directory for NetCDF files.  Default is directory of each file
+    resolution : grid resolution of files, used for zarr
+    store : path to Zarr store.  Default is ros_database.ims_snow.cube.cube_filepath
+    lon : station longitudes used to crop the cube.  Default loads station metadata
+    lat : station latitudes
+    jobs : number of worker processes
+    clobber : overwrite existing NetCDF files
+    verbose : verbose output
+
+    Returns
+    -------
+    dict with filepath keys and output path or exception values
+    """
+    if to not in FORMATS:
+        raise ValueError(f"Unknown format {to}: expects one of {FORMATS}")
+
+    if to == "zarr":
+        catalog = {timestamp_from_filepath(fp).strftime("%Y-%m-%d"): fp
+                   for fp in filepaths}
+        store = build_cube(catalog, resolution=resolution, lon=lon, lat=lat,
+                           store=store, opener=open_ascii_surface_cover, jobs=jobs,
+                           verbose=verbose)
+        return {fp: store for fp in filepaths}
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(convert_ascii_file, fp, outdir=outdir, clobber=clobber): fp
+            for fp in filepaths
+            }
+        for future in as_completed(futures):
+            fp = futures[future]
+            try:
+                results[fp] = future.result()
+            except Exception as err:
+                warnings.warn(f"Failed to convert {fp}: {err}", UserWarning)
+                results[fp] = err
+                continue
+            if verbose: print(f"Converted {fp} to {results[fp]}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Converts IMS ASCII grids to "
+                                     "NetCDF or appends them to the IMS cube")
+    parser.add_argument("filepaths", type=str, nargs="+",
+                        help="Gzipped IMS ASCII files")
+    parser.add_argument("--to", type=str, default="netcdf", choices=FORMATS,
+                        help="Output format")
+    parser.add_argument("--outdir", type=str, default=None,
+                        help="Directory for NetCDF files")
+    parser.add_argument("--resolution", type=str, default="24km",
+                        choices=["24km", "4km"],
+                        help="Grid resolution of files, used for zarr")
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS,
+                        help=f"Number of worker processes (default {MAX_WORKERS})")
+    parser.add_argument("--clobber", action="store_true",
+                        help="Overwrite existing NetCDF files")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    convert_ascii_files(args.filepaths, to=args.to, outdir=args.outdir,
+                        resolution=args.resolution, jobs=args.jobs,
+                        clobber=args.clobber, verbose=args.verbose)
@@ -0,0 +1,216 @@
+"""Gridded IMS time cube for the station domain
+
+Daily IMS grids are cropped to the bounding box of the stations, plus a
+buffer, and appended to a single chunked and compressed Zarr store with
+dimensions (time, y, x) and uint8 surface codes.  Dates already in the cube
+are skipped, so the cube can be updated daily.
+
+Usage
+-----
+To build or update the 4 km cube
+
+  python -m ros_database.ims_snow.cube --resolution 4km --verbose
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import fsspec
+import numpy as np
+import pandas as pd
+import xarray as xr
+from numcodecs import Blosc
+
+from ros_database.filepath import IMS_CUBE_PATH
+from ros_database.ims_snow.codes import MISSING
+from ros_database.ims_snow.ims_crs import Grid, IMS24Grid, IMS4kmGrid, IMS1kmGrid
+from ros_database.ims_snow.land_mask import load_land_mask, nearest_land_pixel
+
+GRIDS = {
+    "24km": IMS24Grid,
+    "4km": IMS4kmGrid,
+    "1km": IMS1kmGrid,
+    }
+
+VARIABLE = "surface_cover"
+
+# Chunks are long in time so that regional queries and animations read
+# contiguous time slices
+CHUNKS = {"time": 32, "y": 256, "x": 256}
+
+COMPRESSOR = Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE)
+
+# Buffer around station bounding box in pixels
+BUFFER = 10
+
+ATTRS = {
+    "long_name": "snow and ice cover",
+    "standard_name": "area_type",
+    "flag_values": [1, 2, 3, 4],
+    "flag_meanings": "ice_free_sea snow_free_land lake_ice_or_sea_ice snow",
+    "comments": "ice_free_sea includes inland and marine water surfaces",
+    }
+
+
+def cube_filepath(resolution: str = "4km",
+                  path: Union[str, Path] = IMS_CUBE_PATH) -> Path:
+    """Returns path to IMS cube for a resolution"""
+    return Path(path) / f"ims.surface_cover.{resolution}.stations.zarr"
+
+
+def station_bbox(grid: Grid, lon, lat, buffer: int = BUFFER,
+                 land_mask: Union[np.ndarray, None] = None) -> Tuple[int]:
+    """Returns pixel bounding box (col0, col1, row0, row1) containing stations.
+    col1 and row1 are exclusive.  If land_mask is given, the bounding box also
+    contains the nearest land pixel to each station"""
+    cols, rows = grid.lonlat_to_index(lon, lat)
+    if land_mask is not None:
+        land_cols, land_rows, _ = nearest_land_pixel(land_mask, grid, cols, rows)
+        cols, rows = np.concatenate([cols, land_cols]), np.concatenate([rows, land_rows])
+    col0 = max(cols.min() - buffer, 0)
+    col1 = min(cols.max() + buffer + 1, grid.ncol)
+    row0 = max(rows.min() - buffer, 0)
+    row1 = min(rows.max() + buffer + 1, grid.nrow)
+    return int(col0), int(col1), int(row0), int(row1)
+
+
+def crop_to_bbox(da: xr.DataArray, grid: Grid, bbox: Tuple[int]) -> xr.DataArray:
+    """Crops an IMS DataArray to a pixel bounding box of grid
+
+    The result has y in the same order as grid rows, whatever the order of y
+    in da.  Values masked when da was decoded are set to MISSING."""
+    col0, col1, row0, row1 = bbox
+    da = da.sel(x=grid.x[col0:col1], y=grid.y[row0:row1], method="nearest")
+    da = da.assign_coords(x=grid.x[col0:col1], y=grid.y[row0:row1])
+    return da.transpose("time", "y", "x").fillna(MISSING).astype(np.uint8)
+
+
+def open_ims_file(href: str, variable: str = "IMS_Surface_Values") -> xr.DataArray:
+    """Returns IMS surface values from a local or remote, optionally gzipped,
+    netcdf file"""
+    with fsspec.open(href, compression="infer") as f:
+        with xr.open_dataset(f) as ds:
+            da = ds[variable].load()
+    return da.drop_vars([c for c in da.coords if c not in da.dims])
+
+
+def cube_dates(store: Union[str, Path]) -> pd.DatetimeIndex:
+    """Returns dates in the cube.  Empty if the cube does not exist"""
+    if not Path(store).exists():
+        return pd.DatetimeIndex([])
+    with xr.open_zarr(store) as ds:
+        return pd.DatetimeIndex(ds.time.values).normalize()
+
+
+def append_to_cube(da: xr.DataArray,
+                   store: Union[str, Path],
+                   chunks: Dict[str, int] = CHUNKS) -> None:
+    """Appends a (time, y, x) DataArray to the cube.  The cube is created if it
+    does not exist"""
+    ds = da.rename(VARIABLE).to_dataset()
+    if Path(store).exists():
+        ds.to_zarr(store, mode="a", append_dim="time")
+        return
+    ds[VARIABLE].attrs = ATTRS
+    encoding = {
+        VARIABLE: {
+            "chunks": tuple(chunks[dim] for dim in ("time", "y", "x")),
+            "compressor": COMPRESSOR,
+            "dtype": "uint8",
+            "_FillValue": MISSING,
+            },
+        "time": {"units": "days since 1997-01-01", "dtype": "int32"},
+        }
+    Path(store).parent.mkdir(parents=True, exist_ok=True)
+    ds.to_zarr(store, mode="w", encoding=encoding)
+
+
+def build_cube(catalog: Dict[str, str],
+               resolution: str = "4km",
+               lon=None,
+               lat=None,
+               store: Union[str, Path, None] = None,
+               buffer: int = BUFFER,
+               batch_size: int = CHUNKS["time"],
+               opener=open_ims_file,
+               jobs: int = 1,
+               land_remap: bool = False,
+               verbose: bool = False) -> Path:
+    """Builds or updates an IMS cube cropped to the station domain
+
+    Parameters
+    ----------
+    catalog : dict of date strings (YYYY-MM-DD) and hrefs, see
+              ros_database.ims_snow.load._build_catalog
+    resolution : IMS grid resolution
+    lon : station longitudes.  Default loads station metadata
+    lat : station latitudes
+    store : path to Zarr store.  Default is cube_filepath(resolution)
+    buffer : buffer around station bounding box in pixels
+    batch_size : number of days appended at once
+    opener : callable returning a (time, y, x) DataArray for an href
+    jobs : number of processes used to open and decode files.  opener must be
+           picklable if jobs > 1
+    land_remap : include the nearest land pixel to each station in the cube.
+                 Requires a land mask for the resolution
+    verbose : verbose output
+
+    Returns
+    -------
+    path to Zarr store
+    """
+    grid = GRIDS[resolution]
+    store = cube_filepath(resolution) if store is None else Path(store)
+    if lon is None:
+        from ros_database.processing.surface import load_station_metadata
+        stations = load_station_metadata()
+        lon, lat = stations.longitude.values, stations.latitude.values
+    mask = load_land_mask(resolution) if land_remap else None
+    bbox = station_bbox(grid, lon, lat, buffer=buffer, land_mask=mask)
+
+    existing = cube_dates(store)
+    dates = sorted(date for date in catalog if pd.Timestamp(date) not in existing)
+    if verbose: print(f"Appending {len(dates)} days to {store}")
+
+    # Files are decoded in worker processes and appended in the main process
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor:
+        mapper = executor.map if executor else map
+        for i in range(0, len(dates), batch_size):
+            hrefs = [catalog[date] for date in dates[i:i+batch_size]]
+            batch = [crop_to_bbox(da, grid, bbox) for da in mapper(opener, hrefs)]
+            append_to_cube(xr.concat(batch, dim="time"), store)
+            if verbose: print(f"   Appended {dates[i]} to {dates[i:i+batch_size][-1]}")
+    return store
+
+
+def load_cube(resolution: str = "4km",
+              store: Union[str, Path, None] = None) -> xr.Dataset:
+    """Opens an IMS cube lazily.  Codes are kept as uint8, with 0 for missing"""
+    store = cube_filepath(resolution) if store is None else store
+    return xr.open_zarr(store, mask_and_scale=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ros_database.ims_snow.load import _build_catalog
+
+    parser = argparse.ArgumentParser(description="Builds or updates a gridded IMS "
+                                     "cube for the station domain")
+    parser.add_argument("--resolution", type=str, default="4km",
+                        choices=["1km", "4km"],
+                        help="IMS grid resolution")
+    parser.add_argument("--buffer", type=int, default=BUFFER,
+                        help="Buffer around station bounding box in pixels")
+    parser.add_argument("--land_remap", action="store_true",
+                        help="Include the nearest land pixel to each station")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of processes used to open and decode files")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    catalog = _build_catalog(fsspec.filesystem("https"), "netcdf", args.resolution)
+    build_cube(catalog, resolution=args.resolution, buffer=args.buffer,
+               jobs=args.jobs, land_remap=args.land_remap, verbose=args.verbose)
@@ -1,5 +1,8 @@
 """Extract IMS snow cover data"""
 
+import re
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from urllib.error import HTTPError
 
@@ -14,24 +17,45 @@ import geopandas
 from pqdm.threads import pqdm
 
 from ros_database.ims_snow.load import _build_catalog
-from ros_database.ims_snow.ims_crs import IMS24Grid
+from ros_database.ims_snow.ims_crs import Grid, IMS24Grid, IMS4kmGrid
+from ros_database.ims_snow.sampling import window_indices, gather, window_statistics
+from ros_database.ims_snow import land_mask
 from ros_database.processing.surface import load_station_metadata
 
 fs = fsspec.filesystem("https")
 
+# ASCII grids are identified by number of columns
+GRID_FOR_NCOL = {
+    IMS24Grid.ncol: IMS24Grid,
+    IMS4kmGrid.ncol: IMS4kmGrid,
+    }
 
-def read_ims_ascii(filepath, with_header=False):
-    """Reads an IMS ASCII data file and returns a numpy.ndarray"""
-    nrow = 1024
-    ncol = 1024
+GRID_MAPPING_NAME = "ims_polar_stereographic"
 
-    # Add an opener lookup function
-    
-    with gzip.open(filepath, 'r') as f:
-        content = f.read().decode("ascii")
-    header = [line for line in content.split("\n") if (len(line) > 0) & (len(line) < nrow)]
-    data = np.array([list(line) for line in content.split("\n")
-                     if len(line) == nrow], dtype=float)
+# Grids with land masks are identified by number of columns
+LAND_MASK_RESOLUTION_FOR_NCOL = {grid.ncol: resolution
+                                 for resolution, grid in land_mask.GRIDS.items()}
+
+
+def read_ims_ascii(filepath, with_header=False, dtype=float):
+    """Reads an IMS ASCII data file and returns a numpy.ndarray
+
+    Grid size is taken from the data rows, so 24 km (1024 x 1024) and
+    4 km (6144 x 6144) files are both read.  Header lines are shorter than
+    data rows.
+
+    :filepath: path or url to gzipped ASCII file
+    :with_header: return header lines as well as data
+    :dtype: dtype of returned array
+    """
+    with fsspec.open(filepath, "rb", compression="infer") as f:
+        content = f.read()
+    lines = [line.rstrip(b"\r") for line in content.split(b"\n")]
+    ncol = max(len(line) for line in lines)
+    header = [line.decode("ascii") for line in lines if 0 < len(line) < ncol]
+    rows = [line for line in lines if len(line) == ncol]
+    data = (np.frombuffer(b"".join(rows), dtype=np.uint8) - ord("0")).reshape(len(rows), ncol)
+    data = data.astype(dtype)
     if with_header:
         return header, data
     else:
@@ -40,50 +64,53 @@ def read_ims_ascii(filepath, with_header=False):
 
 def timestamp_from_filepath(filepath: Path) -> datetime:
     """Parses filepath to get timestamp"""
-    m = re.search(r"ims(\d{7}_\d{2})UTC", filepath.name)
+    name = Path(filepath).name
+    m = re.search(r"ims(\d{7}_\d{2})UTC", name)
     if m:
-        time = datetime.strptime(m.groups()[0], "%Y%j_%H")  #.replace(tzinfo=timezone.utc)
-    else:
-        raise ValueError("Unable to find timestamp-like string in {filepath.name}")
-    return time
+        return datetime.strptime(m.groups()[0], "%Y%j_%H")  #.replace(tzinfo=timezone.utc)
+    m = re.search(r"ims(\d{7})_", name)
+    if m:
+        return datetime.strptime(m.groups()[0], "%Y%j")
+    raise ValueError(f"Unable to find timestamp-like string in {name}")
+
 
+@lru_cache(maxsize=None)
+def ascii_grid_coords(ncol: int):
+    """Returns x and y coordinate DataArrays and grid for ASCII grids with ncol
+    columns.  Coordinates are computed once for each grid"""
+    grid = GRID_FOR_NCOL[ncol]
+    x_attrs, y_attrs = grid.crs.coordinate_system.to_cf()
+    x = xr.DataArray(grid.x, dims=["x"], attrs=x_attrs)
+    y = xr.DataArray(grid.y, dims=["y"], attrs=y_attrs)
+    return x, y, grid
 
-def load_ascii_grid(f):
+
+def load_ascii_grid(filepath):
     """Loads an IMS ASCII dataset
 
     Data before 2004 are in ASCII grids
 
     Parameters
     ----------
-    f : file-like object to be passed to reader
+    filepath : path or url to gzipped ASCII file
 
     Returns
     -------
     xarray.Dataset with rio accessors
     """
-    data = read_ims_ascii(f)
+    data = read_ims_ascii(filepath, dtype=np.uint8)
 
-    # Calculate x and y coordinates
-    x, y = IMS24Grid.xy_coords()
-    # Create x, y coordinates as DataArray
-    x = xr.DataArray(x, coords={'x': x}, attrs=IMS24Grid.crs.coordinate_system.to_cf()[0])
-    y = xr.DataArray(y, coords={'y': y}, attrs=IMS24Grid.crs.coordinate_system.to_cf()[1])
+    # Coordinates are cached for each grid size
+    x, y, grid = ascii_grid_coords(data.shape[1])
 
-    # Add coords
-    ds = ds.assign_coords(x=x, y=y)
-    
-    # Extract timestamp from filepath and add as time coordinate
-    time = [timestamp_from_filepath(filepath)]
-    ds = ds.expand_dims(dim={"time": 1}, axis=0)
-    ds["time"] = [timestamp_from_filepath(filepath)]
+    ds = xr.Dataset(
+        {"surface_cover": (("time", "y", "x"), data[np.newaxis, ...])},
+        coords={"time": [timestamp_from_filepath(filepath)], "x": x, "y": y},
+        )
     ds.time.attrs = {
         "long_name": "time",
         }
     
-    # Add CRS
-    grid_mapping_name = "ims_polar_stereographic"
-    ds.rio.write_crs(IMS24Grid.crs, grid_mapping_name=grid_mapping_name, inplace=True)
-
     # Add attributes
     attrs = {
         "long_name": "snow and ice cover",
@@ -108,18 +135,35 @@ def load_ascii_grid(f):
     ds.surface_cover.attrs = attrs
     ds = ds.assign_attrs(global_attrs)
 
+    # Add CRS
+    ds.rio.write_crs(grid.crs, grid_mapping_name=GRID_MAPPING_NAME, inplace=True)
+
     ds.surface_cover.encoding.update({
         "_FillValue": 0,
-        "dtype": 'byte',
-        "grid_mapping": grid_mapping_name,
+        "dtype": "uint8",
+        "zlib": True,
+        "complevel": 4,
         })
 
     return ds
 
 
+def remap_to_land(ds: xr.Dataset,
+                  x: xr.DataArray,
+                  y: xr.DataArray):
+    """Returns x and y moved to the nearest land pixel centres in the land
+    mask for the grid of ds.  See ros_database.ims_snow.land_mask"""
+    resolution = LAND_MASK_RESOLUTION_FOR_NCOL.get(ds.sizes["x"])
+    if resolution is None:
+        raise ValueError(f"No land mask for IMS grid with {ds.sizes['x']} columns")
+    land_x, land_y = land_mask.remap_xy_to_land(x.values, y.values, resolution=resolution)
+    return x.copy(data=land_x), y.copy(data=land_y)
+
+
 def extract_from_dataset(ds: xr.Dataset,
                          x: xr.DataArray,
-                         y: xr.DataArray) -> pd.DataFrame:
+                         y: xr.DataArray,
+                         land_remap: bool = False) -> pd.DataFrame:
     """Extracts IMS surface values for a set of coordinates from
     an xarray.Dataset
 
@@ -128,17 +172,66 @@ def extract_from_dataset(ds: xr.Dataset,
     ds : xarray.Dataset
     x : xarray.DataArray containing x coordinates
     y : xarray.DataArray containing y coordinates
+    land_remap : sample the nearest land pixel to each coordinate
 
     Returns
     -------
     pandas DataFrame
     """
+    if land_remap:
+        x, y = remap_to_land(ds, x, y)
     var_to_drop = ['x','y','projection']
     ims_surface = ds.IMS_Surface_Values.sel(x=x, y=y, method='nearest')
     df = ims_surface.drop_vars(var_to_drop).to_dataframe()
     return df.unstack(level=-1)
 
 
+def coords_to_colrow(ds: xr.Dataset,
+                     x: xr.DataArray,
+                     y: xr.DataArray):
+    """Returns column and row indices of the pixels containing x and y
+    in the grid of ds.  Points outside the grid are -1"""
+    grid = Grid.from_xy(ds.x.values, ds.y.values)
+    return grid.xy_to_index(x.values, y.values, check_bounds=False)
+
+
+def extract_windows_from_dataset(ds: xr.Dataset,
+                                 x: xr.DataArray,
+                                 y: xr.DataArray,
+                                 size: int = 3,
+                                 land_remap: bool = False) -> pd.DataFrame:
+    """Extracts majority class and land snow fraction for windows of IMS
+    surface values around a set of coordinates
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+    x : xarray.DataArray containing x coordinates with station dimension
+    y : xarray.DataArray containing y coordinates with station dimension
+    size : window size, e.g. 3 for a 3x3 window
+    land_remap : centre windows on the nearest land pixel to each coordinate
+
+    Returns
+    -------
+    pandas DataFrame indexed by time with majority and snow_fraction columns
+    for each station
+    """
+    if land_remap:
+        x, y = remap_to_land(ds, x, y)
+    grid = Grid.from_xy(ds.x.values, ds.y.values)
+    cols, rows = grid.xy_to_index(x.values, y.values, check_bounds=False)
+    flat_index = window_indices(cols, rows, grid, size=size)
+    surface = ds.IMS_Surface_Values.transpose("time", "y", "x").values
+    majority, snow_fraction = window_statistics(gather(surface, flat_index))
+    stations = x.station.values
+    return pd.concat(
+        {
+            "majority": pd.DataFrame(majority, index=ds.time.values, columns=stations),
+            "snow_fraction": pd.DataFrame(snow_fraction, index=ds.time.values,
+                                          columns=stations),
+        }, axis=1)
+
+
 def transform_coords(gdf, crs):
     """Transforms x, y coords in gdf to crs and returns x, y
     coordinates as xrray.DataArray objects"""
@@ -146,13 +239,15 @@ def transform_coords(gdf, crs):
 
 
 def extract_from_file(href: str,
-                      coords : geopandas.GeoSeries) -> pd.DataFrame:
+                      coords : geopandas.GeoSeries,
+                      land_remap: bool = False) -> pd.DataFrame:
     """Extracts IMS surface values for a set of coordinates
 
     Parameters
     ----------
     href : url or local path to data file
     coords : DataFrame containing geometry column
+    land_remap : sample the nearest land pixel to each coordinate
 
     Returns
     -------
@@ -161,9 +256,36 @@ def extract_from_file(href: str,
     with fs.open(href, compression="gzip") as f:
         with xr.open_dataset(f, decode_coords="all") as ds:
             x, y = transform_coords(coords, ds.rio.crs)
-            df = extract_from_dataset(ds, x, y)
+            df = extract_from_dataset(ds, x, y, land_remap=land_remap)
     return df
-    
+
+
+def extract_windows_from_file(href: str,
+                              coords: geopandas.GeoSeries,
+                              size: int = 3,
+                              land_remap: bool = False) -> pd.DataFrame:
+    """Extracts window statistics of IMS surface values around a set of
+    coordinates.  See extract_windows_from_dataset
+
+    Parameters
+    ----------
+    href : url or local path to data file
+    coords : DataFrame containing geometry column
+    size : window size
+    land_remap : centre windows on the nearest land pixel to each coordinate
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    with fs.open(href, compression="gzip") as f:
+        with xr.open_dataset(f, decode_coords="all") as ds:
+            x, y = transform_coords(coords, ds.rio.crs)
+            x = x.rename({x.dims[0]: "station"})
+            y = y.rename({y.dims[0]: "station"})
+            df = extract_windows_from_dataset(ds, x, y, size=size, land_remap=land_remap)
+    return df
+
 
 def get_station_coords():
     """Returns a GeoPandas.DataFrame containing station locations"""
@@ -179,10 +301,16 @@ def get_href(resolution="4km", format="netcdf"):
 def get_snow_cover(resolution: str="4km",
                    format: str="netcdf",
                    test: bool=False,
-                   ntest: int=10) -> None:
+                   ntest: int=10,
+                   window: int=None,
+                   land_remap: bool=False) -> None:
     """Extracts IMS snow cover for stations
 
     ADD PARAMS
+    window : if given, extract majority class and land snow fraction for a
+             window x window neighbourhood of each station pixel
+    land_remap : sample the nearest land pixel to each station.  Requires a
+                 land mask for the resolution, see land_mask.make_land_mask
     """
 
     if resolution == "24km":
@@ -194,15 +322,21 @@ def get_snow_cover(resolution: str="4km",
         urls = get_href(resolution, format)
     except HTTPError as err:
         print(f"Search for urls failed: {err}")
-    print(href)
-    return
+        return
 
     stations = get_station_coords()
 
     # Use pqdm to parallelize collection of dataframes
     if test:
         urls = urls[:ntest]
-    args = [(url, stations) for url in urls]
+    if window:
+        args = [(url, stations, window, land_remap) for url in urls]
+        list_of_df = pqdm(args, extract_windows_from_file, n_jobs=8, argument_type="args")
+        df = pd.concat(list_of_df)
+        df.to_csv(f"ims.snow_cover.window{window}.from_{resolution}.csv")
+        return
+
+    args = [(url, stations, land_remap) for url in urls]
     list_of_df = pqdm(args, extract_from_file, n_jobs=8, argument_type="args")
 
 #    list_of_df = [extract_from_file(href, stations) for href in urls]
@@ -232,8 +366,14 @@ if __name__ == "__main__":
                         help="Run on a subset of urls")
     parser.add_argument("--ntest", type=int, default=10,
                         help="Number of tests")
+    parser.add_argument("--window", type=int, default=None,
+                        help=("Extract majority class and land snow fraction "
+                              "for a window of this size, e.g. 3 or 5"))
+    parser.add_argument("--land_remap", action="store_true",
+                        help="Sample the nearest land pixel to each station")
 
     args = parser.parse_args()
     
     get_snow_cover(resolution=args.resolution, format=args.format,
-                   test=args.test, ntest=args.ntest)
+                   test=args.test, ntest=args.ntest, window=args.window,
+                   land_remap=args.land_remap)
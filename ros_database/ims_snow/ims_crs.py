@@ -1,4 +1,5 @@
 """Defines CRS and grid for IMS"""
+from functools import cached_property
 from typing import Tuple
 
 from pyproj import CRS, Transformer
@@ -109,8 +110,21 @@ class Grid():
                                 self.grid_cell_height,
                                 self.grid_origin_y)
 
-        self.transformer = Transformer.from_crs(4326, self.crs,
-                                                always_xy=True)
+
+    @classmethod
+    def from_xy(cls, x, y, crs=None):
+        """Returns a Grid for regularly spaced pixel centre coordinates, e.g. the
+        x and y coordinates of an IMS dataset.  y may be ascending or descending"""
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        dx, dy = x[1] - x[0], y[1] - y[0]
+        return cls(len(y), len(x), dx, dy, x[0] - 0.5 * dx, y[0] - 0.5 * dy, crs=crs)
+
+
+    @cached_property
+    def transformer(self):
+        """Transformer from geographic coordinates to the grid crs.  Created on
+        first use, so grids without a crs can be used for index arithmetic"""
+        return Transformer.from_crs(4326, self.crs, always_xy=True)
 
 
     def __repr__(self):
@@ -161,21 +175,26 @@ class Grid():
 
         row = np.arange(r0, r1)
         col = np.arange(c0, c1)
-        x, _ = self.transform * (col, 0.5)
-        _, y = self.transform * (0.5, row)
+        # Affine does not broadcast over arrays so apply coefficients directly
+        x = self.transform.c + self.transform.a * col
+        y = self.transform.f + self.transform.e * row
         return x, y
 
 
     def colrow_to_xy(self, col, row):
         """Returns x and y projected coordinates 
         for a column and row."""
-        return self.transform * (col, row)
+        a, b, c, d, e, f = self.transform[:6]
+        col, row = np.asarray(col), np.asarray(row)
+        return a * col + b * row + c, d * col + e * row + f
 
 
     def xy_to_colrow(self, x, y):
         """Returns image coordinates 
         for a column and row."""
-        return ~self.transform * (x, y)
+        a, b, c, d, e, f = (~self.transform)[:6]
+        x, y = np.asarray(x), np.asarray(y)
+        return a * x + b * y + c, d * x + e * y + f
 
 
     def lonlat_to_xy(self, lon, lat):
@@ -202,6 +221,80 @@ class Grid():
         return self.xy_to_colrow(*self.lonlat_to_xy(lon, lat))
 
 
+    @cached_property
+    def x(self):
+        """x coordinates of pixel centres.  Computed once per instance"""
+        return self.xy_coords()[0]
+
+
+    @cached_property
+    def y(self):
+        """y coordinates of pixel centres.  Computed once per instance"""
+        return self.xy_coords()[1]
+
+
+    def lonlat_to_index(self, lon, lat, check_bounds=True):
+        """Returns integer pixel indices for arrays of longitude and latitude
+
+        Parameters
+        ----------
+        lon : array-like of longitudes
+        lat : array-like of latitudes
+        check_bounds : if True raise ValueError if any point is outside grid
+
+        Returns
+        -------
+        Tuple of int64 cols and rows.  Points outside the grid are -1
+        """
+        x, y = self.lonlat_to_xy(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        return self.xy_to_index(x, y, check_bounds=check_bounds)
+
+
+    def xy_to_index(self, x, y, check_bounds=True):
+        """Returns integer pixel indices for arrays of projected x and y
+        coordinates.  See lonlat_to_index"""
+        col, row = self.xy_to_colrow(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        col, row = np.floor(col), np.floor(row)
+        inside = (col >= 0) & (col < self.ncol) & (row >= 0) & (row < self.nrow)
+        if check_bounds and not inside.all():
+            raise ValueError(f"{(~inside).sum()} points are outside the grid")
+        cols = np.where(inside, col, -1).astype(np.int64)
+        rows = np.where(inside, row, -1).astype(np.int64)
+        return cols, rows
+
+
+    def flat_index(self, cols, rows):
+        """Returns flat indices into a row-major (nrow, ncol) array for integer
+        cols and rows.  Indices are -1 where cols or rows are outside the grid"""
+        cols = np.asarray(cols, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        inside = (cols >= 0) & (cols < self.ncol) & (rows >= 0) & (rows < self.nrow)
+        return np.where(inside, rows * self.ncol + cols, -1)
+
+
+    def check_lonlat(self, latitude, longitude, cols, rows):
+        """Compares geographic coordinates of pixel centres with official
+        IMS latitude and longitude grids
+
+        Parameters
+        ----------
+        latitude : array-like (nrow, ncol), e.g. memmap from
+                   ros_database.ims_snow.latlon.open_latlon
+        longitude : array-like (nrow, ncol)
+        cols : integer pixel columns to check
+        rows : integer pixel rows to check
+
+        Returns
+        -------
+        Tuple of maximum absolute difference in longitude and latitude in degrees
+        """
+        cols, rows = np.asarray(cols), np.asarray(rows)
+        lon, lat = self.colrow_to_lonlat(cols + 0.5, rows + 0.5)
+        dlon = (lon - np.asarray(longitude[rows, cols]) + 180.) % 360. - 180.
+        dlat = lat - np.asarray(latitude[rows, cols])
+        return np.nanmax(np.abs(dlon)), np.nanmax(np.abs(dlat))
+
+
     def bounds(self):
         """Returns grid bounds"""
         x0, y0 = self.transform * (0., 0.)
@@ -225,15 +318,14 @@ IMS4kmGrid = Grid(nrow=6144,
                   grid_origin_y=-12288000.0,
                   crs=IMS4kmNorthPolarStero)
 
-IMS1kmGrid = Grid(nrow=24576
-                  ncol=24576
-                  grid_cell_width=4000,
-                  grid_cell_height=4000,
+IMS1kmGrid = Grid(nrow=24576,
+                  ncol=24576,
+                  grid_cell_width=1000,
+                  grid_cell_height=1000,
                   grid_origin_x=-12288000.0,
                   grid_origin_y=-12288000.0,
                   crs=IMS4kmNorthPolarStero)
 
-# Add IMS4kmGrid and IMS1kmGrid
 
 def get_xarray_spatial_coords():
     """Returns xarray.DataArrays for x and y coordinate"""
@@ -0,0 +1,231 @@
+"""Land mask for IMS grids and remapping of stations to nearest land pixels
+
+The land mask is rasterized once from a local coastline file, e.g. GSHHS
+level 1 shapefile, and cached as a compressed numpy array.  Stations that fall
+in water pixels are remapped to the nearest land pixel within a search window.
+IMS extractions in get_snow_cover and cube take a land_remap option that uses
+remap_xy_to_land or nearest_land_pixel.
+
+Masks are indexed [row, col] in the image coordinates of the Grid.
+
+Usage
+-----
+To create a 4 km land mask
+
+  python -m ros_database.ims_snow.land_mask /path/to/GSHHS_f_L1.shp --resolution 4km
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Union, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import xarray as xr
+from shapely.geometry import box
+
+from ros_database.filepath import IMS_LAND_MASK_PATH
+from ros_database.ims_snow.ims_crs import IMS24Grid, IMS4kmGrid, Grid
+from ros_database.ims_snow.sampling import window_offsets, window_indices, gather
+
+GRIDS = {
+    "24km": IMS24Grid,
+    "4km": IMS4kmGrid,
+    }
+
+# Coastline polygons are clipped to this box before rasterizing
+CLIP_BOX = (-180., 20., 180., 90.)
+
+# Maximum search distance in pixels for nearest land pixel
+MAX_DISTANCE = 5
+
+
+def land_mask_filepath(resolution: str,
+                       path: Union[str, Path] = IMS_LAND_MASK_PATH) -> Path:
+    """Returns path to cached land mask"""
+    return Path(path) / f"ims.land_mask.{resolution}.npz"
+
+
+def grid_template(grid: Grid) -> xr.DataArray:
+    """Returns an empty DataArray with x and y coordinates and crs of grid"""
+    template = xr.DataArray(np.zeros((grid.nrow, grid.ncol), dtype=np.uint8),
+                            dims=["y", "x"], coords={"x": grid.x, "y": grid.y})
+    return template.rio.write_crs(grid.crs)
+
+
+def rasterize_land(coastline: gpd.GeoDataFrame,
+                   grid: Grid,
+                   clip_box: Tuple[float] = CLIP_BOX) -> np.ndarray:
+    """Rasterizes land polygons to grid
+
+    :coastline: GeoDataFrame of land polygons
+    :grid: Grid to rasterize to
+    :clip_box: bounding box (west, south, east, north) in geographic coordinates
+
+    :returns: boolean numpy array (nrow, ncol), True for land
+    """
+    from geocube.api.core import make_geocube
+
+    if coastline.crs is None:
+        coastline = coastline.set_crs(4326)
+    land = coastline.clip(box(*clip_box))[["geometry"]].copy()
+    land["land"] = 1
+
+    template = grid_template(grid)
+    cube = make_geocube(land, measurements=["land"], fill=0, like=template)
+    # make_geocube may return y in descending order, so align to the grid
+    # before taking values
+    mask = cube["land"].reindex_like(template, method="nearest")
+    return mask.values.astype(bool)
+
+
+def make_land_mask(coastline_file: Union[str, Path],
+                   resolution: str = "4km",
+                   path: Union[str, Path] = IMS_LAND_MASK_PATH,
+                   clobber: bool = False,
+                   verbose: bool = False) -> Path:
+    """Creates a land mask for an IMS grid and writes it as a compressed array
+
+    :coastline_file: path to coastline polygons readable by geopandas
+    :resolution: IMS grid resolution
+    :path: directory to write mask
+    :clobber: overwrite existing mask
+
+    :returns: path to land mask file
+    """
+    fp = land_mask_filepath(resolution, path=path)
+    if fp.exists() and not clobber:
+        if verbose: print(f"{fp} exists, set clobber=True to overwrite")
+        return fp
+
+    if verbose: print(f"Reading coastlines from {coastline_file}")
+    coastline = gpd.read_file(coastline_file)
+    if verbose: print(f"Rasterizing land to {resolution} grid")
+    mask = rasterize_land(coastline, GRIDS[resolution])
+
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    if verbose: print(f"Writing land mask to {fp}")
+    np.savez_compressed(fp, mask=mask)
+    return fp
+
+
+@lru_cache(maxsize=None)
+def load_land_mask(resolution: str = "4km",
+                   path: Union[str, Path] = IMS_LAND_MASK_PATH) -> np.ndarray:
+    """Returns cached land mask for an IMS grid as a read-only boolean array"""
+    fp = land_mask_filepath(resolution, path=path)
+    if not fp.exists():
+        raise FileNotFoundError(f"No land mask {fp}: create it with make_land_mask")
+    with np.load(fp) as f:
+        mask = f["mask"]
+    mask.flags.writeable = False
+    return mask
+
+
+def nearest_land_pixel(mask: np.ndarray,
+                       grid: Grid,
+                       cols: np.ndarray,
+                       rows: np.ndarray,
+                       max_distance: int = MAX_DISTANCE):
+    """Remaps pixels to the nearest land pixel in mask
+
+    Windows around all pixels are gathered at once, so there is no loop over
+    stations.  Pixels that are already land are unchanged.
+
+    :mask: boolean array (nrow, ncol), True for land
+    :grid: Grid of mask
+    :cols: array of pixel column indices
+    :rows: array of pixel row indices
+    :max_distance: search window half-width in pixels
+
+    :returns: tuple of land cols, land rows and distance in pixels.  Pixels
+              with no land within max_distance are unchanged and have a
+              distance of NaN
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    size = 2 * max_distance + 1
+
+    drow, dcol = window_offsets(size)
+    distance = np.hypot(drow, dcol)
+    flat_index = window_indices(cols, rows, grid, size=size)
+    is_land = gather(mask, flat_index, fill=False)
+
+    candidate = np.where(is_land, distance, np.inf)
+    nearest = candidate.argmin(axis=1)
+    found = np.isfinite(candidate[np.arange(len(cols)), nearest])
+
+    land_cols = np.where(found, cols + dcol[nearest], cols)
+    land_rows = np.where(found, rows + drow[nearest], rows)
+    land_distance = np.where(found, distance[nearest], np.nan)
+    return land_cols, land_rows, land_distance
+
+
+def remap_xy_to_land(x, y,
+                     resolution: str = "4km",
+                     mask: Union[np.ndarray, None] = None,
+                     max_distance: int = MAX_DISTANCE):
+    """Returns projected coordinates of the nearest land pixel centres
+
+    :x: array of x coordinates in the crs of the IMS grid
+    :y: array of y coordinates
+    :resolution: IMS grid resolution
+    :mask: land mask.  Default loads cached mask for resolution
+
+    :returns: tuple of x and y arrays.  Points with no land within
+              max_distance are moved to the centre of their own pixel
+    """
+    grid = GRIDS[resolution]
+    if mask is None:
+        mask = load_land_mask(resolution)
+    cols, rows = grid.xy_to_index(x, y)
+    land_cols, land_rows, _ = nearest_land_pixel(mask, grid, cols, rows,
+                                                 max_distance=max_distance)
+    return grid.colrow_to_xy(land_cols + 0.5, land_rows + 0.5)
+
+
+def station_land_pixels(stations: gpd.GeoSeries,
+                        resolution: str = "4km",
+                        mask: Union[np.ndarray, None] = None,
+                        max_distance: int = MAX_DISTANCE) -> pd.DataFrame:
+    """Returns station pixels and nearest land pixels for an IMS grid
+
+    :stations: GeoSeries of station locations in geographic coordinates
+    :resolution: IMS grid resolution
+    :mask: land mask.  Default loads cached mask for resolution
+
+    :returns: DataFrame indexed by station with col, row, land_col, land_row
+              and distance columns
+    """
+    grid = GRIDS[resolution]
+    if mask is None:
+        mask = load_land_mask(resolution)
+    cols, rows = grid.lonlat_to_index(stations.x.values, stations.y.values)
+    land_cols, land_rows, distance = nearest_land_pixel(mask, grid, cols, rows,
+                                                        max_distance=max_distance)
+    return pd.DataFrame(
+        {
+            "col": cols,
+            "row": rows,
+            "land_col": land_cols,
+            "land_row": land_rows,
+            "distance": distance,
+        }, index=stations.index)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Creates a land mask for an IMS grid")
+    parser.add_argument("coastline_file", type=str,
+                        help="Path to coastline polygons, e.g. GSHHS_f_L1.shp")
+    parser.add_argument("--resolution", type=str, default="4km", choices=list(GRIDS),
+                        help="IMS grid resolution")
+    parser.add_argument("--clobber", action="store_true",
+                        help="Overwrite existing land mask")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    make_land_mask(args.coastline_file, resolution=args.resolution,
+                   clobber=args.clobber, verbose=args.verbose)
@@ -0,0 +1,114 @@
+"""Memory-mapped access to the official IMS latitude and longitude grids
+
+The IMS lat/lon grids are distributed as gzipped little-endian float32
+binary files, e.g. imslat_1km.bin.gz.  The 1 km grids are about 2.4 GB each
+uncompressed.  Files are decompressed once, in chunks, to raw .f4 files next
+to the originals and then opened as numpy.memmap.  Point and window lookups
+only read the pages they need.
+
+Grids are indexed [row, col] with the same image coordinates as
+ros_database.ims_snow.ims_crs.Grid.
+"""
+from pathlib import Path
+from typing import Union, Tuple
+import gzip
+import re
+import shutil
+
+import numpy as np
+
+GRID_SHAPES = {
+    "1km": (24576, 24576),
+    "4km": (6144, 6144),
+    "24km": (1024, 1024),
+    }
+
+DTYPE = "<f4"
+
+# Chunk size for streaming decompression
+CHUNK_SIZE = 64 * 1024**2
+
+
+def resolution_from_file(filepath: Union[str, Path]) -> str:
+    """Returns grid resolution from an IMS lat/lon filename"""
+    m = re.search(r"_(\d+km)", Path(filepath).name)
+    if m is None:
+        raise ValueError(f"Cannot get resolution from {filepath}")
+    return m.group(1)
+
+
+def raw_filepath(filepath: Union[str, Path],
+                 outdir: Union[str, Path, None] = None) -> Path:
+    """Returns path to decompressed raw grid, e.g. imslat_1km.f4"""
+    filepath = Path(filepath)
+    outdir = filepath.parent if outdir is None else Path(outdir)
+    name = filepath.name.split(".")[0]
+    return outdir / f"{name}.f4"
+
+
+def decompress_latlon(filepath: Union[str, Path],
+                      outdir: Union[str, Path, None] = None,
+                      clobber: bool = False,
+                      verbose: bool = False) -> Path:
+    """Decompresses a gzipped IMS lat/lon grid to a raw .f4 file
+
+    The file is streamed in chunks, so the full grid is never held in memory.
+    Output is written to a temporary file and renamed once complete.
+
+    :filepath: path to gzipped grid
+    :outdir: directory for raw file.  Default is directory of filepath
+    :clobber: overwrite existing raw file
+
+    :returns: path to raw file
+    """
+    shape = GRID_SHAPES[resolution_from_file(filepath)]
+    nbytes = int(np.prod(shape)) * np.dtype(DTYPE).itemsize
+    fout = raw_filepath(filepath, outdir=outdir)
+    if fout.exists() and fout.stat().st_size == nbytes and not clobber:
+        return fout
+
+    if verbose: print(f"Decompressing {filepath} to {fout}")
+    fout.parent.mkdir(parents=True, exist_ok=True)
+    tmp = fout.with_suffix(".f4.tmp")
+    with gzip.open(filepath, mode="rb") as src, open(tmp, mode="wb") as dst:
+        shutil.copyfileobj(src, dst, length=CHUNK_SIZE)
+    if tmp.stat().st_size != nbytes:
+        tmp.unlink()
+        raise ValueError(f"Size of decompressed {filepath} does not match "
+                         f"{shape} {DTYPE} grid")
+    tmp.rename(fout)
+    return fout
+
+
+def open_latlon(filepath: Union[str, Path],
+                outdir: Union[str, Path, None] = None,
+                verbose: bool = False) -> np.memmap:
+    """Returns a read-only memory-mapped IMS lat or lon grid.  Gzipped files
+    are decompressed on first use"""
+    filepath = Path(filepath)
+    shape = GRID_SHAPES[resolution_from_file(filepath)]
+    if filepath.suffix == ".gz":
+        filepath = decompress_latlon(filepath, outdir=outdir, verbose=verbose)
+    return np.memmap(filepath, dtype=DTYPE, mode="r", shape=shape)
+
+
+def latlon_grids(latfile: Union[str, Path],
+                 lonfile: Union[str, Path],
+                 outdir: Union[str, Path, None] = None,
+                 verbose: bool = False) -> Tuple[np.memmap, np.memmap]:
+    """Returns memory-mapped latitude and longitude grids"""
+    return (open_latlon(latfile, outdir=outdir, verbose=verbose),
+            open_latlon(lonfile, outdir=outdir, verbose=verbose))
+
+
+def point_values(grid: np.ndarray, cols, rows) -> np.ndarray:
+    """Returns grid values at integer cols and rows"""
+    return np.asarray(grid[np.asarray(rows), np.asarray(cols)])
+
+
+def window_values(grid: np.ndarray, col: int, row: int, half: int = 1) -> np.ndarray:
+    """Returns a window of grid values centred on col and row.  Windows are
+    truncated at the grid edge"""
+    nrow, ncol = grid.shape
+    return np.asarray(grid[max(row - half, 0):min(row + half + 1, nrow),
+                           max(col - half, 0):min(col + half + 1, ncol)])
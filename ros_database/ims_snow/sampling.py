@@ -0,0 +1,71 @@
+"""Samples IMS grids in windows around station pixels
+
+Windows for all stations are converted to flat indices into a row-major grid
+once.  Values for all stations and windows are then taken from a grid with a
+single fancy-index gather.
+"""
+import numpy as np
+
+from ros_database.ims_snow.codes import MISSING, LAND, SNOW
+
+NCODE = SNOW + 1
+
+
+def window_offsets(size=3):
+    """Returns row and column offsets for a size x size window centred on a pixel"""
+    if size % 2 == 0:
+        raise ValueError(f"Window size must be odd, got {size}")
+    half = size // 2
+    drow, dcol = np.meshgrid(np.arange(-half, half + 1), np.arange(-half, half + 1),
+                             indexing="ij")
+    return drow.ravel(), dcol.ravel()
+
+
+def window_indices(cols, rows, grid, size=3):
+    """Returns flat indices of windows around pixels in a row-major grid
+
+    :cols: array of pixel column indices.  -1 for pixels outside the grid
+    :rows: array of pixel row indices
+    :grid: ros_database.ims_snow.ims_crs.Grid
+    :size: window size
+
+    :returns: int64 array (npixel, size*size).  Pixels outside the grid, and
+              all pixels in windows of pixels outside the grid, are -1
+    """
+    drow, dcol = window_offsets(size)
+    cols = np.asarray(cols, dtype=np.int64)[:, None]
+    rows = np.asarray(rows, dtype=np.int64)[:, None]
+    flat_index = grid.flat_index(cols + dcol, rows + drow)
+    return np.where((cols >= 0) & (rows >= 0), flat_index, -1)
+
+
+def gather(grid, flat_index, fill=MISSING):
+    """Returns values of grid at flat_index.  Leading dimensions of grid, e.g.
+    time, are kept.
+
+    :grid: array (..., nrow, ncol)
+    :flat_index: array of flat indices from window_indices
+
+    :returns: array (..., *flat_index.shape)
+    """
+    values = grid.reshape(grid.shape[:-2] + (-1,))[..., np.clip(flat_index, 0, None)]
+    return np.where(flat_index >= 0, values, fill)
+
+
+def window_statistics(samples):
+    """Returns majority class and snow fraction for windows of IMS codes
+
+    :samples: array (..., window) of IMS codes
+
+    :returns: tuple of majority class and fraction of land pixels that are
+              snow covered.  Majority class is MISSING if all pixels are missing.
+              Ties are resolved to the lowest code.  Snow fraction is NaN if
+              there are no land pixels in the window.
+    """
+    counts = (samples[..., None] == np.arange(NCODE)).sum(axis=-2)
+    valid = counts[..., 1:]
+    majority = np.where(valid.sum(axis=-1) > 0, valid.argmax(axis=-1) + 1, MISSING)
+    nland = counts[..., LAND] + counts[..., SNOW]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        snow_fraction = np.where(nland > 0, counts[..., SNOW] / nland, np.nan)
+    return majority.astype(np.int8), snow_fraction
@@ -0,0 +1,85 @@
+"""Aligns time series to a target time index within a validity window
+
+Source values are matched to target timestamps by time, not by row, so
+alignment works for any target resolution (hourly, sub-hourly or daily) and
+for target indexes with gaps.
+"""
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+
+def _to_int64(index):
+    """Returns datetimes as int64 nanoseconds"""
+    return np.asarray(index, dtype="datetime64[ns]").view("int64")
+
+
+def asof_indexer(source_index: pd.DatetimeIndex,
+                 target_index: pd.DatetimeIndex,
+                 tolerance: Union[str, pd.Timedelta],
+                 direction: str = "backward") -> np.ndarray:
+    """Returns positions of source values valid at each target timestamp
+
+    Parameters
+    ----------
+    source_index : sorted DatetimeIndex of source values
+    target_index : DatetimeIndex to align to
+    tolerance : validity window of a source value.  For backward, a source
+        value at t is valid for target times in [t, t + tolerance].  As for
+        pandas.merge_asof, the window is inclusive, so a zero tolerance
+        matches identical timestamps only
+    direction : backward uses the most recent source value at or before the
+        target time, forward the next source value at or after the target
+        time, and nearest the closest source value
+
+    Returns
+    -------
+    numpy array of int64 positions in source_index, -1 where no source value
+    is valid
+    """
+    src = _to_int64(source_index)
+    tgt = _to_int64(target_index)
+    tol = pd.Timedelta(tolerance).value
+    nsrc = len(src)
+    if nsrc == 0:
+        return np.full(len(tgt), -1, dtype=np.int64)
+
+    before = np.searchsorted(src, tgt, side="right") - 1
+    after = np.searchsorted(src, tgt, side="left")
+    dt_before = np.where(before >= 0, tgt - src[np.clip(before, 0, None)], np.iinfo(np.int64).max)
+    dt_after = np.where(after < nsrc, src[np.clip(after, None, nsrc - 1)] - tgt, np.iinfo(np.int64).max)
+
+    if direction == "backward":
+        pos, delta = before, dt_before
+    elif direction == "forward":
+        pos, delta = after, dt_after
+    elif direction == "nearest":
+        use_before = dt_before <= dt_after
+        pos = np.where(use_before, before, after)
+        delta = np.where(use_before, dt_before, dt_after)
+    else:
+        raise ValueError(f"Unknown direction {direction}: expects backward, forward or nearest")
+
+    return np.where(delta <= tol, pos, -1).astype(np.int64)
+
+
+def align_asof(source: Union[pd.Series, pd.DataFrame],
+               target_index: pd.DatetimeIndex,
+               tolerance: Union[str, pd.Timedelta],
+               direction: str = "backward") -> Union[pd.Series, pd.DataFrame]:
+    """Aligns a time series to target_index.  See asof_indexer
+
+    Returns
+    -------
+    Series or DataFrame indexed by target_index.  Values are missing where no
+    source value is valid.
+    """
+    source = source.sort_index()
+    pos = asof_indexer(source.index, target_index, tolerance, direction=direction)
+    valid = pos >= 0
+    result = source.iloc[np.where(valid, pos, 0)] if len(source) else source.reindex(target_index)
+    result.index = target_index
+    if isinstance(result, pd.DataFrame):
+        return result.where(np.broadcast_to(valid[:, None], result.shape))
+    return result.where(valid)
@@ -1,9 +1,23 @@
 """Combines IMS Snow Cover with hourly data files"""
+import importlib
+import time
+import tempfile
+import warnings
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
 
 from ros_database.filepath import SURFOBS_HOURLY_PATH, IMS_PATH, SURFOBS_COMBINED_PATH
 from ros_database.processing.surface import load_hourly_observations
+from ros_database.processing.align import align_asof
+from ros_database.ims_snow.codes import MISSING, LAND, SNOW
+
+
+def snow_cover_filepath(resolution='4km', suffix=".csv"):
+    """Returns path to table of IMS surface codes for stations"""
+    return IMS_PATH / f"ims.snow_cover.from_{resolution}{suffix}"
 
 
 def load_snow_cover_for_stations(resolution='4km'):
@@ -15,20 +29,105 @@ def load_snow_cover_for_stations(resolution='4km'):
     Return dataframe with True for snow cover, False for snow free land and NaN for 
     all other codes.
     """
-    filepath = IMS_PATH / f"ims.snow_cover.from_{resolution}.csv"
+    filepath = snow_cover_filepath(resolution)
     df = pd.read_csv(filepath, parse_dates=True, index_col=0)
     df = df.where((df == 2.) | (df == 4.))
     df = df.mask((df == 2.) | (df == 4.), df == 4)
     return df
 
 
+def read_snow_cover_csv(resolution='4km'):
+    """Reads IMS surface codes for stations from csv and returns a dataframe
+    of int8 codes.  Missing values are set to MISSING"""
+    df = pd.read_csv(snow_cover_filepath(resolution), parse_dates=True, index_col=0,
+                     dtype=np.float32)
+    return df.fillna(MISSING).astype(np.int8)
+
+
+def has_parquet_engine():
+    """Returns True if pyarrow or fastparquet can be imported"""
+    for module in ["pyarrow", "fastparquet"]:
+        try:
+            importlib.import_module(module)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+def convert_snow_cover_table(resolution='4km'):
+    """Converts csv table of IMS surface codes for stations to parquet with
+    int8 columns.  If no parquet engine is available, codes are written as
+    a compressed npz file with codes, dates, stations and index_name arrays
+
+    Returns path to converted table
+    """
+    df = read_snow_cover_csv(resolution)
+    if has_parquet_engine():
+        filepath = snow_cover_filepath(resolution, suffix=".parquet")
+        df.to_parquet(filepath)
+    else:
+        filepath = snow_cover_filepath(resolution, suffix=".npz")
+        np.savez_compressed(filepath, codes=df.to_numpy(), dates=df.index.to_numpy(),
+                            stations=df.columns.to_numpy(dtype=str),
+                            index_name=df.index.name or "")
+    return filepath
+
+
+def load_snow_cover_codes(resolution='4km'):
+    """Loads IMS surface codes for stations as int8.
+
+    Codes are read from parquet if it exists and a parquet engine is
+    available, then from npz if it exists, otherwise from csv.  Use
+    convert_snow_cover_table to create the parquet or npz file.
+
+    Returns dataframe of int8 codes with stations as columns
+    """
+    filepath = snow_cover_filepath(resolution, suffix=".parquet")
+    if filepath.exists() and has_parquet_engine():
+        return pd.read_parquet(filepath)
+    filepath = snow_cover_filepath(resolution, suffix=".npz")
+    if filepath.exists():
+        with np.load(filepath) as f:
+            index = pd.DatetimeIndex(f["dates"], name=str(f["index_name"]) or None)
+            return pd.DataFrame(f["codes"], index=index, columns=f["stations"])
+    return read_snow_cover_csv(resolution)
+
+
+def decode_snow_on_ground(codes):
+    """Decodes IMS surface codes for a station to snow on ground
+
+    Returns pandas Series with nullable boolean dtype.  True for snow cover,
+    False for snow free land and NA for all other codes.
+    """
+    values = codes.to_numpy()
+    sog = pd.arrays.BooleanArray(values == SNOW, ~np.isin(values, [LAND, SNOW]))
+    return pd.Series(sog, index=codes.index, name=codes.name)
+
+
 def reindex_snow_cover(snow_cover, index):
     return snow_cover.reindex(index, method="ffill", limit=23)
 
 
-def combine_one(met, snow_cover):
-    """Combines data for one station"""
-    met['sog'] = reindex_snow_cover(snow_cover, met.index)
+def align_snow_cover(snow_cover, index, tolerance="24h"):
+    """Aligns daily snow cover to index by time.  Each IMS value is valid for
+    tolerance after its timestamp, for any resolution of index and independent
+    of gaps in index"""
+    return align_asof(snow_cover, index, tolerance, direction="backward")
+
+
+def combine_one(met, snow_cover, tolerance=None):
+    """Combines data for one station
+
+    :met: dataframe of observations
+    :snow_cover: series of snow on ground
+    :tolerance: validity window for snow cover.  If None, snow cover is forward
+                filled for 23 rows using reindex_snow_cover
+    """
+    if tolerance is None:
+        met['sog'] = reindex_snow_cover(snow_cover, met.index)
+    else:
+        met['sog'] = align_snow_cover(snow_cover, met.index, tolerance=tolerance)
     return met
 
 
@@ -37,28 +136,149 @@ def get_station_id(df):
     return df.iloc[0,df.columns.get_loc("station")]
 
 
-def make_outfile(fp):
+def make_outfile(fp, outpath=SURFOBS_COMBINED_PATH):
     """Returns output path for combined data"""
-    return SURFOBS_COMBINED_PATH / fp.name.replace("hourly","hourly.combined")
+    return Path(outpath) / fp.name.replace("hourly","hourly.combined")
+
+
+def write_one(df_combine, fp, outpath=SURFOBS_COMBINED_PATH, verbose=False):
+    """Writes combined data for the hourly file fp"""
+    outfp = make_outfile(fp, outpath=outpath)
+    outfp.parent.mkdir(parents=True, exist_ok=True)
+    if verbose: print(f"Writing combine file to {outfp}")
+    df_combine.to_csv(outfp)
 
 
-def combine_files(verbose=False):
-    """Loops through files in SURFOBS_HOURLY_PATH and combines
-    with snow cover data"""
+def warn_missing_station(stnid, fp):
+    """Warns that a station has no snow cover and its file is skipped"""
+    warnings.warn(f"No snow cover for station {stnid}, skipping {Path(fp).name}",
+                  UserWarning)
 
-    snow_cover = load_snow_cover_for_stations()
 
-    for fp in SURFOBS_HOURLY_PATH.glob('*.csv'):
+def combine_files(verbose=False, jobs=1, tolerance=None,
+                  hourly_path=SURFOBS_HOURLY_PATH, outpath=SURFOBS_COMBINED_PATH,
+                  snow_cover=None):
+    """Loops through files in hourly_path and combines with snow cover data.
+    Files for stations without snow cover are skipped with a warning
+
+    :verbose: verbose output
+    :jobs: number of processes.  If jobs > 1 stations are combined in parallel,
+           see combine_files_parallel
+    :tolerance: validity window for snow cover.  See combine_one
+    :hourly_path: path to hourly files
+    :outpath: path to write combined files
+    :snow_cover: dataframe of int8 codes with stations as columns.  Default is
+                 load_snow_cover_codes
+    """
+
+    if snow_cover is None:
+        snow_cover = load_snow_cover_codes()
+
+    if jobs > 1:
+        return combine_files_parallel(snow_cover, jobs=jobs, verbose=verbose,
+                                      tolerance=tolerance, hourly_path=hourly_path,
+                                      outpath=outpath)
+
+    for fp in sorted(Path(hourly_path).glob('*.csv')):
         df = load_hourly_observations(fp)
         stnid = get_station_id(df)
-        df_combine = combine_one(df, snow_cover[stnid])
-        
-        outfp = make_outfile(fp)
-        outfp.parent.mkdir(parents=True, exist_ok=True)
-        if verbose: print(f"Writing combine file to {outfp}")
-        df_combine.to_csv(outfp)
+        if stnid not in snow_cover:
+            warn_missing_station(stnid, fp)
+            continue
+        df_combine = combine_one(df, decode_snow_on_ground(snow_cover[stnid]),
+                                 tolerance=tolerance)
+        write_one(df_combine, fp, outpath=outpath, verbose=verbose)
+
+
+# Snow cover codes shared by worker processes
+_worker_snow_cover = {}
+
+
+def write_snow_cover_memmap(snow_cover, filepath):
+    """Writes int8 codes to a .npy file with one contiguous row per station"""
+    np.save(filepath, np.ascontiguousarray(snow_cover.to_numpy(dtype=np.int8).T))
+
+
+def _init_worker(filepath, dates, stations):
+    """Opens memory mapped snow cover codes in a worker process"""
+    _worker_snow_cover["codes"] = np.load(filepath, mmap_mode="r")
+    _worker_snow_cover["dates"] = dates
+    _worker_snow_cover["row"] = {stnid: i for i, stnid in enumerate(stations)}
+
+
+def combine_station_file(fp, verbose=False, tolerance=None, outpath=SURFOBS_COMBINED_PATH):
+    """Combines one hourly file with memory mapped snow cover codes
+
+    :returns: tuple of station id and processing time in seconds.  Time is
+              None if the station has no snow cover and the file is skipped
+    """
+    t0 = time.perf_counter()
+    df = load_hourly_observations(fp)
+    stnid = get_station_id(df)
+    row = _worker_snow_cover["row"].get(stnid)
+    if row is None:
+        return stnid, None
+    codes = pd.Series(np.asarray(_worker_snow_cover["codes"][row]),
+                      index=_worker_snow_cover["dates"], name=stnid)
+    df_combine = combine_one(df, decode_snow_on_ground(codes), tolerance=tolerance)
+    write_one(df_combine, fp, outpath=outpath, verbose=verbose)
+    return stnid, time.perf_counter() - t0
+
+
+def combine_files_parallel(snow_cover, jobs=4, verbose=False, tolerance=None,
+                           hourly_path=SURFOBS_HOURLY_PATH, outpath=SURFOBS_COMBINED_PATH):
+    """Combines files in hourly_path with snow cover using a pool of
+    processes.
+
+    Snow cover codes are written once to a memory mapped file, so workers
+    read codes for each station without pickling the code matrix.
+
+    :snow_cover: dataframe of int8 codes with stations as columns
+    :jobs: number of processes
+    :verbose: verbose output
+    :tolerance: validity window for snow cover.  See combine_one
+    :hourly_path: path to hourly files
+    :outpath: path to write combined files
+    """
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = Path(tmpdir) / "snow_cover.npy"
+        write_snow_cover_memmap(snow_cover, filepath)
+        initargs = (filepath, snow_cover.index, list(snow_cover.columns))
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            futures = {executor.submit(combine_station_file, fp,
+                                       tolerance=tolerance, outpath=outpath): fp
+                       for fp in sorted(Path(hourly_path).glob('*.csv'))}
+            for future in as_completed(futures):
+                fp = futures[future]
+                try:
+                    stnid, seconds = future.result()
+                except Exception as err:
+                    print(f"Failed to combine {fp.name}: {err}")
+                    continue
+                if seconds is None:
+                    warn_missing_station(stnid, fp)
+                    continue
+                if verbose: print(f"Combined {fp.name} in {seconds:.1f} s")
+
+    if verbose: print(f"Combined {len(futures)} files in {time.perf_counter() - t0:.1f} s "
+                      f"using {jobs} processes")
 
 
 if __name__ == "__main__":
-    verbose = True
-    combine_files(verbose=verbose)
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Combines hourly files in "
+                                                  f"{SURFOBS_HOURLY_PATH} with IMS snow cover"))
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of processes.  Default is 1")
+    parser.add_argument("--tolerance", type=str, default=None,
+                        help=("Validity window for snow cover, e.g. 24h.  Default is "
+                              "to forward fill 23 rows"))
+    parser.add_argument("--quiet", action="store_true",
+                        help="Suppress verbose output")
+    args = parser.parse_args()
+
+    combine_files(verbose=not args.quiet, jobs=args.jobs, tolerance=args.tolerance)
@@ -0,0 +1,109 @@
+"""Combines reanalysis station series with hourly combined data files
+
+Station series extracted from reanalysis by extract_reanalysis_for_stations,
+and upper air diagnostics from upper_air_diagnostics, are loaded once into a
+station indexed store.  Series for each station are then aligned to the
+timestamps of the hourly combined file for that station.
+"""
+import warnings
+
+import pandas as pd
+import xarray as xr
+
+from ros_database.filepath import (SURFOBS_COMBINED_PATH,
+                                   SURFOBS_REANALYSIS_COMBINED_PATH,
+                                   STATIONS_SURFACE_REANALYSIS,
+                                   STATIONS_UPPER_AIR_REANALYSIS)
+from ros_database.processing.surface import load_station_combined_data
+from ros_database.processing.combine_hourly_with_ims_snowcover import get_station_id
+
+# Prefix added to reanalysis variable names in combined files
+PREFIX = "era5_"
+
+
+def surface_station_filepaths():
+    """Returns a sorted list of station surface reanalysis files"""
+    return sorted(STATIONS_SURFACE_REANALYSIS.glob("era5.surface.stations.*.nc"))
+
+
+def diagnostics_station_filepaths():
+    """Returns a sorted list of station upper air diagnostics files"""
+    return sorted(STATIONS_UPPER_AIR_REANALYSIS.glob("era5.upper_air_diagnostics.stations.*.nc"))
+
+
+def load_reanalysis_store(variables=None, diagnostics=True):
+    """Loads reanalysis station series into memory
+
+    :variables: list of variables to load.  Default is to load all variables
+    :diagnostics: include upper air diagnostics if they exist
+
+    :returns: xarray.Dataset with time and station dimensions.  Variable
+              names are lower case with PREFIX added.
+    """
+    ds = xr.open_mfdataset(surface_station_filepaths(), combine="by_coords")
+    diagnostic_files = diagnostics_station_filepaths()
+    if diagnostics and diagnostic_files:
+        ds = ds.merge(xr.open_mfdataset(diagnostic_files, combine="by_coords"))
+
+    # Drop station coordinates, e.g. latitude and longitude
+    ds = ds.drop_vars([c for c in ds.coords if c not in ds.dims])
+    if variables:
+        ds = ds[variables]
+    ds = ds.rename({name: f"{PREFIX}{name.lower()}" for name in ds.data_vars})
+    return ds.transpose("time", "station").load()
+
+
+def reanalysis_for_station(store, stnid):
+    """Returns reanalysis series for a station as a pandas DataFrame indexed
+    by time"""
+    df = store.sel(station=stnid).drop_vars("station").to_dataframe()
+    df.index.name = None
+    return df
+
+
+def combine_one(met, reanalysis):
+    """Combines data for one station.  Reanalysis series are aligned to
+    observation timestamps, timestamps without reanalysis are NaN"""
+    return met.join(reanalysis.reindex(met.index))
+
+
+def make_outfile(fp):
+    """Returns output path for combined data"""
+    return SURFOBS_REANALYSIS_COMBINED_PATH / fp.name
+
+
+def combine_files(variables=None, verbose=False):
+    """Loops through files in SURFOBS_COMBINED_PATH and joins reanalysis
+    station series"""
+
+    if verbose: print("Loading reanalysis station series")
+    store = load_reanalysis_store(variables=variables)
+    stations = set(store.station.values)
+
+    for fp in SURFOBS_COMBINED_PATH.glob('*.csv'):
+        df = load_station_combined_data(fp)
+        stnid = get_station_id(df)
+        if stnid not in stations:
+            warnings.warn(f"No reanalysis series for {stnid}: skipping {fp.name}",
+                          UserWarning)
+            continue
+        df_combine = combine_one(df, reanalysis_for_station(store, stnid))
+
+        outfp = make_outfile(fp)
+        outfp.parent.mkdir(parents=True, exist_ok=True)
+        if verbose: print(f"Writing combine file to {outfp}")
+        df_combine.to_csv(outfp)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Joins reanalysis station series to "
+                                                  f"files in {SURFOBS_COMBINED_PATH}"))
+    parser.add_argument("--variables", type=str, nargs="+", default=None,
+                        help="Reanalysis variables to join.  Default is all variables")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    combine_files(variables=args.variables, verbose=args.verbose)
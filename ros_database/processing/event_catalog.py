@@ -0,0 +1,187 @@
+"""Consolidated catalog of precipitation events for all stations
+
+Station event files in SURFOBS_EVENTS_PATH are combined into a single SQLite
+table, with station country, coordinates and elevation joined from the
+station metadata.  Indexes on start time, station, country and precipitation
+type counts allow events to be queried without reading station files.
+
+Times are stored as ISO 8601 strings, which sort in time order.
+
+Usage
+-----
+To build the catalog
+
+  python -m ros_database.processing.event_catalog --verbose
+
+Example query: all FZRA events in Finland in January 2020 with snow on ground
+
+  query_events(start="2020-01-01", end="2020-02-01", countries=["FI"],
+               ptypes=["FZRA"], sog=True)
+"""
+from pathlib import Path
+from typing import List, Union
+import sqlite3
+
+import pandas as pd
+
+from ros_database.filepath import SURFOBS_EVENTS_PATH, SURFOBS_EVENT_CATALOG
+from ros_database.processing.extract_precip_events import PTYPES
+from ros_database.processing.surface import load_event_file, load_station_metadata
+
+TABLE = "events"
+
+METADATA_COLUMNS = ["country", "latitude", "longitude", "elevation"]
+
+INDEXES = {
+    "idx_events_start": ["start"],
+    "idx_events_station_start": ["station", "start"],
+    "idx_events_country_start": ["country", "start"],
+    "idx_events_ra": ["RA"],
+    "idx_events_fzra": ["FZRA"],
+    "idx_events_solid": ["SOLID"],
+    "idx_events_up": ["UP"],
+    }
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def station_from_filepath(fp: Path) -> str:
+    """Returns station id from an event filename"""
+    return Path(fp).name.split(".")[0]
+
+
+def load_station_events(fp: Path) -> pd.DataFrame:
+    """Loads an event file and adds a station column"""
+    df = load_event_file(fp).reset_index(drop=True)
+    df.insert(0, "station", station_from_filepath(fp))
+    return df
+
+
+def combine_event_files(filepaths: List[Path],
+                        stations: Union[pd.DataFrame, None] = None) -> pd.DataFrame:
+    """Combines station event files and joins station metadata
+
+    :filepaths: list of event files
+    :stations: station metadata indexed by station id.  Default is
+               load_station_metadata
+
+    :returns: DataFrame with one row per event
+    """
+    if stations is None:
+        stations = load_station_metadata()
+    events = pd.concat([load_station_events(fp) for fp in filepaths], ignore_index=True)
+    metadata = pd.DataFrame(stations).reindex(columns=METADATA_COLUMNS)
+    return events.join(metadata, on="station")
+
+
+def write_event_catalog(events: pd.DataFrame,
+                        catalog: Union[str, Path] = SURFOBS_EVENT_CATALOG) -> Path:
+    """Writes events to a SQLite catalog and creates indexes.  An existing
+    catalog is replaced"""
+    events = events.copy()
+    for col in ["start", "end"]:
+        events[col] = pd.to_datetime(events[col]).dt.strftime(TIME_FORMAT)
+    if "sog" in events:
+        events["sog"] = events["sog"].astype("boolean").astype("Int8")
+
+    catalog = Path(catalog)
+    catalog.parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(catalog) as con:
+        events.to_sql(TABLE, con, if_exists="replace", index=False)
+        for name, columns in INDEXES.items():
+            con.execute(f"CREATE INDEX {name} ON {TABLE} ({', '.join(columns)})")
+    con.close()
+    return catalog
+
+
+def build_event_catalog(event_path: Union[str, Path] = SURFOBS_EVENTS_PATH,
+                        catalog: Union[str, Path] = SURFOBS_EVENT_CATALOG,
+                        stations: Union[pd.DataFrame, None] = None,
+                        verbose: bool = False) -> Path:
+    """Builds the event catalog from all event files in event_path"""
+    filepaths = sorted(Path(event_path).glob("*.csv"))
+    if verbose: print(f"Combining {len(filepaths)} event files from {event_path}")
+    events = combine_event_files(filepaths, stations=stations)
+    if verbose: print(f"Writing {len(events)} events to {catalog}")
+    return write_event_catalog(events, catalog=catalog)
+
+
+def query_events(start: Union[str, pd.Timestamp, None] = None,
+                 end: Union[str, pd.Timestamp, None] = None,
+                 stations: Union[List[str], None] = None,
+                 countries: Union[List[str], None] = None,
+                 ptypes: Union[List[str], None] = None,
+                 sog: Union[bool, None] = None,
+                 min_duration: Union[int, None] = None,
+                 catalog: Union[str, Path] = SURFOBS_EVENT_CATALOG) -> pd.DataFrame:
+    """Returns events from the catalog that match all given criteria
+
+    Parameters
+    ----------
+    start : events starting at or after start
+    end : events starting before end
+    stations : list of station ids
+    countries : list of countries
+    ptypes : list of precipitation types.  Events must have at least one hour
+             of each type
+    sog : if True only events with snow on ground, if False only events
+          without snow on ground
+    min_duration : minimum duration in hours
+    catalog : path to catalog
+
+    Returns
+    -------
+    DataFrame of events indexed by start time
+    """
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append("start >= ?")
+        params.append(pd.Timestamp(start).strftime(TIME_FORMAT))
+    if end is not None:
+        clauses.append("start < ?")
+        params.append(pd.Timestamp(end).strftime(TIME_FORMAT))
+    if stations:
+        clauses.append(f"station IN ({', '.join('?' * len(stations))})")
+        params.extend(stations)
+    if countries:
+        clauses.append(f"country IN ({', '.join('?' * len(countries))})")
+        params.extend(countries)
+    for ptype in ptypes or []:
+        if ptype not in PTYPES:
+            raise ValueError(f"Unknown ptype {ptype}: expects one of {PTYPES}")
+        clauses.append(f"{ptype} > 0")
+    if sog is not None:
+        clauses.append("sog = ?")
+        params.append(int(sog))
+    if min_duration is not None:
+        clauses.append("duration >= ?")
+        params.append(min_duration)
+
+    sql = f"SELECT * FROM {TABLE}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY start, station"
+
+    with sqlite3.connect(catalog) as con:
+        df = pd.read_sql_query(sql, con, params=params, parse_dates=["start", "end"])
+    con.close()
+    if "sog" in df:
+        df["sog"] = df["sog"].astype("boolean")
+    df.index = df.start
+    df.index.name = "timestamp"
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Builds a catalog of events for "
+                                     f"all station event files in {SURFOBS_EVENTS_PATH}")
+    parser.add_argument("--catalog", type=str, default=SURFOBS_EVENT_CATALOG,
+                        help=f"Path to catalog (default {SURFOBS_EVENT_CATALOG})")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    build_event_catalog(catalog=args.catalog, verbose=args.verbose)
@@ -0,0 +1,150 @@
+"""Surface meteorology context for precipitation events
+
+Window statistics before, during and after each event are computed from the
+hourly series of a station.  The series is reindexed to a regular hourly
+index and cumulative sums of values, counts and hour indices are computed
+once.  Means and regression slopes for any window are then differences of
+the cumulative sums at the window bounds, so there is no loop over events.
+
+Windows
+-------
+pre : the hours hours before the event start
+event : from event start to event end
+post : the hours hours after the event end
+
+Slopes are least squares trends in units per hour.  Statistics are NaN if
+fewer than min_fraction of the hours in a window have valid values.
+
+Usage
+-----
+  events = summarize_events(find_events(df))
+  events = enrich_events(events, df)
+"""
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# (variable, statistic, window, hours)
+CONTEXT = [
+    ("t2m", "slope", "pre", 24),
+    ("t2m", "mean", "pre", 24),
+    ("t2m", "mean", "post", 24),
+    ("wspd", "mean", "pre", 24),
+    ("wspd", "mean", "event", None),
+    ("relh", "mean", "pre", 24),
+    ("relh", "mean", "event", None),
+    ("psurf", "slope", "pre", 24),
+    ("psurf", "slope", "event", None),
+    ]
+
+STATISTICS = ["mean", "slope"]
+WINDOWS = ["pre", "event", "post"]
+
+MIN_FRACTION = 0.5
+
+
+def context_name(variable: str, statistic: str, window: str, hours=None) -> str:
+    """Returns column name for a context statistic, e.g. t2m_slope_pre24h"""
+    if window == "event":
+        return f"{variable}_{statistic}_event"
+    return f"{variable}_{statistic}_{window}{hours}h"
+
+
+def prefix_sums(values: np.ndarray) -> Tuple[np.ndarray]:
+    """Returns cumulative sums used for window statistics, each with a leading
+    zero so that the sum over [a, b) is P[b] - P[a]
+
+    Counts and hour index sums are int64, so they are exact.
+    """
+    valid = ~np.isnan(values)
+    k = np.arange(len(values), dtype=np.int64)
+    y = np.where(valid, values, 0.)
+
+    def cumsum(x):
+        return np.concatenate([[0], np.cumsum(x)])
+
+    return (cumsum(valid.astype(np.int64)),
+            cumsum(np.where(valid, k, 0)),
+            cumsum(np.where(valid, k * k, 0)),
+            cumsum(y),
+            cumsum(y * k))
+
+
+def window_mean(sums, a, b):
+    """Returns mean and number of valid values in windows [a, b)"""
+    n = sums[0][b] - sums[0][a]
+    sy = sums[3][b] - sums[3][a]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, sy / n, np.nan), n
+
+
+def window_slope(sums, a, b):
+    """Returns least squares slope per hour and number of valid values in
+    windows [a, b)"""
+    n, sk, skk, sy, sky = [s[b] - s[a] for s in sums]
+    denominator = n * skk - sk * sk
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sky - sk * sy) / denominator
+    return np.where(denominator > 0, slope, np.nan), n
+
+
+def window_bounds(start, end, window, hours, nrow):
+    """Returns window bounds [a, b) as row positions for events with start and
+    end row positions"""
+    if window == "pre":
+        a, b = start - hours, start
+    elif window == "event":
+        a, b = start, end + 1
+    elif window == "post":
+        a, b = end + 1, end + 1 + hours
+    else:
+        raise ValueError(f"Unknown window {window}: expects one of {WINDOWS}")
+    return np.clip(a, 0, nrow), np.clip(b, 0, nrow), b - a
+
+
+def enrich_events(events: pd.DataFrame,
+                  hourly: pd.DataFrame,
+                  context: List[Tuple] = CONTEXT,
+                  min_fraction: float = MIN_FRACTION,
+                  freq: str = "1h") -> pd.DataFrame:
+    """Adds surface meteorology context statistics to event summaries
+
+    Parameters
+    ----------
+    events : event summary with start and end columns, see
+             ros_database.processing.extract_precip_events.summarize_events
+    hourly : hourly station series indexed by time
+    context : list of (variable, statistic, window, hours)
+    min_fraction : minimum fraction of valid hours in a window
+    freq : interval of hourly series
+
+    Returns
+    -------
+    copy of events with a column for each context statistic
+    """
+    events = events.copy()
+    hourly = hourly.sort_index()
+    index = pd.date_range(hourly.index[0].floor(freq), hourly.index[-1].ceil(freq), freq=freq)
+    hourly = hourly[~hourly.index.duplicated()].reindex(index)
+
+    step = pd.Timedelta(freq).value
+    t0 = index[0].value
+    start = (np.asarray(events.start, dtype="datetime64[ns]").view("int64") - t0) // step
+    end = (np.asarray(events.end, dtype="datetime64[ns]").view("int64") - t0) // step
+    nrow = len(index)
+
+    sums = {}
+    for variable, statistic, window, hours in context:
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic {statistic}: expects one of {STATISTICS}")
+        if variable not in sums:
+            sums[variable] = prefix_sums(hourly[variable].to_numpy(dtype=float))
+        a, b, length = window_bounds(start, end, window, hours, nrow)
+        if statistic == "mean":
+            value, n = window_mean(sums[variable], a, b)
+        else:
+            value, n = window_slope(sums[variable], a, b)
+        enough = n >= np.ceil(min_fraction * length)
+        events[context_name(variable, statistic, window, hours)] = np.where(enough, value, np.nan)
+    return events
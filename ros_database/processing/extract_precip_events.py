@@ -2,8 +2,19 @@
 import pandas as pd
 import numpy as np
 
+from ros_database.processing.surface import read_station_columns
+
 PTYPES = ['UP','RA','FZRA','SOLID']
 
+# Columns needed to find and summarize events
+EVENT_COLUMNS = PTYPES + ['t2m', 'p01i', 'sog']
+
+SUMMARY_COLUMNS = ['start', 'end', 'duration', 'RA', 'UP', 'FZRA', 'SOLID',
+                   't2m_mean', 't2m_min', 't2m_max', 'precip', 'sog']
+
+# Number of rows read at a time by the streaming extractor
+CHUNKSIZE = 100_000
+
 
 def identify_events(df):
     """Returns a modified dataframe containing contiguous precipitation events
@@ -13,6 +24,77 @@ def identify_events(df):
     return df[df["PRECIP"]]
 
 
+def segment_events(df, max_dry_gap="0h", max_missing_gap="0h", freq="1h", ros=False):
+    """Returns event labels for precipitating rows using timestamps
+
+    Consecutive precipitating rows belong to the same event if the dry time
+    and the missing time between them do not exceed max_dry_gap and
+    max_missing_gap.  Dry time is the number of observed rows with no
+    precipitation type times freq.  Missing time is the rest of the elapsed
+    time, i.e. rows with all precipitation types missing and absent rows.
+    Gaps are computed in a single vectorized pass over int64 times.
+
+    With the default gaps, events are runs of precipitating rows that are
+    exactly freq apart.
+
+    Parameters
+    ----------
+    df : DataFrame indexed by time containing PTYPES columns, and sog if ros
+         is True
+    max_dry_gap : maximum dry time within an event
+    max_missing_gap : maximum missing time within an event
+    freq : observation interval
+    ros : if True label rain-on-snow sub-events: runs of RA or FZRA with snow on
+          ground, within an event, split by the same gap rules.  Observed
+          precipitating rows that are not rain-on-snow, e.g. SOLID, always
+          split sub-events
+
+    Returns
+    -------
+    DataFrame indexed by precipitating rows with an event column, starting at
+    1, and a ros_event column if ros is True.  ros_event is NA for rows that
+    are not rain-on-snow
+    """
+    df = df.sort_index()
+    times = np.asarray(df.index, dtype="datetime64[ns]").view("int64")
+    step = pd.Timedelta(freq).value
+    max_dry = pd.Timedelta(max_dry_gap).value
+    max_missing = pd.Timedelta(max_missing_gap).value
+
+    precip = df[PTYPES].fillna(False).astype(bool).any(axis=1).to_numpy()
+    valid = df[PTYPES].notna().any(axis=1).to_numpy()
+    ndry = np.cumsum(valid & ~precip)
+
+    def labels(mask, nbreak=None):
+        """Returns event number for rows in mask.  Rows counted by the cumulative
+        sum nbreak split events"""
+        pos = np.flatnonzero(mask)
+        dry = (ndry[pos][1:] - ndry[pos][:-1]) * step
+        nother = 0 if nbreak is None else (nbreak[pos][1:] - nbreak[pos][:-1])
+        missing = np.diff(times[pos]) - step - dry - nother * step
+        new = np.concatenate([[True], (dry > max_dry) | (missing > max_missing) | (nother > 0)])
+        return pos, new[:len(pos)]
+
+    pos, new = labels(precip)
+    event = np.cumsum(new)
+    result = pd.DataFrame({"event": event}, index=df.index[pos])
+
+    if ros:
+        sog = df["sog"].fillna(False).astype(bool).to_numpy()
+        is_ros = (df["RA"].fillna(False).astype(bool) |
+                  df["FZRA"].fillna(False).astype(bool)).to_numpy() & sog & precip
+        ros_pos, ros_new = labels(is_ros, nbreak=np.cumsum(precip & ~is_ros))
+        # Sub-events do not span events
+        event_at = np.zeros(len(df), dtype=np.int64)
+        event_at[pos] = event
+        ros_new[1:] |= np.diff(event_at[ros_pos]) != 0
+        ros_event = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        ros_event.iloc[ros_pos] = np.cumsum(ros_new)
+        result["ros_event"] = ros_event.iloc[pos].to_numpy()
+
+    return result
+
+
 # Helper routines for summarizing events
 def event_start(x):
     return x.index[0]
@@ -56,8 +138,24 @@ def precip_sum(x, skipna=False):
     return x['p01i'].sum(skipna=skipna)
 
 
+def count_ros_events(x):
+    """Returns number of rain-on-snow sub-events"""
+    return x['ros_event'].nunique()
+
+
+def ros_duration(x):
+    """Returns number of rain-on-snow hours"""
+    return int(x['ros_event'].notna().sum())
+
+
 def summarize_events(df):
-    """Returns summary statitistics for each event"""
+    """Returns summary statitistics for each event.  If df has a ros_event
+    column, counts of rain-on-snow sub-events and hours are added.  sog has
+    nullable boolean dtype"""
+    if len(df) == 0:
+        columns = SUMMARY_COLUMNS + (["ros_events", "ros_duration"] if "ros_event" in df else [])
+        summary = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name="timestamp"))
+        return summary.astype({"sog": "boolean"})
     grouper = df.groupby(df.event)
     summary = pd.DataFrame(
                       {
@@ -72,16 +170,93 @@ def summarize_events(df):
                           "t2m_min": grouper.apply(t2m_min),
                           "t2m_max": grouper.apply(t2m_max),
                           "precip": grouper.apply(precip_sum),
-                          "sog": grouper.apply(is_sog),
+                          "sog": grouper.apply(is_sog).astype("boolean"),
                       }
     )
+    if "ros_event" in df:
+        summary["ros_events"] = grouper.apply(count_ros_events)
+        summary["ros_duration"] = grouper.apply(ros_duration)
     summary.index = summary.start
     summary.index.name = "timestamp"
     return summary
 
 
-def find_events(df):
-    """Finds precipitation events"""
-    df_precip = identify_events(df)
+def find_events(df, max_dry_gap=None, max_missing_gap=None, freq="1h", ros=False):
+    """Finds precipitation events
+
+    By default events are runs of consecutive precipitating rows.  If
+    max_dry_gap, max_missing_gap or ros are given, events are segmented
+    using timestamps.  See segment_events
+    """
+    if (max_dry_gap is None) and (max_missing_gap is None) and not ros:
+        df_precip = identify_events(df)
+    else:
+        labels = segment_events(df,
+                                max_dry_gap=max_dry_gap or "0h",
+                                max_missing_gap=max_missing_gap or "0h",
+                                freq=freq, ros=ros)
+        df_precip = df.loc[labels.index].join(labels)
     result = summarize_events(df_precip)
     return result
+
+
+def read_event_columns(fp, chunksize=CHUNKSIZE):
+    """Returns an iterator of time-ordered chunks of a combined hourly file
+    containing only EVENT_COLUMNS"""
+    return read_station_columns(fp, EVENT_COLUMNS, chunksize=chunksize)
+
+
+def event_is_closed(df, end, max_dry_gap=None, max_missing_gap=None, freq="1h",
+                    ros=False):
+    """Returns True if an event ending at end cannot continue after the last
+    row of df.  Arguments are the same as find_events"""
+    trailing = df.loc[df.index > end]
+    if (max_dry_gap is None) and (max_missing_gap is None) and not ros:
+        return len(trailing) > 0
+    dry = trailing[PTYPES].notna().any(axis=1).sum() * pd.Timedelta(freq)
+    missing = (df.index[-1] - end) - dry
+    return ((dry > pd.Timedelta(max_dry_gap or "0h")) or
+            (missing > pd.Timedelta(max_missing_gap or "0h")))
+
+
+def iter_events(chunks, **kwargs):
+    """Yields event summaries for closed events from an iterator of
+    time-ordered chunks
+
+    If the last event in a chunk may continue into the next chunk, rows from
+    the start of that event are carried over and only earlier events are
+    emitted.  Memory is bounded by the chunk size and event length.
+
+    kwargs are passed to find_events
+    """
+    carry = None
+    for chunk in chunks:
+        df = chunk if carry is None else pd.concat([carry, chunk])
+        summary = find_events(df.copy(), **kwargs)
+        if len(summary) == 0:
+            carry = None
+            continue
+        if event_is_closed(df, summary.end.iloc[-1], **kwargs):
+            carry = None
+            yield summary
+            continue
+        carry = df.loc[summary.start.iloc[-1]:]
+        if len(summary) > 1:
+            yield summary.iloc[:-1]
+    if carry is not None:
+        yield find_events(carry.copy(), **kwargs)
+
+
+def find_events_streaming(fp, chunksize=CHUNKSIZE, **kwargs):
+    """Finds precipitation events in a combined hourly file without loading
+    the whole file.  Returns the same result as find_events on the full file
+
+    :fp: path to combined hourly file
+    :chunksize: number of rows read at a time
+
+    kwargs are passed to find_events
+    """
+    summaries = list(iter_events(read_event_columns(fp, chunksize=chunksize), **kwargs))
+    if len(summaries) == 0:
+        return summarize_events(pd.DataFrame(columns=["event"]))
+    return pd.concat(summaries)
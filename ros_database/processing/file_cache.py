@@ -0,0 +1,162 @@
+"""Cache of per-station results keyed on file signatures
+
+Reports and aggregates over the whole database apply a function to every
+station file.  Results are stored in a pickle with the modification time
+and size of each file, so after a small update only files that changed are
+processed again.
+
+The cache also stores the name of the function, a version of its results
+and params, e.g. the columns counted.  If any of these differ from the
+cache all files are processed again, so the version must be incremented
+when the results of a function change.  Entries for files that are no
+longer mapped are dropped.
+
+Example
+-------
+  results = cached_map(station_inventory, filepaths, cache_path="inventory.cache.pkl",
+                       version=2, jobs=8)
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+import pickle
+import warnings
+
+from tqdm import tqdm
+
+CACHE_VERSION = 2
+
+
+def file_signature(fp: Union[str, Path]) -> Tuple[int, int]:
+    """Returns modification time in ns and size in bytes of a file"""
+    stat = Path(fp).stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def cache_key(fp: Union[str, Path]) -> str:
+    """Returns cache key for a file"""
+    return str(Path(fp).resolve())
+
+
+def func_name(func: Callable) -> str:
+    """Returns module and qualified name of a function.  functools.partial
+    objects are unwrapped, their arguments are expected in params"""
+    while isinstance(func, partial):
+        func = func.func
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def cache_header(func: Callable, version: int = 0, params=None) -> dict:
+    """Returns header identifying results in a cache"""
+    return {"version": CACHE_VERSION, "func": func_name(func),
+            "result_version": version, "params": params}
+
+
+def load_cache(cache_path: Union[str, Path], header: dict) -> dict:
+    """Returns cache entries {key: (signature, result)}.  Empty if the cache does
+    not exist or header differs from the cache header"""
+    cache_path = Path(cache_path)
+    if not cache_path.exists():
+        return {}
+    with open(cache_path, "rb") as f:
+        cache = pickle.load(f)
+    if any(cache.get(name) != value for name, value in header.items()):
+        return {}
+    return cache["entries"]
+
+
+def save_cache(entries: dict, cache_path: Union[str, Path], header: dict) -> None:
+    """Writes cache entries.  The cache is written to a temporary file and
+    renamed, so an interrupted write does not corrupt the cache"""
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({**header, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(cache_path)
+
+
+def cached_map(func: Callable,
+               filepaths: List[Union[str, Path]],
+               cache_path: Union[str, Path, None] = None,
+               params=None,
+               version: int = 0,
+               jobs: int = 1,
+               progress: bool = False,
+               errors: Union[Dict[Path, str], None] = None,
+               verbose: bool = False) -> Dict[Path, object]:
+    """Applies func to each file, reusing cached results for files that have not
+    changed
+
+    Parameters
+    ----------
+    func : callable taking a filepath.  Must be picklable if jobs > 1
+    filepaths : list of files
+    cache_path : path to cache.  Results are not cached if None
+    params : parameters of func that results depend on
+    version : version of func results.  Increment when results change
+    jobs : number of worker processes
+    progress : display progress bar
+    errors : if given, error messages for files for which func raised an
+             exception are added to errors.  Errors are not cached
+    verbose : verbose output
+
+    Returns
+    -------
+    dict of filepath and result in the order of filepaths.  Files for which
+    func raised an exception are skipped with a warning
+    """
+    filepaths = [Path(fp) for fp in filepaths]
+    header = cache_header(func, version=version, params=params)
+    entries = load_cache(cache_path, header) if cache_path else {}
+
+    results = {}
+    todo = []
+    for fp in filepaths:
+        key, signature = cache_key(fp), file_signature(fp)
+        entry = entries.get(key)
+        if entry is not None and entry[0] == signature:
+            results[fp] = entry[1]
+        else:
+            todo.append((fp, key, signature))
+    if verbose: print(f"Using cached results for {len(results)} files, "
+                      f"processing {len(todo)} files")
+
+    def store(fp, key, signature, result):
+        results[fp] = result
+        entries[key] = (signature, result)
+
+    def fail(fp, err):
+        warnings.warn(f"Failed to process {fp}: {err}", UserWarning)
+        if errors is not None:
+            errors[fp] = f"{type(err).__name__}: {err}"
+
+    pbar = tqdm(total=len(todo)) if progress else None
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(func, fp): (fp, key, signature)
+                       for fp, key, signature in todo}
+            for future in as_completed(futures):
+                fp, key, signature = futures[future]
+                try:
+                    store(fp, key, signature, future.result())
+                except Exception as err:
+                    fail(fp, err)
+                if pbar is not None: pbar.update()
+    else:
+        for fp, key, signature in todo:
+            try:
+                store(fp, key, signature, func(fp))
+            except Exception as err:
+                fail(fp, err)
+            if pbar is not None: pbar.update()
+    if pbar is not None: pbar.close()
+
+    keys = {cache_key(fp) for fp in filepaths}
+    stale = [key for key in entries if key not in keys]
+    for key in stale:
+        del entries[key]
+    if cache_path and (todo or stale):
+        save_cache(entries, cache_path, header)
+    return {fp: results[fp] for fp in filepaths if fp in results}
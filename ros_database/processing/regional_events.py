@@ -0,0 +1,198 @@
+"""Groups station events into regional events
+
+Station events are linked if their stations are within max_distance of each
+other and the events overlap in time, allowing for a gap of max_time_gap.
+Regional events are the connected components of the linked events.
+
+Neighbouring stations are found with a KD-tree on station coordinates as
+unit vectors, so distances are great circle distances.  Overlapping events
+are found with a sweep over events sorted by start time, processed in blocks
+so memory is bounded for the full record.
+
+Usage
+-----
+To cluster rain-on-snow events from the event catalog
+
+  python -m ros_database.processing.regional_events regional_ros_events.csv --ros --verbose
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS = 6371.  # km
+
+# Default linking thresholds
+MAX_DISTANCE = 300.  # km
+MAX_TIME_GAP = "6h"
+
+# Number of events processed at a time in the time sweep
+BLOCK_SIZE = 100_000
+
+
+def to_unit_vectors(latitude, longitude) -> np.ndarray:
+    """Returns (n, 3) array of unit vectors for geographic coordinates"""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+def neighbour_pairs(latitude, longitude, max_distance: float = MAX_DISTANCE) -> np.ndarray:
+    """Returns (npair, 2) array of indices of stations within max_distance km.
+    Each pair is returned once with i < j"""
+    chord = 2. * np.sin(max_distance / (2. * EARTH_RADIUS))
+    tree = cKDTree(to_unit_vectors(latitude, longitude))
+    return tree.query_pairs(chord, output_type="ndarray")
+
+
+def overlapping_event_pairs(start, end, station, neighbour_keys, nstation,
+                            max_time_gap=MAX_TIME_GAP,
+                            block_size: int = BLOCK_SIZE) -> Tuple[np.ndarray]:
+    """Returns pairs of events at neighbouring stations that overlap in time
+
+    Parameters
+    ----------
+    start : event start times sorted in ascending order
+    end : event end times
+    station : integer station index for each event
+    neighbour_keys : sorted array of i * nstation + j for neighbouring
+                     stations i and j, in both orders
+    nstation : number of stations
+    max_time_gap : events separated by up to max_time_gap are linked
+    block_size : number of events in each block of the sweep
+
+    Returns
+    -------
+    Tuple of arrays of event indices i and j
+    """
+    start = np.asarray(start, dtype="datetime64[ns]").view("int64")
+    end = np.asarray(end, dtype="datetime64[ns]").view("int64")
+    gap = pd.Timedelta(max_time_gap).value
+    # Events starting at or before the end of event i, plus gap, overlap i
+    last = np.searchsorted(start, end + gap, side="right")
+
+    pairs_i, pairs_j = [], []
+    for b0 in range(0, len(start), block_size):
+        i = np.arange(b0, min(b0 + block_size, len(start)))
+        count = np.maximum(last[i] - i - 1, 0)
+        ii = np.repeat(i, count)
+        jj = ii + 1 + (np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count))
+        keys = station[ii].astype(np.int64) * nstation + station[jj]
+        linked = np.isin(keys, neighbour_keys, assume_unique=False)
+        pairs_i.append(ii[linked])
+        pairs_j.append(jj[linked])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def cluster_events(events: pd.DataFrame,
+                   max_distance: float = MAX_DISTANCE,
+                   max_time_gap=MAX_TIME_GAP,
+                   block_size: int = BLOCK_SIZE) -> pd.DataFrame:
+    """Labels station events with a regional event id
+
+    :events: DataFrame with station, start, end, latitude and longitude columns,
+             e.g. from ros_database.processing.event_catalog.query_events
+    :max_distance: maximum distance between linked stations in km
+    :max_time_gap: maximum time between linked events
+
+    :returns: copy of events sorted by start with a regional_event column
+    """
+    events = events.sort_values(["start", "station"]).reset_index(drop=True)
+    stations = events.groupby("station")[["latitude", "longitude"]].first()
+    station = stations.index.get_indexer(events.station)
+    nstation = len(stations)
+
+    pairs = neighbour_pairs(stations.latitude, stations.longitude, max_distance=max_distance)
+    neighbour_keys = np.sort(np.concatenate([pairs[:, 0] * nstation + pairs[:, 1],
+                                             pairs[:, 1] * nstation + pairs[:, 0]]))
+
+    i, j = overlapping_event_pairs(events.start, events.end, station, neighbour_keys,
+                                   nstation, max_time_gap=max_time_gap,
+                                   block_size=block_size)
+    nevent = len(events)
+    graph = coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(nevent, nevent))
+    _, labels = connected_components(graph, directed=False)
+
+    # Number regional events in order of start time
+    _, first = np.unique(labels, return_index=True)
+    order = np.empty(len(first), dtype=np.int64)
+    order[np.argsort(first)] = np.arange(len(first))
+    events["regional_event"] = order[labels]
+    return events
+
+
+def summarize_regional_events(events: pd.DataFrame) -> pd.DataFrame:
+    """Returns a table of regional events from clustered station events
+
+    Station events are referenced by station and start time in the
+    station_events column as station@start
+    """
+    grouper = events.groupby("regional_event")
+    ptypes = [ptype for ptype in ["UP", "RA", "FZRA", "SOLID"] if ptype in events]
+    reference = events.station + "@" + events.start.dt.strftime("%Y-%m-%dT%H:%M")
+    regional = pd.DataFrame(
+        {
+            "start": grouper.start.min(),
+            "end": grouper.end.max(),
+            "nstation": grouper.station.nunique(),
+            "nevent": grouper.size(),
+            "latitude": grouper.latitude.mean(),
+            "longitude": grouper.longitude.mean(),
+            "stations": grouper.station.agg(lambda x: " ".join(sorted(set(x)))),
+            "station_events": reference.groupby(events.regional_event).agg(" ".join),
+        })
+    regional = regional.join(grouper[ptypes].sum())
+    return regional
+
+
+def make_regional_events(events: pd.DataFrame,
+                         max_distance: float = MAX_DISTANCE,
+                         max_time_gap=MAX_TIME_GAP,
+                         min_stations: int = 1) -> Tuple[pd.DataFrame]:
+    """Clusters station events and returns station events with regional event
+    ids and the regional event table, keeping regional events with at least
+    min_stations stations"""
+    events = cluster_events(events, max_distance=max_distance, max_time_gap=max_time_gap)
+    regional = summarize_regional_events(events)
+    regional = regional[regional.nstation >= min_stations]
+    return events, regional
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ros_database.filepath import SURFOBS_EVENT_CATALOG
+    from ros_database.processing.event_catalog import query_events
+
+    parser = argparse.ArgumentParser(description="Groups station events from the event "
+                                     "catalog into regional events")
+    parser.add_argument("outfile", type=str,
+                        help="Path to write regional event table as csv")
+    parser.add_argument("--catalog", type=str, default=SURFOBS_EVENT_CATALOG,
+                        help="Path to event catalog")
+    parser.add_argument("--max_distance", type=float, default=MAX_DISTANCE,
+                        help=f"Maximum distance between stations in km (default {MAX_DISTANCE})")
+    parser.add_argument("--max_time_gap", type=str, default=MAX_TIME_GAP,
+                        help=f"Maximum time between events (default {MAX_TIME_GAP})")
+    parser.add_argument("--min_stations", type=int, default=2,
+                        help="Minimum number of stations in a regional event")
+    parser.add_argument("--ros", action="store_true",
+                        help="Only cluster rain-on-snow events")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    events = query_events(catalog=args.catalog, sog=True if args.ros else None)
+    if args.ros:
+        events = events[(events.RA > 0) | (events.FZRA > 0)]
+    if args.verbose: print(f"Clustering {len(events)} station events")
+    _, regional = make_regional_events(events, max_distance=args.max_distance,
+                                       max_time_gap=args.max_time_gap,
+                                       min_stations=args.min_stations)
+    if args.verbose: print(f"Writing {len(regional)} regional events to {args.outfile}")
+    regional.to_csv(args.outfile)
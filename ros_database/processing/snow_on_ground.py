@@ -0,0 +1,241 @@
+"""Snow on ground for stations from multiple sources
+
+IMS snow cover, ERA5 snow depth (sd) and ERA5-Land snow cover (snowc), sampled
+at station pixels, are converted to snow on ground and aligned to a common
+hourly index for all stations.  Sources are stacked into a single int8 array
+with dimensions (source, time, station), coded 1 for snow on ground, 0 for
+snow free and -1 for missing.  A priority or consensus rule is then applied
+to the whole stack in one pass.
+
+Rules
+-----
+priority : the first source in priority order with a valid value is used.
+consensus : the majority of valid sources is used.  Ties are resolved with the
+            priority rule.
+
+The source used for each hour and station is recorded in sog_source.
+"""
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from ros_database.filepath import STATIONS_SURFACE_REANALYSIS, STATIONS_SNOW_ON_GROUND
+from ros_database.processing.align import asof_indexer
+from ros_database.processing.combine_hourly_with_ims_snowcover import load_snow_cover_codes
+from ros_database.ims_snow.codes import LAND, SNOW
+
+SOURCES = ["ims", "era5_sd", "era5_land_snowc"]
+
+# Validity window of each source value
+TOLERANCE = {
+    "ims": "24h",
+    "era5_sd": "1h",
+    "era5_land_snowc": "6h",
+    }
+
+# ERA5 snow depth threshold in m of water equivalent
+SD_THRESHOLD = 0.01
+# ERA5-Land snow cover threshold in percent
+SNOWC_THRESHOLD = 50.
+
+MISSING = -1
+
+RULES = ["priority", "consensus"]
+
+
+def to_sog_codes(is_snow, is_valid):
+    """Returns int8 codes: 1 snow on ground, 0 snow free, -1 missing"""
+    return np.where(is_valid, is_snow.astype(np.int8), np.int8(MISSING)).astype(np.int8)
+
+
+def ims_snow_on_ground(resolution="4km"):
+    """Returns IMS snow on ground codes as a dataframe with stations as columns"""
+    codes = load_snow_cover_codes(resolution)
+    values = codes.to_numpy()
+    return pd.DataFrame(to_sog_codes(values == SNOW, np.isin(values, [LAND, SNOW])),
+                        index=codes.index, columns=codes.columns)
+
+
+def era5_sd_snow_on_ground(threshold=SD_THRESHOLD):
+    """Returns ERA5 snow on ground codes from station snow depth"""
+    filepaths = sorted(STATIONS_SURFACE_REANALYSIS.glob("era5.surface.stations.*.nc"))
+    with xr.open_mfdataset(filepaths, combine="by_coords") as ds:
+        sd = ds["sd"].transpose("time", "station").to_pandas()
+    values = sd.to_numpy()
+    return pd.DataFrame(to_sog_codes(values > threshold, ~np.isnan(values)),
+                        index=sd.index, columns=sd.columns)
+
+
+def era5_land_snow_on_ground(station_path, threshold=SNOWC_THRESHOLD):
+    """Returns ERA5-Land snow on ground codes from station snow cover
+
+    :station_path: directory containing ERA5-Land station files.  See
+                   ros_database.reanalysis.era5_land.make_station_filepath
+    """
+    filepaths = sorted(station_path.glob("era5_land.snow.stations.*.nc"))
+    with xr.open_mfdataset(filepaths, combine="by_coords") as ds:
+        time_dim = "valid_time" if "valid_time" in ds.dims else "time"
+        snowc = ds["snowc"].transpose(time_dim, "station").to_pandas()
+    values = snowc.to_numpy()
+    return pd.DataFrame(to_sog_codes(values > threshold, ~np.isnan(values)),
+                        index=snowc.index, columns=snowc.columns)
+
+
+def stack_sources(sources: Dict[str, pd.DataFrame],
+                  index: pd.DatetimeIndex,
+                  stations: List[str],
+                  tolerance: Dict[str, str] = TOLERANCE) -> xr.DataArray:
+    """Aligns sources to index and stations and stacks them
+
+    :sources: dict of dataframes of snow on ground codes with stations as columns
+    :index: DatetimeIndex to align to
+    :stations: list of station ids
+    :tolerance: validity window for each source
+
+    :returns: int8 xarray.DataArray with dimensions (source, time, station)
+    """
+    stack = np.full((len(sources), len(index), len(stations)), MISSING, dtype=np.int8)
+    for i, (name, codes) in enumerate(sources.items()):
+        codes = codes.sort_index().reindex(columns=stations, fill_value=MISSING)
+        pos = asof_indexer(codes.index, index, tolerance[name])
+        values = codes.to_numpy(dtype=np.int8)
+        stack[i] = np.where((pos >= 0)[:, None], values[np.clip(pos, 0, None)], MISSING)
+    return xr.DataArray(stack, dims=["source", "time", "station"],
+                        coords={"source": list(sources), "time": index,
+                                "station": stations})
+
+
+def merge_snow_on_ground(stack: np.ndarray, rule: str = "priority"):
+    """Merges stacked sources to a single snow on ground array
+
+    :stack: int8 array (source, ...) in priority order
+    :rule: priority or consensus
+
+    :returns: tuple of sog codes and source used.  Source used is 0 if all
+              sources are missing, i + 1 for source i and nsource + 1 where
+              the consensus of sources is used.  Consensus needs at least two
+              valid sources, otherwise the single valid source is used.
+    """
+    if rule not in RULES:
+        raise ValueError(f"Unknown rule {rule}: expects one of {RULES}")
+
+    nsource = stack.shape[0]
+    valid = stack != MISSING
+    any_valid = valid.any(axis=0)
+    first = valid.argmax(axis=0)
+    sog = np.where(any_valid, np.take_along_axis(stack, first[None], axis=0)[0], MISSING)
+    source = np.where(any_valid, first + 1, 0)
+
+    if rule == "consensus":
+        nvalid = valid.sum(axis=0)
+        nsnow = (stack == 1).sum(axis=0)
+        majority = (2 * nsnow != nvalid) & (nvalid >= 2)
+        sog = np.where(majority, (2 * nsnow > nvalid), sog)
+        source = np.where(majority, nsource + 1, source)
+
+    return sog.astype(np.int8), source.astype(np.int8)
+
+
+def make_snow_on_ground(sources: Dict[str, pd.DataFrame],
+                        index: Union[pd.DatetimeIndex, None] = None,
+                        priority: Union[List[str], None] = None,
+                        rule: str = "priority",
+                        tolerance: Dict[str, str] = TOLERANCE) -> xr.Dataset:
+    """Creates snow on ground for all stations from multiple sources
+
+    :sources: dict of dataframes of snow on ground codes with stations as columns
+    :index: hourly DatetimeIndex.  Default spans all sources
+    :priority: list of source names in priority order.  Default is order of sources
+    :rule: priority or consensus
+    :tolerance: validity window for each source
+
+    :returns: xarray.Dataset with sog and sog_source (time, station)
+    """
+    if priority is None:
+        priority = list(sources)
+    sources = {name: sources[name] for name in priority}
+
+    if index is None:
+        start = min(df.index.min() for df in sources.values()).floor("h")
+        end = max(df.index.max() for df in sources.values()).ceil("h")
+        index = pd.date_range(start, end, freq="h")
+    stations = sorted(set().union(*[df.columns for df in sources.values()]))
+
+    stack = stack_sources(sources, index, stations, tolerance=tolerance)
+    sog, source = merge_snow_on_ground(stack.values, rule=rule)
+
+    coords = {"time": index, "station": stations}
+    ds = xr.Dataset(
+        {
+            "sog": (("time", "station"), sog),
+            "sog_source": (("time", "station"), source),
+        },
+        coords=coords)
+    ds.sog.attrs = {
+        "long_name": "snow on ground",
+        "flag_values": [-1, 0, 1],
+        "flag_meanings": "missing snow_free snow_on_ground",
+        }
+    ds.sog_source.attrs = {
+        "long_name": "source of snow on ground",
+        "flag_values": list(range(len(priority) + 2)),
+        "flag_meanings": " ".join(["none"] + priority + ["consensus"]),
+        "rule": rule,
+        }
+    return ds
+
+
+def station_snow_on_ground(ds, stnid, index):
+    """Returns snow on ground for a station as a nullable boolean Series aligned
+    to index"""
+    codes = ds.sog.sel(station=stnid).to_series().reindex(index, fill_value=MISSING)
+    values = codes.to_numpy()
+    return pd.Series(pd.arrays.BooleanArray(values == 1, values == MISSING),
+                     index=index, name="sog")
+
+
+def make_station_snow_on_ground(era5_land_path=None, priority=None, rule="priority",
+                                verbose=False):
+    """Creates snow on ground from all available sources and writes it to
+    STATIONS_SNOW_ON_GROUND"""
+    if verbose: print("Loading IMS snow cover")
+    sources = {"ims": ims_snow_on_ground()}
+    if verbose: print("Loading ERA5 snow depth")
+    sources["era5_sd"] = era5_sd_snow_on_ground()
+    if era5_land_path is not None:
+        if verbose: print("Loading ERA5-Land snow cover")
+        sources["era5_land_snowc"] = era5_land_snow_on_ground(era5_land_path)
+
+    if priority is not None:
+        priority = [name for name in priority if name in sources]
+    ds = make_snow_on_ground(sources, priority=priority, rule=rule)
+
+    STATIONS_SNOW_ON_GROUND.parent.mkdir(parents=True, exist_ok=True)
+    if verbose: print(f"Writing snow on ground to {STATIONS_SNOW_ON_GROUND}")
+    encoding = {name: {"zlib": True, "complevel": 4} for name in ds.data_vars}
+    ds.to_netcdf(STATIONS_SNOW_ON_GROUND, encoding=encoding)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Creates snow on ground for stations "
+                                     "from multiple sources")
+    parser.add_argument("--era5_land_path", type=Path, default=None,
+                        help="Directory containing ERA5-Land station files")
+    parser.add_argument("--priority", type=str, nargs="+", default=None,
+                        choices=SOURCES,
+                        help="Sources in priority order.  Default is "
+                        f"{' '.join(SOURCES)}")
+    parser.add_argument("--rule", type=str, default="priority", choices=RULES,
+                        help="Rule used to merge sources")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
+
+    make_station_snow_on_ground(era5_land_path=args.era5_land_path,
+                                priority=args.priority, rule=args.rule,
+                                verbose=args.verbose)
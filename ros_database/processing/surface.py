@@ -354,6 +354,26 @@ def load_hourly_observations(fp: Path) -> pd.DataFrame:
     return pd.read_csv(fp, parse_dates=True, index_col=0, low_memory=False)
 
 
+def read_station_columns(fp: Path, columns: List[str], chunksize=None):
+    """Reads only the time index and columns from a station file.  Columns
+    not in the file are ignored
+
+    Arguments
+    ---------
+    fp : path to station file
+    columns : list of columns to read
+    chunksize : if given, returns an iterator of chunks of chunksize rows
+
+    Returns
+    -------
+    Pandas dataframe indexed by time
+    """
+    header = pd.read_csv(fp, nrows=0).columns
+    usecols = [header[0]] + [col for col in columns if col in header]
+    return pd.read_csv(fp, index_col=0, header=0, parse_dates=True,
+                       usecols=usecols, chunksize=chunksize)
+
+
 def load_event_file(fp: Path) -> pd.DataFrame:
     """Loads an event file"""
     return pd.read_csv(fp, header=0, index_col=0, parse_dates=[0,1,2])
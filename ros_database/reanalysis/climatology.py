@@ -0,0 +1,144 @@
+'''Extracts reanalysis daily climatologies for stations and calculates anomalies
+
+Climatologies listed in CLIMATOLOGY_FILES are sampled at station pixels once
+and cached as small (dayofyear, [level,] station) files in STATIONS_CLIMATOLOGY.
+Anomalies for station series are then calculated by indexing the cached
+climatology with the day of year of each timestamp.
+
+Climatologies use a 365 day calendar.  Feb 29 is merged with Feb 28, and
+days after Feb 29 in leap years are mapped to the same calendar date in
+other years.
+'''
+import warnings
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from ros_database.filepath import CLIMATOLOGY_FILES, STATIONS_CLIMATOLOGY
+from ros_database.reanalysis.extract_reanalysis_for_stations import load_stations
+
+DAYOFYEAR = np.arange(1, 366)
+
+
+def station_climatology_filepath(name):
+    """Returns path to cached station climatology"""
+    return STATIONS_CLIMATOLOGY / f"era5.{name}.climatology.stations.nc"
+
+
+def noleap_dayofyear(time) -> np.ndarray:
+    """Returns day of year on a 365 day calendar.  Feb 29 is day 59, the same
+    day as Feb 28, and later days in leap years are shifted back one day"""
+    time = pd.DatetimeIndex(np.asarray(time))
+    doy = time.dayofyear.to_numpy()
+    return np.where(time.is_leap_year & (doy >= 60), doy - 1, doy)
+
+
+def to_dayofyear(ds):
+    """Returns climatology with a dayofyear dimension for days 1 to 365.  A time
+    dimension is converted to dayofyear, with Feb 29 averaged with Feb 28.
+
+    Climatologies that already have a dayofyear dimension must be on the 365
+    day calendar.  Station climatologies cached with days 1 to 366 must be
+    extracted again with clobber=True.
+    """
+    if "dayofyear" not in ds.dims:
+        ds = ds.assign_coords(dayofyear=("time", noleap_dayofyear(ds.time)))
+        ds = ds.groupby("dayofyear").mean("time")
+    elif ds.dayofyear.max() > DAYOFYEAR[-1]:
+        raise ValueError("Climatology has day of year 366: expects a 365 day calendar")
+    return ds.reindex(dayofyear=DAYOFYEAR)
+
+
+def extract_climatology_for_stations(name, verbose=False, clobber=False):
+    """Samples a gridded daily climatology at station pixels and writes it to
+    STATIONS_CLIMATOLOGY
+
+    :name: key of CLIMATOLOGY_FILES, e.g. surface or temperature
+    :verbose: verbose output
+    :clobber: overwrite existing file
+    """
+    fout = station_climatology_filepath(name)
+    if fout.is_file() & (not clobber):
+        warnings.warn(f"File exists!  Skipping extracting {name} climatology for stations",
+                      UserWarning)
+        return
+
+    if verbose: print(f"   Extracting {name} climatology for stations...")
+    longitude, latitude = load_stations()
+    with xr.open_dataset(CLIMATOLOGY_FILES[name]) as ds:
+        sub_ds = ds.sel(longitude=longitude, latitude=latitude, method="nearest")
+        sub_ds = to_dayofyear(sub_ds.load())
+
+    fout.parent.mkdir(parents=True, exist_ok=True)
+    if verbose: print(f"   Writing station climatology to {fout}")
+    sub_ds.to_netcdf(fout)
+    return
+
+
+def load_station_climatology(name):
+    """Loads a cached station climatology into memory"""
+    with xr.open_dataset(station_climatology_filepath(name)) as ds:
+        return ds.load()
+
+
+def anomaly(da, climatology):
+    """Returns anomalies for a DataArray with a time dimension
+
+    :da: xarray.DataArray with time and, optionally, station and level dimensions
+    :climatology: xarray.DataArray with dayofyear and the same station and
+                  level dimensions
+
+    :returns: xarray.DataArray
+    """
+    doy = xr.DataArray(noleap_dayofyear(da.time), dims="time", coords={"time": da.time})
+    return da - climatology.sel(dayofyear=doy).drop_vars("dayofyear")
+
+
+def station_anomaly(series, climatology, stnid, level=None):
+    """Returns anomalies for a station time series
+
+    :series: pandas.Series with a DatetimeIndex
+    :climatology: xarray.DataArray with dayofyear, station and, optionally,
+                  level dimensions
+    :stnid: station id
+    :level: pressure level of series.  Required if climatology has a level
+            dimension
+
+    :returns: pandas.Series
+    """
+    clim = climatology.sel(station=stnid)
+    if "level" in clim.dims:
+        if level is None:
+            raise ValueError("climatology has a level dimension: level must be given")
+        clim = clim.sel(level=level)
+    clim = clim.transpose("dayofyear").values
+    return series - clim[noleap_dayofyear(series.index) - 1]
+
+
+def extract_station_climatologies(names=None, verbose=False, clobber=False):
+    """Extracts climatologies in CLIMATOLOGY_FILES for stations
+
+    :names: list of climatology names.  Default is all climatologies
+    """
+    if names is None:
+        names = list(CLIMATOLOGY_FILES.keys())
+    for name in names:
+        extract_climatology_for_stations(name, verbose=verbose, clobber=clobber)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract daily climatologies for stations")
+    parser.add_argument("--names", type=str, nargs="+", default=None,
+                        choices=list(CLIMATOLOGY_FILES.keys()),
+                        help="Climatologies to extract.  Default is all")
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Verbose output")
+    parser.add_argument("--clobber", "-c", action="store_true",
+                        help="Overwrite files")
+    args = parser.parse_args()
+
+    extract_station_climatologies(names=args.names, verbose=args.verbose,
+                                  clobber=args.clobber)
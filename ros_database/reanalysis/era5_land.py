@@ -0,0 +1,209 @@
+'''Batch download of ERA5-Land snow cover and snow depth from the Climate Data Store
+
+Requests are planned for each year and month.  Months that already have a
+valid file in the output directory are skipped.  Remaining months are
+requested concurrently, and each file is sampled at station pixels as soon as
+it is downloaded.  Skipped months are also sampled at station pixels when
+stations are given, so station files are written for months downloaded by
+an earlier run that stopped before sampling.
+
+The CDS client is created by a client_factory, which can be replaced with
+a stub that writes local files for testing.
+'''
+from typing import List, Union, Callable
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import calendar
+import warnings
+
+import xarray as xr
+
+ARCTIC = [90, -180, 45, 180]
+
+ALL_HOURS = [f"{h:02d}:00" for h in range(24)]
+
+FORECAST_HOURS = [
+    "00:00", "06:00", "12:00", "18:00",
+    ]
+
+VARIABLES = [
+    "snow_cover",
+    "snow_depth",
+    ]
+
+DATASET = "reanalysis-era5-land"
+
+# Maximum number of concurrent requests
+MAX_WORKERS = 4
+
+
+def make_filepath(year, month, outdir="."):
+    """Returns path to ERA5-Land snow file for a month"""
+    return Path(outdir) / f"era5_land.snow.{year}.{month:02d}.nc"
+
+
+def make_station_filepath(year, month, outdir="."):
+    """Returns path to ERA5-Land snow file sampled at stations for a month"""
+    return Path(outdir) / "stations" / f"era5_land.snow.stations.{year}.{month:02d}.nc"
+
+
+def get_days(year, month):
+    """Returns list of days in a month as zero padded strings"""
+    nday = calendar.monthrange(year, month)[1]
+    return [f"{n:02d}" for n in range(1, nday+1)]
+
+
+def make_request(year, month, area=ARCTIC, times=FORECAST_HOURS):
+    """Returns a CDS request for one month"""
+    return {
+        "variable": VARIABLES,
+        "year": f"{year}",
+        "month": f"{month:02d}",
+        "day": get_days(year, month),
+        "time": times,
+        "data_format": "netcdf",
+        "download_format": "unarchived",
+        "area": area,
+        }
+
+
+def time_dimension(ds):
+    """Returns the name of the time dimension.  CDS netcdf files use valid_time"""
+    return "valid_time" if "valid_time" in ds.dims else "time"
+
+
+def is_valid_file(fp, year, month, times=FORECAST_HOURS):
+    """Returns True if fp exists, can be opened and contains all days and times
+    for a month"""
+    fp = Path(fp)
+    if not fp.is_file():
+        return False
+    try:
+        with xr.open_dataset(fp) as ds:
+            ntime = ds.sizes[time_dimension(ds)]
+            has_variables = all(name in ds for name in ["snowc", "sde"])
+    except (OSError, ValueError, KeyError):
+        return False
+    return has_variables & (ntime == len(get_days(year, month)) * len(times))
+
+
+def plan_requests(years, months=range(1, 13), outdir=".",
+                  times=FORECAST_HOURS, clobber=False):
+    """Returns a list of (year, month) to request.  Months with a valid file in
+    outdir are skipped unless clobber is True"""
+    plan = []
+    for year in years:
+        for month in months:
+            if clobber or not is_valid_file(make_filepath(year, month, outdir),
+                                            year, month, times=times):
+                plan.append((year, month))
+    return plan
+
+
+def make_cds_client():
+    """Returns a cdsapi Client"""
+    import cdsapi
+    return cdsapi.Client()
+
+
+def retrieve_month(year, month, client_factory=make_cds_client,
+                   area=ARCTIC, times=FORECAST_HOURS, outdir="."):
+    """Retrieves ERA5-Land snow data for one month
+
+    :returns: path to retrieved file
+    """
+    target = make_filepath(year, month, outdir=outdir)
+    request = make_request(year, month, area=area, times=times)
+    client = client_factory()
+    client.retrieve(DATASET, request, str(target))
+    return target
+
+
+def extract_stations(fp, stations, fout):
+    """Samples an ERA5-Land file at station pixels and writes to fout
+
+    :fp: path to ERA5-Land file
+    :stations: tuple of latitude and longitude DataArrays
+    :fout: path to output file
+    """
+    latitude, longitude = stations
+    with xr.open_dataset(fp) as ds:
+        sub_ds = ds.sel(latitude=latitude, longitude=longitude, method="nearest").load()
+    fout.parent.mkdir(parents=True, exist_ok=True)
+    sub_ds.to_netcdf(fout)
+    return fout
+
+
+def get_era5_land_batch(years: List[int],
+                        months: List[int] = range(1, 13),
+                        outdir: Union[str, Path] = ".",
+                        area: List = ARCTIC,
+                        times: List[str] = FORECAST_HOURS,
+                        max_workers: int = MAX_WORKERS,
+                        client_factory: Callable = make_cds_client,
+                        stations=None,
+                        clobber: bool = False,
+                        verbose: bool = False) -> dict:
+    """Retrieves ERA5-Land snow data for years and months
+
+    Parameters
+    ----------
+    years : list of years
+    months : list of months.  Default is all months
+    outdir : directory to write files
+    area : area to request [north, west, south, east]
+    times : list of hours to request
+    max_workers : maximum number of concurrent requests
+    client_factory : callable returning an object with a cdsapi style retrieve method
+    stations : tuple of latitude and longitude DataArrays.  If given each file
+               is sampled at station pixels as it arrives, and files for
+               skipped months are sampled again.
+    clobber : request months even if a valid file exists
+    verbose : verbose output
+
+    Returns
+    -------
+    dict with (year, month) keys and path or exception values for each
+    requested month
+    """
+    plan = plan_requests(years, months=months, outdir=outdir, times=times,
+                         clobber=clobber)
+    if verbose: print(f"Requesting {len(plan)} months, max {max_workers} at a time")
+
+    if stations is not None:
+        skipped = [(year, month) for year in years for month in months
+                   if (year, month) not in plan]
+        for year, month in skipped:
+            fp = make_filepath(year, month, outdir=outdir)
+            if verbose: print(f"Sampling existing {fp} at stations")
+            extract_stations(fp, stations, make_station_filepath(year, month, outdir=outdir))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(retrieve_month, year, month,
+                            client_factory=client_factory,
+                            area=area, times=times, outdir=outdir): (year, month)
+            for year, month in plan
+            }
+        for future in as_completed(futures):
+            year, month = futures[future]
+            try:
+                target = future.result()
+            except Exception as err:
+                warnings.warn(f"Request for {year}-{month:02d} failed: {err}",
+                              UserWarning)
+                results[(year, month)] = err
+                continue
+            # Files are validated and sampled in the main thread because the
+            # netCDF library is not thread safe
+            if not is_valid_file(target, year, month, times=times):
+                warnings.warn(f"Retrieved file {target} is incomplete", UserWarning)
+                results[(year, month)] = RuntimeError(f"{target} is incomplete")
+                continue
+            if verbose: print(f"Retrieved {target}")
+            if stations is not None:
+                extract_stations(target, stations,
+                                 make_station_filepath(year, month, outdir=outdir))
+            results[(year, month)] = target
+    return results
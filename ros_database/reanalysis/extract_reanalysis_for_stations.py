@@ -5,6 +5,7 @@ TODO:
 - add upper air for extraction
 '''
 import warnings
+import shutil
 
 import matplotlib.pyplot as plt  # For testing
 from dask.diagnostics import ProgressBar, Profiler
@@ -15,6 +16,17 @@ import xarray as xr
 from ros_database.filepath import ERA5_DATAPATH, STATIONS_SURFACE_REANALYSIS, STATIONS_UPPER_AIR_REANALYSIS
 from ros_database.processing.surface import load_station_metadata
 
+# Number of pressure levels extracted at once when streaming upper air variables
+LEVEL_BLOCK = 4
+
+# Valid ranges used to pack upper air variables to int16.  Ranges cover all ERA5
+# pressure levels from 1000 hPa to 1 hPa
+PACKING_RANGE = {
+    "air_temperature": (160., 340.),  # K
+    "geopotential": (-10000., 500000.),  # m**2 s**-2
+    "specific_humidity": (0., 0.04),  # kg kg**-1
+    }
+
 
 def surface_files_for_year(year):
     """Returns a date sorted list of surface files for a year"""
@@ -146,14 +158,24 @@ def load_upper_air_data(year, variable,reanalysis='era5'):
 
 
 def extract_upper_air_variable(year, variable, stations, reanalysis,
-                                verbose=False, clobber=False):
+                                verbose=False, clobber=False, stream=False,
+                                level_block=LEVEL_BLOCK, pack=None):
     """Extracts surface reanalysis variables for stations
 
     :year: year to extract data
     :stations: tuple of latitude and longitude DataArrays
     :reanalysis: dummy var to allow choice of reanalysis - not implemented
     :clobber: overwrite file if it exists
+    :stream: extract month and level blocks incrementally to a zarr store.
+             See stream_upper_air_variable
+    :level_block: number of levels in each block when stream=True
+    :pack: None, float32 or int16 encoding when stream=True.  See stream_encoding
     """
+    if stream:
+        return stream_upper_air_variable(year, variable, stations, reanalysis,
+                                         verbose=verbose, clobber=clobber,
+                                         level_block=level_block, pack=pack)
+
     ncout = STATIONS_UPPER_AIR_REANALYSIS / f"era5.{variable}.stations.{year}.nc"
     if (not clobber) & ncout.is_file():
         warnings.warn(f"File exists!  Skipping extracting upper air {variable} from {reanalysis} for {year}",
@@ -189,6 +211,118 @@ def extract_upper_air_variable(year, variable, stations, reanalysis,
     return
     
     
+def month_slices(time):
+    """Returns a list of slices that split a time coordinate into calendar months
+
+    :time: xarray.DataArray of datetime64
+
+    :returns: list of slice objects
+    """
+    month = time.dt.year.values * 12 + time.dt.month.values
+    edges = np.flatnonzero(np.diff(month)) + 1
+    bounds = np.concatenate([[0], edges, [len(month)]])
+    return [slice(b0, b1) for b0, b1 in zip(bounds[:-1], bounds[1:])]
+
+
+def level_slices(nlevel, level_block=LEVEL_BLOCK):
+    """Returns a list of slices that split nlevel levels into blocks of level_block"""
+    return [slice(i, min(i + level_block, nlevel)) for i in range(0, nlevel, level_block)]
+
+
+def stream_encoding(ds, variable, level_block=LEVEL_BLOCK, pack=None):
+    """Returns zarr encoding for streamed upper air variables
+
+    Chunks are one day by level_block levels by all stations so that month and
+    level blocks written by stream_upper_air_variable align with chunks.
+
+    :ds: xarray.Dataset with time, level and station dimensions
+    :variable: name of upper air variable
+    :level_block: number of levels in a chunk
+    :pack: None to keep dtype of source data, float32 to downcast to float32 or
+           int16 to pack to int16 using scale_factor and add_offset
+
+    :returns: dict
+    """
+    if pack not in [None, "float32", "int16"]:
+        raise ValueError(f"Unknown pack option {pack}: expects None, float32 or int16")
+
+    encoding = {}
+    for name, da in ds.data_vars.items():
+        chunks = {"time": 24, "level": level_block, "station": ds.sizes["station"]}
+        encoding[name] = {"chunks": tuple(chunks[dim] for dim in da.dims)}
+        if pack == "float32":
+            encoding[name].update({"dtype": "float32"})
+        elif pack == "int16":
+            vmin, vmax = PACKING_RANGE[variable]
+            encoding[name].update({
+                "dtype": "int16",
+                "scale_factor": (vmax - vmin) / (2**16 - 2),
+                "add_offset": (vmax + vmin) / 2.,
+                "_FillValue": -2**15,
+                })
+    return encoding
+
+
+def stream_upper_air_variable(year, variable, stations, reanalysis,
+                              verbose=False, clobber=False,
+                              level_block=LEVEL_BLOCK, pack=None):
+    """Extracts an upper air variable for stations one month and level block at
+    a time
+
+    Each block is loaded and written to a zarr store as soon as it is extracted,
+    so only one block of station data is held in memory.
+
+    :year: year to extract data
+    :variable: name of upper air variable
+    :stations: tuple of latitude and longitude DataArrays
+    :reanalysis: dummy var to allow choice of reanalysis - not implemented
+    :clobber: overwrite store if it exists
+    :level_block: number of levels in each block
+    :pack: None, float32 or int16.  See stream_encoding
+    """
+    fout = STATIONS_UPPER_AIR_REANALYSIS / f"era5.{variable}.stations.{year}.zarr"
+    if (not clobber) & fout.exists():
+        warnings.warn(f"Store exists!  Skipping extracting upper air {variable} from {reanalysis} for {year}",
+                      UserWarning)
+        return
+
+    if fout.exists() & clobber:
+        shutil.rmtree(fout)
+
+    if verbose: print(f"    Loading {variable}...")
+    try:
+        ds = load_upper_air_data(year, variable, reanalysis=reanalysis)
+    except OSError as err:
+        print(f"No files for {variable} for {year}")
+        return
+    except ValueError as err:
+        print(f"Unknown variable: {variable}")
+        return
+
+    latitude = stations[0]
+    longitude = stations[1]
+    sub_ds = ds.sel(longitude=longitude, latitude=latitude, method='nearest')
+    sub_ds = sub_ds.transpose("time", "level", "station")
+    for var in sub_ds.variables.values():
+        var.encoding = {}
+
+    if verbose: print(f"   Creating {fout}")
+    encoding = stream_encoding(sub_ds, variable, level_block=level_block, pack=pack)
+    template = sub_ds.chunk({"time": 24, "level": level_block, "station": -1})
+    template.to_zarr(fout, compute=False, encoding=encoding)
+
+    for tslice in month_slices(sub_ds.time):
+        for lslice in level_slices(sub_ds.sizes["level"], level_block=level_block):
+            if verbose:
+                print(f"   Writing {sub_ds.time[tslice.start].dt.strftime('%Y-%m').item()} "
+                      f"levels {sub_ds.level[lslice].values}")
+            block = sub_ds.isel(time=tslice, level=lslice).load()
+            block.to_zarr(fout, region={"time": tslice, "level": lslice,
+                                        "station": slice(None)})
+    ds.close()
+    return
+
+
 def load_stations():
     """Returns xarray.DataArray containing latitude and longitude"""
     station_metadata = load_station_metadata()
@@ -202,7 +336,8 @@ def load_stations():
 
 
 def extract_reanalysis_for_stations(years, reanalysis = 'era5', verbose=False,
-                                    variable='all', clobber=False):
+                                    variable='all', clobber=False, stream=False,
+                                    level_block=LEVEL_BLOCK, pack=None):
     """Extracts surface and upper air data for reanalysis pixels that contain ROS stations
 
     :year: int year or list of years to extract
@@ -210,6 +345,9 @@ def extract_reanalysis_for_stations(years, reanalysis = 'era5', verbose=False,
     :reanalysis: str name of reanalysis - only era5 at the moment
     :verbose: bool verbose output
     :clobber: bool overwrite files
+    :stream: bool stream upper air variables by month and level block to zarr
+    :level_block: int number of levels in a block when stream is True
+    :pack: None, float32 or int16 encoding for streamed upper air variables
 
     returns None
 
@@ -230,17 +368,20 @@ def extract_reanalysis_for_stations(years, reanalysis = 'era5', verbose=False,
         if variable in ['all', 'upper_air', 'air_temperature']:
             if verbose: print(f"Extract upper air air_temperature for stations for {year}")
             extract_upper_air_variable(year, "air_temperature", (latitude, longitude), reanalysis,
-                                       verbose=verbose, clobber=clobber)
+                                       verbose=verbose, clobber=clobber, stream=stream,
+                                       level_block=level_block, pack=pack)
 
         if variable in ['all', 'upper_air', 'geopotential']:
             if verbose: print(f"Extract upper air geopotential for stations for {year}")
             extract_upper_air_variable(year, "geopotential", (latitude, longitude), reanalysis,
-                                       verbose=verbose, clobber=clobber)
+                                       verbose=verbose, clobber=clobber, stream=stream,
+                                       level_block=level_block, pack=pack)
 
         if variable in ['all', 'upper_air', 'specific_humidity']:
             if verbose: print(f"Extract upper air specific_humidity for stations for {year}")
             extract_upper_air_variable(year, "specific_humidity", (latitude, longitude), reanalysis,
-                                       verbose=verbose, clobber=clobber)
+                                       verbose=verbose, clobber=clobber, stream=stream,
+                                       level_block=level_block, pack=pack)
 
 
 if __name__ == "__main__":
@@ -259,8 +400,19 @@ if __name__ == "__main__":
                         help="Verbose output")
     parser.add_argument("--clobber", "-c", action="store_true",
                         help="Overwrite files")
+    parser.add_argument("--stream", action="store_true",
+                        help=("Extract upper air variables by month and level block "
+                              "and write to zarr"))
+    parser.add_argument("--level_block", type=int, default=LEVEL_BLOCK,
+                        help="Number of levels in each block when streaming")
+    parser.add_argument("--pack", type=str, default=None,
+                        choices=["float32", "int16"],
+                        help="Downcast or pack streamed upper air variables")
     args = parser.parse_args()
 
     extract_reanalysis_for_stations(args.year, variable=args.variable,
                                     verbose=args.verbose,
-                                    clobber=args.clobber)
+                                    clobber=args.clobber,
+                                    stream=args.stream,
+                                    level_block=args.level_block,
+                                    pack=args.pack)
@@ -0,0 +1,211 @@
+'''Calculates upper air diagnostics for stations from reanalysis profiles
+
+Diagnostics are calculated from the air_temperature, geopotential and
+specific_humidity station extractions written by extract_upper_air_variable.
+All stations and hours are processed as (time, station, level) arrays, so no
+profile is handled individually.
+
+Diagnostics
+-----------
+freezing_level_height : geopotential height (m) of the highest 0 C crossing in
+                        the profile.  NaN if the profile does not cross 0 C.
+warm_layer_depth : total depth (m) of above freezing layers in the profile.
+warm_nose : True if an above freezing layer overlies a below freezing layer.
+precipitable_water : vertically integrated specific humidity (kg m**-2)
+'''
+import warnings
+
+import numpy as np
+import xarray as xr
+
+from ros_database.filepath import STATIONS_UPPER_AIR_REANALYSIS
+
+G = 9.80665  # Standard gravity m s**-2
+T0 = 273.15  # Freezing point K
+
+DIAGNOSTICS = ["freezing_level_height", "warm_layer_depth", "warm_nose",
+               "precipitable_water"]
+
+ATTRS = {
+    "freezing_level_height": {
+        "long_name": "height of highest freezing level",
+        "units": "m",
+        },
+    "warm_layer_depth": {
+        "long_name": "depth of above freezing layers",
+        "units": "m",
+        },
+    "warm_nose": {
+        "long_name": "above freezing layer overlies below freezing layer",
+        "units": "1",
+        },
+    "precipitable_water": {
+        "long_name": "precipitable water",
+        "units": "kg m**-2",
+        },
+    }
+
+
+def freezing_level_height(t, z):
+    """Returns height of the highest 0 C crossing.  Level is the last axis and
+    levels are ordered from the bottom to the top of the profile.
+
+    :t: air temperature in degrees C
+    :z: geopotential height in m
+
+    :returns: numpy array of heights, NaN if no crossing
+    """
+    t1, t2 = t[..., :-1], t[..., 1:]
+    z1, z2 = z[..., :-1], z[..., 1:]
+    crossing = (t1 > 0.) != (t2 > 0.)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zc = z1 + (z2 - z1) * t1 / (t1 - t2)
+    zmax = np.where(crossing, zc, -np.inf).max(axis=-1)
+    return np.where(np.isinf(zmax), np.nan, zmax)
+
+
+def warm_layer_depth(t, z):
+    """Returns total depth of above freezing layers.  Temperature is assumed to
+    vary linearly with height between levels.
+
+    :t: air temperature in degrees C
+    :z: geopotential height in m
+
+    :returns: numpy array of depths in m
+    """
+    t1, t2 = t[..., :-1], t[..., 1:]
+    dz = z[..., 1:] - z[..., :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where((t1 > 0.) & (t2 > 0.), 1.,
+                            np.where((t1 <= 0.) & (t2 <= 0.), 0.,
+                                     np.maximum(t1, t2) / np.abs(t1 - t2)))
+    fraction = np.where(np.isnan(t1) | np.isnan(t2), np.nan, fraction)
+    return (fraction * dz).sum(axis=-1)
+
+
+def warm_nose(t):
+    """Returns True where an above freezing level lies above a below freezing
+    level
+
+    :t: air temperature in degrees C
+    """
+    coldest_below = np.minimum.accumulate(t, axis=-1)[..., :-1]
+    return ((t[..., 1:] > 0.) & (coldest_below <= 0.)).any(axis=-1)
+
+
+def precipitable_water(q, p):
+    """Returns precipitable water by trapezoidal integration of specific
+    humidity over pressure
+
+    :q: specific humidity in kg kg**-1
+    :p: pressure in hPa
+
+    :returns: precipitable water in kg m**-2
+    """
+    dp = np.abs(np.diff(p, axis=-1)) * 100.
+    return (0.5 * (q[..., :-1] + q[..., 1:]) * dp).sum(axis=-1) / G
+
+
+def _profile_diagnostics(t, z, q, p):
+    """Returns diagnostics for numpy arrays with level as the last axis"""
+    return (freezing_level_height(t, z).astype("float32"),
+            warm_layer_depth(t, z).astype("float32"),
+            warm_nose(t),
+            precipitable_water(q, p).astype("float32"))
+
+
+def profile_diagnostics(ta, z, q):
+    """Calculates diagnostics for profiles of air temperature, geopotential and
+    specific humidity
+
+    :ta: xarray.DataArray of air temperature in K with a level dimension in hPa
+    :z: xarray.DataArray of geopotential in m**2 s**-2
+    :q: xarray.DataArray of specific humidity in kg kg**-1
+
+    :returns: xarray.Dataset of diagnostics
+    """
+    # Order levels from bottom to top of profile
+    ta, z, q = [da.sortby("level", ascending=False) for da in (ta, z, q)]
+    if ta.chunks is not None:
+        ta, z, q = [da.chunk({"level": -1}) for da in (ta, z, q)]
+
+    result = xr.apply_ufunc(_profile_diagnostics,
+                            ta - T0, z / G, q, ta.level,
+                            input_core_dims=[["level"]] * 4,
+                            output_core_dims=[[]] * 4,
+                            dask="parallelized",
+                            output_dtypes=["float32", "float32", bool, "float32"])
+    ds = xr.Dataset(dict(zip(DIAGNOSTICS, result)))
+    for name in DIAGNOSTICS:
+        ds[name].attrs = ATTRS[name]
+    return ds
+
+
+def station_upper_air_filepath(year, variable):
+    """Returns path to station extraction for an upper air variable.  A zarr store
+    written by stream_upper_air_variable is used if present"""
+    fp = STATIONS_UPPER_AIR_REANALYSIS / f"era5.{variable}.stations.{year}.zarr"
+    if not fp.exists():
+        fp = fp.with_suffix(".nc")
+    return fp
+
+
+def load_station_upper_air(year, variable):
+    """Returns station profiles of an upper air variable as a DataArray"""
+    fp = station_upper_air_filepath(year, variable)
+    if fp.suffix == ".zarr":
+        ds = xr.open_zarr(fp)
+    else:
+        ds = xr.open_dataset(fp, chunks={"time": 744})
+    return ds[list(ds.data_vars)[0]]
+
+
+def make_upper_air_diagnostics(year, verbose=False, clobber=False):
+    """Writes hourly upper air diagnostics for stations for a year
+
+    :year: year to process
+    :verbose: verbose output
+    :clobber: overwrite output file
+    """
+    fout = STATIONS_UPPER_AIR_REANALYSIS / f"era5.upper_air_diagnostics.stations.{year}.nc"
+    if fout.is_file() & (not clobber):
+        warnings.warn(f"File exists!  Skipping upper air diagnostics for {year}",
+                      UserWarning)
+        return
+
+    if verbose: print(f"   Loading station profiles for {year}...")
+    try:
+        ta = load_station_upper_air(year, "air_temperature")
+        z = load_station_upper_air(year, "geopotential")
+        q = load_station_upper_air(year, "specific_humidity")
+    except OSError as err:
+        print(f"Missing station profiles for {year}: {err}")
+        return
+
+    ds = profile_diagnostics(ta, z, q)
+    ds = ds.transpose("time", "station")
+    ds["warm_nose"] = ds.warm_nose.astype("int8")
+    ds["warm_nose"].attrs = ATTRS["warm_nose"]
+
+    if verbose: print(f"   Writing upper air diagnostics to {fout}")
+    encoding = {name: {"zlib": True, "complevel": 4} for name in DIAGNOSTICS}
+    ds.to_netcdf(fout, encoding=encoding)
+    return
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Calculate upper air diagnostics "
+                                                  "for stations"))
+    parser.add_argument("year", type=int, nargs="+",
+                        help="Single year or list of years")
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Verbose output")
+    parser.add_argument("--clobber", "-c", action="store_true",
+                        help="Overwrite files")
+    args = parser.parse_args()
+
+    for year in args.year:
+        if args.verbose: print(f"Calculating upper air diagnostics for {year}")
+        make_upper_air_diagnostics(year, verbose=args.verbose, clobber=args.clobber)
@@ -1,81 +1,47 @@
-from typing import List
-import calendar
+"""Get ERA5-Land snow cover and snow depth for years and months"""
 from pathlib import Path
 import argparse
 
-import cdsapi
-
-ARCTIC = [90, -180, 45, 180]
-
-ALL_HOURS = [
-            "00:00", "01:00", "02:00",
-            "03:00", "04:00", "05:00",
-            "06:00", "07:00", "08:00",
-            "09:00", "10:00", "11:00",
-            "12:00", "13:00", "14:00",
-            "15:00", "16:00", "17:00",
-            "18:00", "19:00", "20:00",
-            "21:00", "22:00", "23:00"
-        ]
-FORECAST_HOURS = [
-    "00:00", "06:00", "12:00", "18:00",
-    ]
+from ros_database.reanalysis.era5_land import (ARCTIC, MAX_WORKERS,
+                                               get_era5_land_batch, retrieve_month)
+from ros_database.reanalysis.extract_reanalysis_for_stations import load_stations
 
 OUTPATH = Path.home() / "Data" / "ERA5_Land"
 
-def make_filepath(year, month, outdir="."):
-    return Path(outdir) / f"era5_land.snow.{year}.{month:02d}.nc"
-
-
-def get_days(year, month):
-    nday = calendar.monthrange(year, month)[1]
-    return [f"{n:02d}" for n in range(1,nday+1)]
-
 
 def get_era5_land(
         year: int,
         month: int,
-        area: List=ARCTIC,
+        area: list=ARCTIC,
         outdir="."):
-
-    target = make_filepath(year, month, outdir=outdir)
-    
-    dataset = "reanalysis-era5-land"
-    request = {
-        "variable": [
-            "snow_cover",
-            "snow_depth",
-#            "land_sea_mask"
-        ],
-        "year": f"{year}",
-        "month": f"{month:02d}",
-        "day": [
-            "01", "02", "03",
-            "04", "05", "06",
-            "07", "08", "09",
-            "10", "11", "12",
-            "13", "14", "15",
-            "16", "17", "18",
-            "19", "20", "21",
-            "22", "23", "24",
-            "25", "26", "27",
-            "28", "29", "30"
-        ],
-        "time": FORECAST_HOURS,
-        "data_format": "netcdf",
-        "download_format": "unarchived",
-        "area": area
-    }
-
-    print(f"Getting data for {year}-{month:02d}, writing to {target}")
-    client = cdsapi.Client()
-    client.retrieve(dataset, request, str(target))
+    """Retrieves ERA5-Land snow data for a single month"""
+    print(f"Getting data for {year}-{month:02d}, writing to {outdir}")
+    retrieve_month(year, month, area=area, outdir=outdir)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Get ERA5 Land Snow Data")
-    parser.add_argument("year", type=int, help="year to get")
-    parser.add_argument("month", type=int, help="month to get")
+    parser.add_argument("year", type=int, nargs="+", help="year or list of years to get")
+    parser.add_argument("--months", type=int, nargs="+", default=list(range(1, 13)),
+                        help="months to get.  Default is all months")
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS,
+                        help=f"Maximum number of concurrent requests (default {MAX_WORKERS})")
+    parser.add_argument("--outdir", type=str, default=OUTPATH,
+                        help=f"Directory to write files (default {OUTPATH})")
+    parser.add_argument("--no_stations", action="store_true",
+                        help="Do not sample files at station pixels")
+    parser.add_argument("--clobber", action="store_true",
+                        help="Request months that already have a valid file")
+    parser.add_argument("--verbose", action="store_true",
+                        help="verbose output")
     args = parser.parse_args()
 
-    get_era5_land(args.year, args.month, outdir=OUTPATH)
+    if args.no_stations:
+        stations = None
+    else:
+        longitude, latitude = load_stations()
+        stations = (latitude, longitude)
+
+    get_era5_land_batch(args.year, months=args.months, outdir=args.outdir,
+                        max_workers=args.jobs, stations=stations,
+                        clobber=args.clobber, verbose=args.verbose)
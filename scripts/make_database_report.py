@@ -1,40 +1,175 @@
-"""Generates a report containing temporal range, data coverage and other metrics"""
+"""Generates a report containing temporal range, data coverage and other metrics
 
-from typing import Union, List
+For each hourly station file the report gives the temporal range, the
+fraction of hours with observations, hours with each precipitation type and
+hours with a precipitation gauge value.  Coverage for each year and month is
+written to a second table with one column per station.
+
+Only the columns needed are read.  Per-station results are cached with the
+modification time and size of each hourly file, so regenerating the report
+after an update only processes stations that changed.
+
+Usage
+-----
+  python scripts/make_database_report.py aross.database.inventory.csv --jobs 8 --progress
+"""
+
+from typing import Union, Tuple
 from pathlib import Path
 
-from tqdm import tqdm
+import numpy as np
+import pandas as pd
+
+from ros_database.filepath import SURFOBS_HOURLY_PATH, SURFOBS_REPORT_PATH, get_station_filepaths
+from ros_database.processing.file_cache import cached_map
+from ros_database.processing.extract_precip_events import PTYPES
+from ros_database.processing.surface import read_station_columns
+
+# An hour is observed if all coverage columns are valid
+COVERAGE_COLUMNS = ["t2m"]
+
+PRECIP_COLUMN = "p01i"
+
+INVENTORY_CACHE = SURFOBS_REPORT_PATH / "hourly_inventory.cache.pkl"
+
+# Version of station_inventory results.  Increment when results change so
+# cached inventories are recomputed
+INVENTORY_VERSION = 2
+
+
+def month_bins(index: pd.DatetimeIndex) -> np.ndarray:
+    """Returns months since year 0 for each time"""
+    return index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+
+
+def hours_in_record(start: pd.Timestamp, end: pd.Timestamp) -> int:
+    """Returns number of hours from start to end inclusive"""
+    return int((end.floor("h") - start.floor("h")) / pd.Timedelta("1h")) + 1
 
-from ros_database.filepath import SURFOBS_HOURLY_PATH, get_station_filepaths
+
+def hours_in_months(months: pd.PeriodIndex, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+    """Returns number of hours in each month that are within start to end
+    inclusive, so partial first and last months are clipped to the record"""
+    lower = np.maximum(months.start_time.to_numpy(), start.floor("h").to_datetime64())
+    upper = np.minimum((months + 1).start_time.to_numpy(),
+                       (end.floor("h") + pd.Timedelta("1h")).to_datetime64())
+    return (upper - lower) // np.timedelta64(1, "h")
+
+
+def station_inventory(fp: Path) -> dict:
+    """Returns inventory for one hourly station file
+
+    Returns
+    -------
+    dict with summary, a dict of station metrics, and monthly, a Series of
+    hourly coverage fraction indexed by month.  Coverage is the fraction of
+    hours from the first to the last record with valid COVERAGE_COLUMNS
+    """
+    df = read_station_columns(fp, COVERAGE_COLUMNS + PTYPES + [PRECIP_COLUMN])
+    df = df[~df.index.duplicated()]
+    observed = df.reindex(columns=COVERAGE_COLUMNS).notna().all(axis=1).to_numpy()
+    ptypes = df.reindex(columns=PTYPES).fillna(False).astype(bool)
+    gauge = df.reindex(columns=[PRECIP_COLUMN]).notna().to_numpy()[:, 0]
+
+    summary = {
+        "start": df.index.min(),
+        "end": df.index.max(),
+        "nhour": len(df),
+        "nobserved": int(observed.sum()),
+        "coverage": (observed.sum() / hours_in_record(df.index.min(), df.index.max())
+                     if len(df) > 0 else np.nan),
+        "nprecip_gauge": int(gauge.sum()),
+        "precip_gauge_fraction": (gauge & observed).sum() / observed.sum() if observed.any() else np.nan,
+        }
+    summary.update({ptype: int(n) for ptype, n in ptypes.sum().items()})
+
+    if len(df) == 0:
+        return {"summary": summary, "monthly": pd.Series(dtype=float)}
+
+    bins = month_bins(df.index)
+    first = bins.min()
+    counts = np.bincount(bins - first, weights=observed)
+    months = pd.period_range(df.index.min(), df.index.max(), freq="M")
+    hours = hours_in_months(months, df.index.min(), df.index.max())
+    monthly = pd.Series(counts / hours, index=months, name="coverage")
+    return {"summary": summary, "monthly": monthly}
 
 
 def make_database_inventory(hourly_path: Union[str, Path] = SURFOBS_HOURLY_PATH,
-                            progress: bool = False):
+                            outfile: Union[str, Path, None] = None,
+                            cache_path: Union[str, Path, None] = INVENTORY_CACHE,
+                            jobs: int = 1,
+                            progress: bool = False,
+                            verbose: bool = False) -> Tuple[pd.DataFrame]:
     """Generates an inventory file for database
 
     Parameters
     ----------
     hourly_path : path to hourly data.  (default is {SURFOBS_HOURLY_PATH}).
+    outfile : path to write station inventory as csv.  Monthly coverage is
+              written to the same path with suffix .monthly_coverage.csv.
+              Nothing is written if None
+    cache_path : path to per-station cache.  No cache is used if None
+    jobs : number of worker processes
     progress : display progress bar
+    verbose : verbose output
 
     Returns
     -------
-    None
+    Station inventory indexed by station and monthly coverage with a column
+    for each station.  Stations that could not be processed are in the
+    inventory with an error message in the error column
     """
 
-    filelist = get_station_filepaths([], hourly_path,
-                                     all_stations=True,
-                                     ext="hourly.csv")
+    filelist = sorted(get_station_filepaths([], hourly_path,
+                                            all_stations=True,
+                                            ext="hourly.csv"))
+
+    errors = {}
+    results = cached_map(station_inventory, filelist, cache_path=cache_path,
+                         params={"coverage": COVERAGE_COLUMNS, "precip": PRECIP_COLUMN},
+                         version=INVENTORY_VERSION, jobs=jobs, progress=progress,
+                         errors=errors, verbose=verbose)
+
+    stations = [fp.name.split(".")[0] for fp in results]
+    records = [{**results[fp]["summary"], "error": None} if fp in results
+               else {"error": errors[fp]} for fp in filelist]
+    inventory = pd.DataFrame(records, index=pd.Index([fp.name.split(".")[0] for fp in filelist],
+                                                     name="station"))
+    monthly = pd.concat([result["monthly"] for result in results.values()],
+                        axis=1, keys=stations) if results else pd.DataFrame()
+    monthly.index.name = "month"
 
-    if progress:
-        filelist = tqdm(filelist)
+    if outfile is not None:
+        outfile = Path(outfile)
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+        inventory.to_csv(outfile)
+        monthly.to_csv(outfile.with_name(outfile.name.replace(".csv", ".monthly_coverage.csv")))
+        if verbose: print(f"Wrote inventory for {len(inventory)} stations to {outfile}, "
+                          f"{len(errors)} failed")
+    return inventory, monthly
 
-    
-    
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Creates an inventory for database")
+    parser.add_argument("outfile", type=str,
+                        help="Path to write inventory as csv")
+    parser.add_argument("--hourly_path", type=str, default=SURFOBS_HOURLY_PATH,
+                        help=f"Path to hourly files (default {SURFOBS_HOURLY_PATH})")
+    parser.add_argument("--cache_path", type=str, default=INVENTORY_CACHE,
+                        help=f"Path to per-station cache (default {INVENTORY_CACHE})")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Process all stations without a cache")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of worker processes (default 1)")
+    parser.add_argument("--progress", action="store_true",
+                        help="Display progress bar")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Verbose output")
+    args = parser.parse_args()
 
-    make_database_inventory()
+    make_database_inventory(args.hourly_path, outfile=args.outfile,
+                            cache_path=None if args.no_cache else args.cache_path,
+                            jobs=args.jobs, progress=args.progress, verbose=args.verbose)
@@ -1,62 +1,152 @@
 """Create files containing precipitation events"""
 from typing import Union
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+import time
+
+import pandas as pd
 
 from ros_database.processing.surface import load_station_combined_data
-from ros_database.processing.extract_precip_events import find_events
+from ros_database.processing.extract_precip_events import find_events, find_events_streaming
+from ros_database.processing.event_context import enrich_events
 from ros_database.filepath import SURFOBS_COMBINED_PATH, SURFOBS_EVENTS_PATH
 
 
-def make_outpath(fp: Path) -> Path:
+def make_outpath(fp: Path, outpath: Path=SURFOBS_EVENTS_PATH) -> Path:
     """Generates output path"""
-    return SURFOBS_EVENTS_PATH / fp.name.replace('hourly.combined','event')
+    return outpath / fp.name.replace('hourly.combined','event')
 
 
 def make_one_event_file(fp: Path, fout: Path,
-                        float_format=".1f") -> None:
+                        float_format=".1f",
+                        chunksize: Union[int, None]=None,
+                        context: bool=False) -> int:
     """Makes an event file for one station
 
     Parameters
     ----------
     fp : filepath for hourly file
     fout : output path for events file
+    chunksize : if given, read only the columns needed for events in chunks
+                of chunksize rows
+    context : add surface meteorology context for each event.  Requires the
+              full hourly file, so chunksize is ignored
 
     Returns
     -------
-    None
+    Number of events
     """
 
-    df = load_station_combined_data(fp)
-    event_df = find_events(df)
+    if chunksize and not context:
+        event_df = find_events_streaming(fp, chunksize=chunksize)
+    else:
+        df = load_station_combined_data(fp)
+        event_df = find_events(df)
+        if context and len(event_df) > 0:
+            event_df = enrich_events(event_df, df)
     
     fout.parent.mkdir(parents=True, exist_ok=True)
     event_df.to_csv(fout)
+    return len(event_df)
+
+
+def process_station(fp: Path,
+                    chunksize: Union[int, None]=None,
+                    context: bool=False,
+                    outpath: Path=SURFOBS_EVENTS_PATH,
+                    verbose: bool=False) -> dict:
+    """Makes an event file for one station, capturing any error
+
+    Parameters
+    ----------
+    fp : filepath for combined hourly file
+    chunksize : stream hourly file in chunks of chunksize rows
+    context : add surface meteorology context for each event
+    outpath : directory for events files
+    verbose : set to True for verbose output
+
+    Returns
+    -------
+    dict with station, number of events, runtime in seconds and error
+    """
+    start = time.perf_counter()
+    fout = make_outpath(fp, outpath)
+    if verbose: print(f"Processing {fp.name}, writing events to {fout}")
+    try:
+        nevent = make_one_event_file(fp, fout, chunksize=chunksize, context=context)
+        error = None
+    except Exception as err:
+        nevent = None
+        error = f"{type(err).__name__}: {err}"
+    return {
+        "station": fp.name.split(".")[0],
+        "events": nevent,
+        "runtime": round(time.perf_counter() - start, 2),
+        "error": error,
+        }
 
 
 def make_events_files(verbose: bool=False,
-                      test_run: Union[int, None]=None) -> None:
+                      test_run: Union[int, None]=None,
+                      chunksize: Union[int, None]=None,
+                      jobs: int=1,
+                      context: bool=False,
+                      hourly_path: Path=SURFOBS_COMBINED_PATH,
+                      outpath: Path=SURFOBS_EVENTS_PATH) -> pd.DataFrame:
     """Processes hourly surface files into events files
 
     Parameters
     ----------
     verbose : set to True for verbose output
     test_run : for testing run first test_run=n files
+    chunksize : stream hourly files in chunks of chunksize rows
+    jobs : number of worker processes.  Stations are processed serially if 1
+    context : add surface meteorology context for each event
+    hourly_path : directory containing combined hourly files
+    outpath : directory for events files
 
     Returns
     -------
-    None
+    DataFrame indexed by station with number of events, runtime in seconds
+    and error message for stations that failed
     """
-
-    for i, fp in enumerate(SURFOBS_COMBINED_PATH.glob("*.csv")):
-        if verbose: print(f"Processing {fp.name}")
-        
-        fout = make_outpath(fp)
-        if verbose: print(f"Writing events to {fout}\n")
-        make_one_event_file(fp, fout)
-
-        if test_run is not None:
-            if i > test_run:
-                break
+    filepaths = sorted(Path(hourly_path).glob("*.csv"))
+    if test_run is not None:
+        filepaths = list(islice(filepaths, test_run))
+
+    if jobs > 1:
+        results = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(process_station, fp, chunksize=chunksize,
+                                       context=context, outpath=outpath)
+                       for fp in filepaths]
+            for future in as_completed(futures):
+                result = future.result()
+                if verbose: print(f"{result['station']}: {result['events']} events "
+                                  f"in {result['runtime']} s")
+                results.append(result)
+    else:
+        results = [process_station(fp, chunksize=chunksize, context=context,
+                                   outpath=outpath, verbose=verbose)
+                   for fp in filepaths]
+
+    columns = ["events", "runtime", "error"]
+    if len(results) == 0:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="station"))
+    summary = pd.DataFrame(results).set_index("station").sort_index()[columns]
+    return summary.astype({"events": "Int64"})
+
+
+def print_summary(summary: pd.DataFrame, elapsed: float) -> None:
+    """Prints events and runtime for each station and totals"""
+    with pd.option_context("display.max_rows", None):
+        print(summary.drop("error", axis=1))
+    failed = summary[summary.error.notna()]
+    for station, error in failed.error.items():
+        print(f"Failed {station}: {error}")
+    print(f"Processed {len(summary)} stations, {len(failed)} failed, "
+          f"{int(summary.events.sum())} events in {elapsed:.1f} s")
 
 
 if __name__ == "__main__":
@@ -68,7 +158,17 @@ if __name__ == "__main__":
                         help="Verbose output")
     parser.add_argument("--test_run", type=int, default=None,
                         help="For testing.  Run first test_run=n files")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream hourly files in chunks of chunksize rows")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of worker processes (default 1)")
+    parser.add_argument("--context", action="store_true",
+                        help="Add surface meteorology context for each event")
 
     args = parser.parse_args()
     
-    make_events_files(verbose=args.verbose, test_run=args.test_run)
+    start = time.perf_counter()
+    summary = make_events_files(verbose=args.verbose, test_run=args.test_run,
+                                chunksize=args.chunksize, jobs=args.jobs,
+                                context=args.context)
+    print_summary(summary, time.perf_counter() - start)
@@ -0,0 +1,60 @@
+"""Tests for time based alignment"""
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from ros_database.processing.align import asof_indexer, align_asof
+
+daily = pd.date_range("2020-01-01", periods=3, freq="D")
+
+
+@pytest.mark.parametrize(
+    "target, tolerance, direction, expected",
+    [
+        (["2020-01-01 00:00", "2020-01-01 23:59", "2020-01-02 06:00"], "24h", "backward", [0, 0, 1]),
+        (["2019-12-31 23:00", "2020-01-05 00:00"], "24h", "backward", [-1, -1]),
+        (["2020-01-01 06:00", "2020-01-01 12:00"], "6h", "backward", [0, -1]),
+        (["2020-01-02 00:00", "2020-01-02 00:01"], "0h", "backward", [1, -1]),
+        (["2020-01-04 00:00"], "24h", "backward", [2]),
+        (["2020-01-01 05:00"], "6h", "backward", [0]),
+        (["2019-12-31 23:00", "2020-01-01 00:00"], "6h", "forward", [0, 0]),
+        (["2020-01-01 13:00", "2020-01-01 11:00"], "24h", "nearest", [1, 0]),
+    ]
+)
+def test_asof_indexer(target, tolerance, direction, expected):
+    result = asof_indexer(daily, pd.DatetimeIndex(target), tolerance, direction=direction)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_align_asof_matches_ffill_for_complete_hourly_index():
+    source = pd.Series([1., 2., 3.], index=daily)
+    index = pd.date_range("2020-01-01", periods=96, freq="h")
+    expected = source.reindex(index, method="ffill", limit=23)
+    pd.testing.assert_series_equal(align_asof(source, index, "23h"), expected)
+
+
+@pytest.mark.parametrize("tolerance", ["0h", "30min", "24h"])
+def test_asof_indexer_matches_merge_asof(tolerance):
+    target = pd.date_range("2019-12-31 23:00", "2020-01-04 01:00", freq="30min")
+    left = pd.DataFrame({"time": target})
+    right = pd.DataFrame({"time": daily, "pos": np.arange(len(daily))})
+    expected = pd.merge_asof(left, right, on="time", tolerance=pd.Timedelta(tolerance))
+    result = asof_indexer(daily, target, tolerance)
+    np.testing.assert_array_equal(result, expected.pos.fillna(-1).astype(np.int64))
+
+
+def test_align_asof_with_gaps():
+    """Gaps in target index do not extend validity of source values"""
+    source = pd.Series([1., np.nan, 3.], index=daily)
+    index = pd.DatetimeIndex(["2020-01-01 12:00", "2020-01-04 12:00", "2020-01-03 01:30"])
+    expected = pd.Series([1., np.nan, 3.], index=index)
+    pd.testing.assert_series_equal(align_asof(source, index, "24h"), expected)
+
+
+def test_align_asof_dataframe():
+    source = pd.DataFrame({"a": [1, 2, 3], "b": [True, False, True]}, index=daily)
+    index = pd.DatetimeIndex(["2020-01-02 10:00", "2020-01-10"])
+    result = align_asof(source, index, "24h")
+    assert result["a"].iloc[0] == 2
+    assert result.iloc[1].isna().all()
@@ -0,0 +1,85 @@
+"""Tests for day of year climatologies and station anomalies"""
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from ros_database.reanalysis.climatology import (noleap_dayofyear, to_dayofyear,
+                                                 anomaly, station_anomaly, DAYOFYEAR)
+
+STATIONS = ["AAAA", "BBBB"]
+LEVELS = [850, 500]
+
+
+def make_climatology(year=2000, levels=None):
+    """Returns a daily climatology on a time dimension for one year, with value
+    100 * station + day of year (+ 1000 * level index), and its 365 day form"""
+    time = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    doy = np.arange(1, len(time) + 1, dtype=float)
+    values = doy[:, None] + 100. * np.arange(len(STATIONS))
+    dims = ["time", "station"]
+    coords = {"time": time, "station": STATIONS}
+    if levels is not None:
+        values = values[:, None, :] + 1000. * np.arange(len(levels))[:, None]
+        dims = ["time", "level", "station"]
+        coords["level"] = levels
+    return xr.DataArray(values, dims=dims, coords=coords)
+
+
+@pytest.mark.parametrize("date,expected", [
+    ("2001-02-28", 59),
+    ("2001-03-01", 60),
+    ("2001-12-31", 365),
+    ("2000-02-28", 59),
+    ("2000-02-29", 59),
+    ("2000-03-01", 60),
+    ("2000-12-31", 365),
+])
+def test_noleap_dayofyear(date, expected):
+    assert noleap_dayofyear([pd.Timestamp(date)])[0] == expected
+
+
+@pytest.mark.parametrize("year", [2000, 2001])
+def test_to_dayofyear(year):
+    clim = to_dayofyear(make_climatology(year))
+    np.testing.assert_array_equal(clim.dayofyear, DAYOFYEAR)
+    station = clim.sel(station="AAAA")
+    assert station.sel(dayofyear=1) == 1.
+    if year == 2000:
+        # Feb 28 and Feb 29 are averaged and Mar 1 follows
+        assert station.sel(dayofyear=59) == 59.5
+        assert station.sel(dayofyear=60) == 61.
+        assert station.sel(dayofyear=365) == 366.
+    else:
+        assert station.sel(dayofyear=60) == 60.
+
+
+def test_to_dayofyear_rejects_366_days():
+    clim = make_climatology(2000).rename(time="dayofyear")
+    clim = clim.assign_coords(dayofyear=np.arange(1, 367))
+    with pytest.raises(ValueError):
+        to_dayofyear(clim)
+
+
+@pytest.mark.parametrize("year", [2000, 2001])
+def test_station_anomaly(year):
+    clim = to_dayofyear(make_climatology(2001))
+    index = pd.DatetimeIndex([f"{year}-01-01", f"{year}-02-28",
+                              f"{year}-03-01 12:00", f"{year}-12-31"])
+    series = pd.Series(0., index=index)
+    result = station_anomaly(series, clim, "BBBB")
+    # Same calendar dates are compared to the same climatology days in all years
+    np.testing.assert_array_equal(result, -(100. + np.array([1., 59., 60., 365.])))
+
+    da = xr.DataArray(np.zeros((len(index), len(STATIONS))), dims=["time", "station"],
+                      coords={"time": index, "station": STATIONS})
+    np.testing.assert_array_equal(anomaly(da, clim).sel(station="BBBB"), result)
+
+
+def test_station_anomaly_level():
+    clim = to_dayofyear(make_climatology(2001, levels=LEVELS))
+    series = pd.Series(0., index=pd.DatetimeIndex(["2000-03-01", "2000-12-31"]))
+    result = station_anomaly(series, clim, "AAAA", level=500)
+    np.testing.assert_array_equal(result, -(1000. + np.array([60., 365.])))
+    with pytest.raises(ValueError):
+        station_anomaly(series, clim, "AAAA")
@@ -0,0 +1,53 @@
+"""Tests for joining reanalysis station series to hourly data"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import ros_database.processing.combine_hourly_with_reanalysis as cr
+
+STATIONS = ["AAAA", "BBBB"]
+
+
+def write_station_files(tmp_path, monkeypatch):
+    """Writes surface series for two days in separate files and diagnostics,
+    and points the module at them"""
+    surface_path = tmp_path / "surface"
+    upper_path = tmp_path / "upper_air"
+    surface_path.mkdir()
+    upper_path.mkdir()
+    time = pd.date_range("2020-01-01", periods=48, freq="h")
+    t2m = np.arange(48 * 2, dtype=float).reshape(48, 2)
+    ds = xr.Dataset({"T2M": (("time", "station"), t2m)},
+                    coords={"time": time, "station": STATIONS,
+                            "latitude": ("station", [65., 70.])})
+    ds.isel(time=slice(0, 24)).to_netcdf(surface_path / "era5.surface.stations.2020a.nc")
+    ds.isel(time=slice(24, None)).to_netcdf(surface_path / "era5.surface.stations.2020b.nc")
+    diagnostics = xr.Dataset({"freezing_level_height": (("time", "station"), t2m + 1000.)},
+                             coords={"time": time, "station": STATIONS})
+    diagnostics.to_netcdf(upper_path / "era5.upper_air_diagnostics.stations.2020.nc")
+    monkeypatch.setattr(cr, "STATIONS_SURFACE_REANALYSIS", surface_path)
+    monkeypatch.setattr(cr, "STATIONS_UPPER_AIR_REANALYSIS", upper_path)
+    return ds
+
+
+def test_load_reanalysis_store(tmp_path, monkeypatch):
+    write_station_files(tmp_path, monkeypatch)
+    store = cr.load_reanalysis_store()
+    assert sorted(store.data_vars) == ["era5_freezing_level_height", "era5_t2m"]
+    assert store.era5_t2m.dims == ("time", "station")
+    assert store.sizes["time"] == 48
+    assert "latitude" not in store.coords
+
+
+def test_combine_one_with_missing_times(tmp_path, monkeypatch):
+    write_station_files(tmp_path, monkeypatch)
+    store = cr.load_reanalysis_store(variables=["T2M"])
+    # Two times in the store, one off the hour and one after the store ends
+    index = pd.DatetimeIndex(["2020-01-01 05:00", "2020-01-01 05:30",
+                              "2020-01-02 23:00", "2020-01-03 02:00"])
+    met = pd.DataFrame({"station": "BBBB", "t2m": [-1., -2., -3., -4.]}, index=index)
+
+    result = cr.combine_one(met, cr.reanalysis_for_station(store, "BBBB"))
+    assert list(result.columns) == ["station", "t2m", "era5_t2m"]
+    np.testing.assert_array_equal(result.t2m, met.t2m)
+    np.testing.assert_array_equal(result.era5_t2m, [11., np.nan, 95., np.nan])
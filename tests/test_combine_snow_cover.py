@@ -0,0 +1,87 @@
+"""Tests for combining IMS snow cover with hourly observations"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import ros_database.processing.combine_hourly_with_ims_snowcover as cs
+from ros_database.processing.combine_hourly_with_ims_snowcover import (align_snow_cover,
+                                                                       combine_files,
+                                                                       decode_snow_on_ground,
+                                                                       reindex_snow_cover)
+
+
+def make_codes():
+    """Returns a daily series of IMS codes for one station"""
+    index = pd.date_range("2020-01-01", periods=5, freq="D")
+    return pd.Series(np.array([4, 2, 3, 1, 0], dtype=np.int8), index=index, name="PAFM")
+
+
+def test_decode_snow_on_ground():
+    result = decode_snow_on_ground(make_codes())
+    expected = pd.Series(pd.array([True, False, pd.NA, pd.NA, pd.NA], dtype="boolean"),
+                         index=make_codes().index, name="PAFM")
+    pd.testing.assert_series_equal(result, expected)
+
+
+def test_reindex_decoded_snow_cover():
+    index = pd.date_range("2020-01-01", periods=48, freq="h")
+    result = reindex_snow_cover(decode_snow_on_ground(make_codes()), index)
+    assert result.dtype == "boolean"
+    assert result.iloc[:24].all()
+    assert not result.iloc[24:].any()
+
+
+def test_align_decoded_snow_cover_with_gap():
+    index = pd.DatetimeIndex(["2020-01-01 06:00", "2020-01-02 12:00", "2020-01-06 12:00"])
+    result = align_snow_cover(decode_snow_on_ground(make_codes()), index)
+    expected = pd.Series(pd.array([True, False, pd.NA], dtype="boolean"), index=index,
+                         name="PAFM")
+    pd.testing.assert_series_equal(result, expected)
+
+
+def make_hourly_files(path, stations):
+    """Writes hourly files for stations and returns their paths"""
+    path.mkdir()
+    index = pd.date_range("2020-01-01", periods=72, freq="h")
+    for i, stnid in enumerate(stations):
+        df = pd.DataFrame({"station": stnid, "t2m": np.arange(72) * 0.1 + i}, index=index)
+        df.to_csv(path / f"{stnid}.hourly.csv")
+
+
+@pytest.mark.parametrize("tolerance", [None, "24h"])
+def test_combine_files_parallel_matches_serial(tmp_path, tolerance):
+    hourly_path = tmp_path / "hourly"
+    make_hourly_files(hourly_path, ["AAAA", "BBBB", "CCCC"])
+    index = pd.date_range("2020-01-01", periods=3, freq="D")
+    snow_cover = pd.DataFrame({"AAAA": np.array([4, 2, 0], dtype=np.int8),
+                               "BBBB": np.array([2, 4, 4], dtype=np.int8)}, index=index)
+
+    for jobs in [1, 2]:
+        with pytest.warns(UserWarning, match="No snow cover for station CCCC"):
+            combine_files(jobs=jobs, tolerance=tolerance, hourly_path=hourly_path,
+                          outpath=tmp_path / f"jobs{jobs}", snow_cover=snow_cover)
+
+    serial = sorted(p.name for p in (tmp_path / "jobs1").iterdir())
+    parallel = sorted(p.name for p in (tmp_path / "jobs2").iterdir())
+    assert serial == parallel == ["AAAA.hourly.combined.csv", "BBBB.hourly.combined.csv"]
+    for name in serial:
+        assert ((tmp_path / "jobs1" / name).read_text() ==
+                (tmp_path / "jobs2" / name).read_text())
+
+
+@pytest.mark.parametrize("parquet", [True, False])
+def test_convert_snow_cover_table_round_trip(tmp_path, monkeypatch, parquet):
+    if parquet and not cs.has_parquet_engine():
+        pytest.skip("No parquet engine")
+    monkeypatch.setattr(cs, "IMS_PATH", tmp_path)
+    monkeypatch.setattr(cs, "has_parquet_engine", lambda: parquet)
+    index = pd.date_range("2020-01-01", periods=4, freq="D", name="time")
+    table = pd.DataFrame({"PAFM": [4., 2., np.nan, 1.], "PABR": [3., 4., 4., 2.]}, index=index)
+    table.to_csv(cs.snow_cover_filepath())
+
+    filepath = cs.convert_snow_cover_table()
+    assert filepath.suffix == (".parquet" if parquet else ".npz")
+    codes = cs.load_snow_cover_codes()
+    expected = table.fillna(cs.MISSING).astype(np.int8)
+    pd.testing.assert_frame_equal(codes, expected, check_freq=False)
+    pd.testing.assert_frame_equal(codes, cs.read_snow_cover_csv(), check_freq=False)
@@ -0,0 +1,73 @@
+"""Tests for the hourly database inventory in scripts/make_database_report.py"""
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SCRIPT = Path(__file__).parents[1] / "scripts" / "make_database_report.py"
+
+
+@pytest.fixture(scope="module")
+def report():
+    spec = importlib.util.spec_from_file_location("make_database_report", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so station_inventory can be pickled for worker processes
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_hourly_file(path, station="AAAA"):
+    """Writes an hourly file from 2020-01-31 20:00 to 2020-03-01 03:00 with
+    rows absent for 2020-02-10 and t2m missing every fourth hour"""
+    index = pd.date_range("2020-01-31 20:00", "2020-03-01 03:00", freq="h")
+    k = np.arange(len(index))
+    df = pd.DataFrame({"station": station,
+                       "t2m": np.where(k % 4 == 0, np.nan, -1.),
+                       "p01i": np.where(k % 2 == 0, 0., np.nan),
+                       "UP": False, "RA": k % 10 == 0, "FZRA": False, "SOLID": False},
+                      index=index)
+    df = df[df.index.normalize() != "2020-02-10"]
+    fp = path / f"{station}.hourly.csv"
+    df.to_csv(fp)
+    return fp, df
+
+
+def test_station_inventory(tmp_path, report):
+    fp, df = make_hourly_file(tmp_path)
+    result = report.station_inventory(fp)
+    summary, monthly = result["summary"], result["monthly"]
+
+    observed = df.t2m.notna()
+    assert summary["nhour"] == len(df)
+    assert summary["nobserved"] == observed.sum()
+    # Coverage is relative to all hours in the record, including absent rows
+    np.testing.assert_allclose(summary["coverage"], observed.sum() / (4 + 29 * 24 + 4))
+    assert summary["RA"] == df.RA.sum()
+
+    # First and last months are clipped to the record
+    expected = observed.groupby(df.index.to_period("M")).sum() / np.array([4, 29 * 24, 4])
+    pd.testing.assert_series_equal(monthly, expected, check_names=False)
+
+
+def test_make_database_inventory(tmp_path, report):
+    hourly_path = tmp_path / "hourly"
+    hourly_path.mkdir()
+    make_hourly_file(hourly_path, "AAAA")
+    make_hourly_file(hourly_path, "BBBB")
+    # Malformed station file is reported, not dropped
+    (hourly_path / "CCCC.hourly.csv").write_bytes(b"\xff\xfe\x00")
+    outfile = tmp_path / "inventory.csv"
+    with pytest.warns(UserWarning, match="Failed to process"):
+        inventory, monthly = report.make_database_inventory(hourly_path, outfile=outfile,
+                                                            cache_path=tmp_path / "cache.pkl",
+                                                            jobs=2)
+    assert list(inventory.index) == ["AAAA", "BBBB", "CCCC"]
+    assert inventory.error[["AAAA", "BBBB"]].isna().all()
+    assert inventory.error["CCCC"].startswith("UnicodeDecodeError")
+    assert list(monthly.columns) == ["AAAA", "BBBB"]
+    assert outfile.exists()
+    assert (tmp_path / "inventory.monthly_coverage.csv").exists()
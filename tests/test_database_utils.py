@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ros_database.database_utils import (count_observations, make_observation_count_matrix,
+                                         load_observation_count_matrix, make_ptype_count_cube,
+                                         load_ptype_count_cube, season_ptype_counts,
+                                         PTYPES, SEASONS)
+
+
+def make_hourly_file(path, station, start, nhour):
+    index = pd.date_range(start, periods=nhour, freq="h")
+    k = np.arange(nhour)
+    df = pd.DataFrame({"station": station,
+                       "t2m": np.where(k % 3 == 0, np.nan, -1.),
+                       "p01i": np.where(k % 2 == 0, 0., np.nan)}, index=index)
+    fp = path / f"{station}.hourly.csv"
+    df.to_csv(fp)
+    return fp, df
+
+
+@pytest.mark.parametrize("columns", [["t2m"], ["t2m", "p01i"]])
+def test_make_observation_count_matrix(tmp_path, columns):
+    fp1, df1 = make_hourly_file(tmp_path, "AAAA", "2020-01-01 05:00", 100)
+    fp2, df2 = make_hourly_file(tmp_path, "BBBB", "2020-01-03 00:00", 200)
+    outfile = tmp_path / "counts.npz"
+    make_observation_count_matrix([fp1, fp2], columns=columns, outfile=outfile)
+
+    counts = load_observation_count_matrix(outfile)
+    assert list(counts.columns) == ["AAAA", "BBBB"]
+    assert counts.index[0] == pd.Timestamp("2020-01-01")
+    assert (counts.dtypes == np.int16).all()
+    for station, df in [("AAAA", df1), ("BBBB", df2)]:
+        expected = count_observations(df, columns=columns)
+        np.testing.assert_array_equal(counts.loc[expected.index, station], expected)
+    # Days outside the station record are zero
+    assert counts.loc["2020-01-01":"2020-01-02", "BBBB"].sum() == 0
+
+
+def make_ptype_file(path, station, start, nhour):
+    index = pd.date_range(start, periods=nhour, freq="h")
+    k = np.arange(nhour)
+    df = pd.DataFrame({"station": station,
+                       "UP": False,
+                       "RA": k % 5 == 0,
+                       "FZRA": k % 7 == 0,
+                       "SOLID": np.where(k % 11 == 0, np.nan, k % 2 == 0)}, index=index)
+    fp = path / f"{station}.hourly.csv"
+    df.to_csv(fp)
+    return fp, df
+
+
+@pytest.mark.parametrize("season", ["winter", "all", [12, 1, 2]])
+def test_season_ptype_counts(tmp_path, season):
+    fp1, df1 = make_ptype_file(tmp_path, "AAAA", "2019-09-20", 24 * 200)
+    fp2, df2 = make_ptype_file(tmp_path, "BBBB", "2020-01-10", 24 * 30)
+    cube = make_ptype_count_cube([fp1, fp2], outfile=tmp_path / "cube.nc",
+                                 cache_path=tmp_path / "cache.pkl")
+    assert cube.dtype == np.int16
+    counts = season_ptype_counts(load_ptype_count_cube(tmp_path / "cube.nc"), season=season)
+
+    months = SEASONS[season] if isinstance(season, str) else season
+    for station, df in [("AAAA", df1), ("BBBB", df2)]:
+        expected = df.loc[df.index.month.isin(months), PTYPES].fillna(False).astype(bool).sum()
+        np.testing.assert_array_equal(counts.loc[station, PTYPES], expected[PTYPES])
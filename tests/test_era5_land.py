@@ -0,0 +1,89 @@
+"""Tests for ERA5-Land batch download using a local stub client"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import ros_database.reanalysis.era5_land as era5_land
+
+
+class StubClient:
+    """Writes a small ERA5-Land like file for a request.  Like the CDS client,
+    the file is written as bytes so the netCDF library is not used in worker
+    threads"""
+    requests = []
+
+    def retrieve(self, dataset, request, target):
+        StubClient.requests.append(request)
+        year, month = int(request["year"]), int(request["month"])
+        hours = [int(t[:2]) for t in request["time"]]
+        times = [pd.Timestamp(year, month, int(day), hour)
+                 for day in request["day"] for hour in hours]
+        latitude = np.arange(70., 60., -1.)
+        longitude = np.arange(-160., -150., 1.)
+        shape = (len(times), len(latitude), len(longitude))
+        ds = xr.Dataset(
+            {
+                "snowc": (("valid_time", "latitude", "longitude"), np.full(shape, 100.)),
+                "sde": (("valid_time", "latitude", "longitude"), np.full(shape, 0.5)),
+            },
+            coords={"valid_time": times, "latitude": latitude, "longitude": longitude},
+        )
+        with open(target, "wb") as f:
+            f.write(ds.to_netcdf())
+
+
+def make_stations():
+    index = pd.Index(["PAFM", "PABR"], name="station")
+    latitude = xr.DataArray([67.1, 65.3], dims=["station"], coords={"station": index})
+    longitude = xr.DataArray([-157.9, -152.1], dims=["station"], coords={"station": index})
+    return latitude, longitude
+
+
+def test_make_request_days():
+    request = era5_land.make_request(2020, 2)
+    assert request["day"][-1] == "29"
+    request = era5_land.make_request(2021, 12)
+    assert len(request["day"]) == 31
+
+
+def test_batch_skips_valid_months(tmp_path):
+    StubClient.requests = []
+    results = era5_land.get_era5_land_batch([2020], months=[1, 2], outdir=tmp_path,
+                                            client_factory=StubClient,
+                                            stations=make_stations())
+    assert sorted(results) == [(2020, 1), (2020, 2)]
+    assert len(StubClient.requests) == 2
+    with xr.open_dataset(era5_land.make_station_filepath(2020, 2, outdir=tmp_path)) as ds:
+        assert ds.sizes == {"valid_time": 29 * 4, "station": 2}
+
+    # Second run only requests missing month
+    results = era5_land.get_era5_land_batch([2020], months=[1, 2, 3], outdir=tmp_path,
+                                            client_factory=StubClient)
+    assert list(results) == [(2020, 3)]
+    assert len(StubClient.requests) == 3
+
+
+def test_batch_samples_skipped_months(tmp_path):
+    StubClient.requests = []
+    # First run stops after download, before sampling at stations
+    era5_land.get_era5_land_batch([2020], months=[1, 2], outdir=tmp_path,
+                                  client_factory=StubClient)
+    assert not era5_land.make_station_filepath(2020, 1, outdir=tmp_path).exists()
+
+    results = era5_land.get_era5_land_batch([2020], months=[1, 2], outdir=tmp_path,
+                                            client_factory=StubClient,
+                                            stations=make_stations())
+    assert results == {}
+    assert len(StubClient.requests) == 2
+    for month, ndays in [(1, 31), (2, 29)]:
+        fp = era5_land.make_station_filepath(2020, month, outdir=tmp_path)
+        with xr.open_dataset(fp) as ds:
+            assert ds.sizes == {"valid_time": ndays * 4, "station": 2}
+
+
+def test_is_valid_file_incomplete(tmp_path):
+    StubClient().retrieve(era5_land.DATASET,
+                          {"year": "2020", "month": "01", "day": ["01", "02"],
+                           "time": era5_land.FORECAST_HOURS},
+                          era5_land.make_filepath(2020, 1, tmp_path))
+    assert not era5_land.is_valid_file(era5_land.make_filepath(2020, 1, tmp_path), 2020, 1)
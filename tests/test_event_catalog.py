@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from ros_database.processing.event_catalog import build_event_catalog, query_events
+
+EVENTS = {
+    "EFHK": [
+        ("2020-01-05 03:00", 3, {"FZRA": 2, "SOLID": 1}, True),
+        ("2020-02-10 12:00", 2, {"RA": 2}, True),
+    ],
+    "PAFM": [
+        ("2020-01-07 06:00", 4, {"RA": 3, "FZRA": 1}, False),
+        ("2020-01-20 00:00", 1, {"SOLID": 1}, None),
+    ],
+}
+
+STATIONS = pd.DataFrame(
+    {
+        "country": ["FI", "US"],
+        "latitude": [60.3, 67.1],
+        "longitude": [24.9, -157.9],
+    },
+    index=pd.Index(["EFHK", "PAFM"], name="stid"))
+
+
+def write_event_file(fp, events):
+    records = []
+    for start, duration, counts, sog in events:
+        start = pd.Timestamp(start)
+        records.append({
+            "start": start,
+            "end": start + pd.Timedelta(hours=duration - 1),
+            "duration": duration,
+            **{ptype: counts.get(ptype, 0) for ptype in ["RA", "UP", "FZRA", "SOLID"]},
+            "t2m_mean": -1.0, "t2m_min": -2.0, "t2m_max": 0.0, "precip": 0.5,
+            "sog": sog,
+        })
+    df = pd.DataFrame(records)
+    df.index = df.start
+    df.index.name = "timestamp"
+    df.to_csv(fp)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    for stid, events in EVENTS.items():
+        write_event_file(tmp_path / f"{stid}.20200101to20201231.event.csv", events)
+    return build_event_catalog(event_path=tmp_path, catalog=tmp_path / "events.sqlite",
+                               stations=STATIONS)
+
+
+@pytest.mark.parametrize(
+    "kwargs,expected",
+    [
+        ({}, ["EFHK", "PAFM", "PAFM", "EFHK"]),
+        ({"start": "2020-01-01", "end": "2020-02-01", "countries": ["FI"],
+          "ptypes": ["FZRA"], "sog": True}, ["EFHK"]),
+        ({"ptypes": ["RA", "FZRA"]}, ["PAFM"]),
+        ({"stations": ["PAFM"], "min_duration": 2}, ["PAFM"]),
+        ({"sog": False}, ["PAFM"]),
+    ]
+)
+def test_query_events(catalog, kwargs, expected):
+    result = query_events(catalog=catalog, **kwargs)
+    assert result.station.tolist() == expected
+
+
+def test_query_events_metadata(catalog):
+    result = query_events(catalog=catalog, stations=["EFHK"])
+    assert (result.country == "FI").all()
+    assert result.start.dtype == "datetime64[ns]"
+    assert result.sog.tolist() == [True, True]
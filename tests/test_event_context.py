@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ros_database.processing.event_context import enrich_events, context_name
+
+NHOUR = 120
+
+
+def make_hourly():
+    """Hourly series with t2m increasing by 0.5 per hour and psurf decreasing
+    by 1 per hour"""
+    index = pd.date_range("2020-01-01", periods=NHOUR, freq="h")
+    k = np.arange(NHOUR, dtype=float)
+    return pd.DataFrame({"t2m": -10. + 0.5 * k,
+                         "psurf": 1000. - k,
+                         "wspd": np.where(k < 48, 2., 6.),
+                         "relh": 90.}, index=index)
+
+
+def make_events(rows):
+    return pd.DataFrame({"start": [pd.Timestamp(start) for start, _ in rows],
+                         "end": [pd.Timestamp(end) for _, end in rows]})
+
+
+def test_enrich_events():
+    hourly = make_hourly()
+    events = make_events([("2020-01-03 00:00", "2020-01-03 05:00"),
+                          ("2020-01-04 00:00", "2020-01-04 02:00")])
+    result = enrich_events(events, hourly)
+    np.testing.assert_allclose(result.t2m_slope_pre24h, [0.5, 0.5])
+    np.testing.assert_allclose(result.psurf_slope_pre24h, [-1., -1.])
+    np.testing.assert_allclose(result.psurf_slope_event, [-1., -1.])
+    # Mean of hours 24 to 47 and 48 to 71
+    np.testing.assert_allclose(result.t2m_mean_pre24h, [-10. + 0.5 * 35.5, -10. + 0.5 * 59.5])
+    np.testing.assert_allclose(result.wspd_mean_pre24h, [2., 6.])
+    np.testing.assert_allclose(result.wspd_mean_event, [6., 6.])
+    np.testing.assert_allclose(result.relh_mean_event, [90., 90.])
+
+
+@pytest.mark.parametrize(
+    "missing,expected",
+    [
+        (slice(0, 48), np.nan),   # no data before event
+        (slice(24, 36), 0.5),     # half of window available
+        (slice(24, 37), np.nan),  # less than half available
+    ]
+)
+def test_enrich_events_missing(missing, expected):
+    hourly = make_hourly()
+    hourly.iloc[missing, hourly.columns.get_loc("t2m")] = np.nan
+    # Irregular records are reindexed to hourly
+    hourly = hourly.dropna()
+    events = make_events([("2020-01-03 00:00", "2020-01-03 05:00")])
+    result = enrich_events(events, hourly)
+    np.testing.assert_allclose(result.t2m_slope_pre24h, [expected])
+
+
+def test_enrich_events_at_record_bounds():
+    hourly = make_hourly()
+    events = make_events([("2020-01-01 00:00", "2020-01-01 03:00"),
+                          ("2020-01-05 20:00", "2020-01-05 23:00")])
+    result = enrich_events(events, hourly,
+                           context=[("t2m", "mean", "pre", 24), ("t2m", "mean", "post", 24)])
+    assert np.isnan(result[context_name("t2m", "mean", "pre", 24)].iloc[0])
+    assert np.isnan(result[context_name("t2m", "mean", "post", 24)].iloc[1])
+    assert not np.isnan(result.t2m_mean_post24h.iloc[0])
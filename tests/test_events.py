@@ -3,9 +3,11 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 import datetime as dt
+import pytest
 
 from ros_database.processing.surface import load_station_combined_data, load_event_file
-from ros_database.processing.extract_precip_events import find_events
+from ros_database.processing.extract_precip_events import (find_events, segment_events,
+                                                          find_events_streaming)
 
 PTYPES = ['UP','RA','FZRA','SOLID']
 
@@ -93,3 +95,101 @@ def test_identify_precipitation_event_file():
 #    with pd.option_context('display.max_rows', None, 'display.max_columns', None):
 #        print(expected)
     
+
+
+def make_segment_dataframe(rows):
+    """Makes a dataframe from a list of (timestamp, ptype, sog).  ptype None
+    is a row with missing precipitation types"""
+    records = []
+    for _, ptype, sog in rows:
+        if ptype is None:
+            records.append({**{pcode: np.nan for pcode in PTYPES}, "sog": sog})
+        else:
+            records.append({**gen_ptype(ptype), "sog": sog})
+    df = pd.DataFrame(records, index=pd.to_datetime([row[0] for row in rows]))
+    df["t2m"] = 0.5
+    df["p01i"] = 0.1
+    return df
+
+
+SEGMENT_ROWS = [
+    ("2024-01-01 00:00", ["RA"], True),
+    ("2024-01-01 01:00", ["RA"], True),
+    ("2024-01-01 02:00", [], True),
+    ("2024-01-01 03:00", ["SOLID"], True),
+    ("2024-01-01 04:00", None, True),
+    ("2024-01-01 05:00", ["FZRA"], True),
+    # Rows absent for two days
+    ("2024-01-03 05:00", ["RA"], False),
+]
+
+
+@pytest.mark.parametrize(
+    "max_dry_gap,max_missing_gap,expected",
+    [
+        ("0h", "0h", [1, 1, 2, 3, 4]),
+        ("1h", "0h", [1, 1, 1, 2, 3]),
+        ("1h", "1h", [1, 1, 1, 1, 2]),
+        ("1h", "3D", [1, 1, 1, 1, 1]),
+    ]
+)
+def test_segment_events(max_dry_gap, max_missing_gap, expected):
+    df = make_segment_dataframe(SEGMENT_ROWS)
+    result = segment_events(df, max_dry_gap=max_dry_gap, max_missing_gap=max_missing_gap)
+    assert result.event.tolist() == expected
+
+
+def test_segment_events_ros():
+    df = make_segment_dataframe(SEGMENT_ROWS)
+    result = segment_events(df, max_dry_gap="1h", max_missing_gap="1h", ros=True)
+    assert result.ros_event.tolist() == [1, 1, pd.NA, 2, pd.NA]
+
+
+@pytest.mark.parametrize("max_missing_gap", ["0h", "1h", "3h"])
+def test_segment_events_ros_split_by_solid(max_missing_gap):
+    rows = [
+        ("2024-01-01 00:00", ["RA"], True),
+        ("2024-01-01 01:00", ["SOLID"], True),
+        ("2024-01-01 02:00", ["RA"], True),
+    ]
+    df = make_segment_dataframe(rows)
+    result = segment_events(df, max_dry_gap="1h", max_missing_gap=max_missing_gap, ros=True)
+    assert result.event.tolist() == [1, 1, 1]
+    assert result.ros_event.tolist() == [1, pd.NA, 2]
+
+
+def test_find_events_with_gaps():
+    df = make_segment_dataframe(SEGMENT_ROWS)
+    result = find_events(df, max_dry_gap="1h", max_missing_gap="1h", ros=True)
+    assert result.duration.tolist() == [4, 1]
+    assert result.ros_events.tolist() == [2, 0]
+    assert result.ros_duration.tolist() == [3, 0]
+
+
+@pytest.fixture
+def combined_file(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 300
+    df = pd.DataFrame({"station": "TEST",
+                       "t2m": rng.normal(0., 3., n).round(1),
+                       "relh": 80.,
+                       "p01i": rng.random(n).round(1)},
+                      index=pd.date_range("2020-01-01", periods=n, freq="h", name="timestamp"))
+    for ptype in PTYPES:
+        df[ptype] = (rng.random(n) < 0.2).astype(object)
+    df.iloc[100:110, df.columns.get_indexer(PTYPES)] = np.nan
+    df["sog"] = (rng.random(n) < 0.5).astype(object)
+    df.iloc[:50, df.columns.get_indexer(["sog"])] = np.nan
+    fp = tmp_path / "TEST.hourly.combined.csv"
+    df.to_csv(fp)
+    return fp
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+@pytest.mark.parametrize("chunksize", [7, 50, 1000])
+@pytest.mark.parametrize("kwargs", [{}, {"max_dry_gap": "2h", "max_missing_gap": "3h", "ros": True}])
+def test_find_events_streaming(combined_file, chunksize, kwargs):
+    expected = find_events(load_station_combined_data(combined_file), **kwargs)
+    result = find_events_streaming(combined_file, chunksize=chunksize, **kwargs)
+    assert result.sog.dtype == "boolean"
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,55 @@
+"""Tests for streaming upper air extraction to zarr"""
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import ros_database.reanalysis.extract_reanalysis_for_stations as ext
+
+YEAR = 2020
+
+
+def make_upper_air_cube(year, variable, reanalysis="era5"):
+    """Returns a small air temperature cube spanning a month boundary"""
+    time = pd.date_range(f"{year}-01-31", periods=48, freq="h")
+    level = np.array([1000, 925, 850, 700, 500, 300])
+    latitude = np.arange(80., 59., -5.)
+    longitude = np.arange(0., 30., 5.)
+    rng = np.random.default_rng(0)
+    shape = (len(time), len(level), len(latitude), len(longitude))
+    ta = (200. + 100. * rng.random(shape)).astype(np.float32)
+    ds = xr.Dataset({"T": (("time", "level", "latitude", "longitude"), ta)},
+                    coords={"time": time, "level": level,
+                            "latitude": latitude, "longitude": longitude})
+    return ds.chunk({"level": 1})
+
+
+def make_stations():
+    stations = ["AAAA", "BBBB", "CCCC"]
+    latitude = xr.DataArray([79., 66., 61.], dims="station", coords={"station": stations})
+    longitude = xr.DataArray([1., 12., 24.], dims="station", coords={"station": stations})
+    return latitude, longitude
+
+
+@pytest.mark.parametrize("pack", [None, "float32", "int16"])
+def test_stream_matches_eager_extraction(tmp_path, monkeypatch, pack):
+    monkeypatch.setattr(ext, "load_upper_air_data", make_upper_air_cube)
+    monkeypatch.setattr(ext, "STATIONS_UPPER_AIR_REANALYSIS", tmp_path)
+    stations = make_stations()
+
+    ext.extract_upper_air_variable(YEAR, "air_temperature", stations, "era5")
+    ext.extract_upper_air_variable(YEAR, "air_temperature", stations, "era5",
+                                   stream=True, level_block=4, pack=pack)
+
+    with xr.open_dataset(tmp_path / f"era5.air_temperature.stations.{YEAR}.nc") as ds:
+        eager = ds.T.transpose("time", "level", "station").load()
+    with xr.open_zarr(tmp_path / f"era5.air_temperature.stations.{YEAR}.zarr") as ds:
+        streamed = ds.T.load()
+        scale_factor = ds.T.encoding.get("scale_factor")
+
+    assert streamed.dims == ("time", "level", "station")
+    np.testing.assert_array_equal(streamed.station, eager.station)
+    if pack == "int16":
+        np.testing.assert_allclose(streamed, eager, rtol=0, atol=scale_factor / 2)
+    else:
+        np.testing.assert_array_equal(streamed, eager)
@@ -0,0 +1,88 @@
+import os
+import pickle
+
+import pytest
+
+from ros_database.processing.file_cache import cached_map
+
+
+def count_lines(fp):
+    with open(fp) as f:
+        return len(f.readlines())
+
+
+def file_size(fp):
+    return fp.stat().st_size
+
+
+def make_files(path, nlines):
+    filepaths = []
+    for i, n in enumerate(nlines):
+        fp = path / f"STN{i}.hourly.csv"
+        fp.write_text("x\n" * n)
+        filepaths.append(fp)
+    return filepaths
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_cached_map(tmp_path, jobs):
+    filepaths = make_files(tmp_path, [1, 2, 3])
+    cache_path = tmp_path / "cache.pkl"
+    results = cached_map(count_lines, filepaths, cache_path=cache_path, jobs=jobs)
+    assert list(results.values()) == [1, 2, 3]
+
+    # Unchanged files are read from the cache, changed files are processed
+    filepaths[0].write_text("x\n" * 10)
+    os.utime(filepaths[1], ns=(0, 0))
+    results = cached_map(count_lines, filepaths, cache_path=cache_path, jobs=jobs)
+    assert list(results.values()) == [10, 2, 3]
+
+    # A different function or result version processes all files
+    results = cached_map(file_size, filepaths, cache_path=cache_path, jobs=jobs)
+    assert list(results.values()) == [20, 4, 6]
+    filepaths[2].write_text("x\n" * 4)
+    results = cached_map(count_lines, filepaths, cache_path=cache_path, jobs=jobs)
+    assert list(results.values()) == [10, 2, 4]
+    filepaths[2].write_text("x\n" * 5)
+    results = cached_map(file_size, filepaths, cache_path=cache_path, version=1, jobs=jobs)
+    assert list(results.values()) == [20, 4, 10]
+
+
+def test_cached_map_params(tmp_path):
+    filepaths = make_files(tmp_path, [1, 2])
+    cache_path = tmp_path / "cache.pkl"
+    cached_map(file_size, filepaths, cache_path=cache_path, params={"columns": ["t2m"]})
+    # Mark cached results so reuse can be detected
+    with open(cache_path, "rb") as f:
+        cache = pickle.load(f)
+    cache["entries"] = {key: (signature, -1) for key, (signature, _) in cache["entries"].items()}
+    with open(cache_path, "wb") as f:
+        pickle.dump(cache, f)
+
+    results = cached_map(file_size, filepaths, cache_path=cache_path, params={"columns": ["t2m"]})
+    assert list(results.values()) == [-1, -1]
+    results = cached_map(file_size, filepaths, cache_path=cache_path, params={"columns": ["p01i"]})
+    assert list(results.values()) == [2, 4]
+
+
+def test_cached_map_prunes_entries(tmp_path):
+    filepaths = make_files(tmp_path, [1, 2, 3])
+    cache_path = tmp_path / "cache.pkl"
+    cached_map(count_lines, filepaths, cache_path=cache_path)
+    filepaths[1].unlink()
+    cached_map(count_lines, filepaths[::2], cache_path=cache_path)
+    with open(cache_path, "rb") as f:
+        entries = pickle.load(f)["entries"]
+    assert sorted(entries) == sorted(str(fp.resolve()) for fp in filepaths[::2])
+
+
+def test_cached_map_failure(tmp_path):
+    filepaths = make_files(tmp_path, [1, 2])
+    filepaths[1].write_bytes(b"\xff\xfe\x00")
+    errors = {}
+    with pytest.warns(UserWarning, match="Failed to process"):
+        results = cached_map(count_lines, filepaths, cache_path=tmp_path / "cache.pkl",
+                             errors=errors)
+    assert list(results.values()) == [1]
+    assert list(errors) == [filepaths[1]]
+    assert errors[filepaths[1]].startswith("UnicodeDecodeError")
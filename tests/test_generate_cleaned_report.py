@@ -1,10 +1,12 @@
 """Testing for helpers to check cleaned data"""
+from pathlib import Path
+
 import pytest
 
 import numpy as np
 import pandas as pd
 
-import ros_database.processing.generate_cleaned_data_report as rep
+import ros_database.analysis.generate_cleaned_data_report as rep
 
 
 def make_test_data(nperiod = 5):
@@ -195,3 +197,35 @@ def test_count_ptype_with_zero_precip(p01i, expected):
 def test_count_ptype_with_precip_isnan(p01i, expected):
     df['p01i'] = p01i
     assert rep.count_ptype_with_precip_isnan(df) == expected
+
+
+@pytest.mark.parametrize(
+    "p01i",
+    [
+        np.nan,
+        0.2,
+        [np.nan, 0.2, 1.0, 0.5, 0.0],
+    ]
+)
+def test_get_inventory_from_dataframe(p01i):
+    df['p01i'] = p01i
+    inventory = rep.get_inventory_from_dataframe(df)
+    assert inventory['nrecord'] == 5
+    assert inventory['nprecip'] == rep.count_precip_events(df)
+    assert inventory['ntrace'] == rep.count_trace_precip(df)
+    assert inventory['nany_ptype'] == rep.count_any_ptype(df)
+    assert inventory['precip_any_ptype'] == rep.count_ptype_with_precip(df)
+    assert inventory['trace_any_ptype'] == rep.count_ptype_with_trace(df)
+    assert inventory['zero_any_ptype'] == rep.count_ptype_with_zero_precip(df)
+    assert inventory['nan_any_ptype'] == rep.count_ptype_with_precip_isnan(df)
+    assert inventory['missing_RA'] == 5
+
+
+def test_generate_cleaned_data_report(tmp_path):
+    filepaths = [Path(__file__).parent / 'test_data_cleaned.csv',
+                 tmp_path / 'missing.clean.csv']
+    report = rep.generate_cleaned_data_report(tmp_path / 'report.csv', filepaths=filepaths)
+    assert list(report.index) == ['missing', 'test_data_cleaned']
+    assert report.loc['missing', 'error'].startswith('FileNotFoundError')
+    assert report.loc['test_data_cleaned', 'nrecord'] > 0
+    assert (tmp_path / 'report.csv').exists()
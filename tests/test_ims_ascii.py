@@ -0,0 +1,57 @@
+import gzip
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from ros_database.ims_snow.get_snow_cover import read_ims_ascii, load_ascii_grid
+from ros_database.ims_snow.convert_ascii import convert_ascii_files
+from ros_database.ims_snow.cube import load_cube
+
+NCOL = 1024
+
+
+def write_ascii(filepath, value):
+    header = "IMS 24km test file\nDimensions: 1024 1024\n"
+    rows = "\n".join([str(value) * NCOL] * NCOL)
+    with gzip.open(filepath, "wb") as f:
+        f.write((header + rows + "\n").encode("ascii"))
+
+
+@pytest.fixture
+def ascii_files(tmp_path):
+    files = []
+    for day, value in zip(range(36, 39), [2, 3, 4]):
+        fp = tmp_path / f"ims1997{day:03d}_00UTC_24km_v1.1.asc.gz"
+        write_ascii(fp, value)
+        files.append(fp)
+    return files
+
+
+def test_read_ims_ascii(ascii_files):
+    header, data = read_ims_ascii(ascii_files[0], with_header=True, dtype=np.uint8)
+    assert len(header) == 2
+    assert data.shape == (NCOL, NCOL)
+    assert (data == 2).all()
+
+
+def test_load_ascii_grid(ascii_files):
+    ds = load_ascii_grid(ascii_files[1])
+    assert ds.surface_cover.dtype == np.uint8
+    assert ds.time.values[0] == np.datetime64("1997-02-06")
+    assert ds.rio.crs is not None
+
+
+@pytest.mark.parametrize("to", ["netcdf", "zarr"])
+def test_convert_ascii_files(ascii_files, tmp_path, to):
+    store = tmp_path / "cube.zarr"
+    results = convert_ascii_files(ascii_files, to=to, outdir=tmp_path / "netcdf",
+                                  store=store, lon=[-150., 20.], lat=[65., 69.],
+                                  jobs=2)
+    if to == "netcdf":
+        with xr.open_dataset(results[ascii_files[2]]) as ds:
+            assert (ds.surface_cover == 4).all()
+    else:
+        with load_cube(store=store) as ds:
+            assert ds.sizes["time"] == 3
+            assert (ds.surface_cover.isel(time=0) == 2).all()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from ros_database.ims_snow.ims_crs import IMS24Grid
+from ros_database.ims_snow.cube import build_cube, load_cube, station_bbox
+
+LON = np.array([-150., -100., 20.])
+LAT = np.array([65., 70., 69.])
+
+
+def fake_opener(href):
+    """Returns a grid with y descending, as in IMS netcdf files, where each
+    value is the day of month"""
+    date = pd.Timestamp(href)
+    data = np.full((1, IMS24Grid.nrow, IMS24Grid.ncol), date.day, dtype=np.int8)
+    return xr.DataArray(data, dims=["time", "y", "x"],
+                        coords={"time": [date], "y": IMS24Grid.y[::-1], "x": IMS24Grid.x})
+
+
+def make_catalog(ndays):
+    dates = pd.date_range("2020-01-01", periods=ndays).strftime("%Y-%m-%d")
+    return {date: date for date in dates}
+
+
+def test_build_cube_appends_new_dates(tmp_path):
+    store = tmp_path / "cube.zarr"
+    build_cube(make_catalog(3), resolution="24km", lon=LON, lat=LAT, store=store,
+               batch_size=2, opener=fake_opener)
+    opened = []
+    build_cube(make_catalog(5), resolution="24km", lon=LON, lat=LAT, store=store,
+               batch_size=2, opener=lambda href: opened.append(href) or fake_opener(href))
+    assert opened == ["2020-01-04", "2020-01-05"]
+
+    with load_cube(store=store) as ds:
+        assert ds.surface_cover.dtype == np.uint8
+        assert ds.sizes["time"] == 5
+        assert ds.sizes["x"] < IMS24Grid.ncol
+        assert (np.diff(ds.y.values) > 0).all()
+        np.testing.assert_array_equal(ds.surface_cover.isel(x=0, y=0).values,
+                                      [1, 2, 3, 4, 5])
+
+
+def masked_opener(href):
+    """Returns a grid decoded to float, with the first row masked"""
+    da = fake_opener(href).astype(np.float32)
+    return da.where(da.y != da.y[0])
+
+
+@pytest.mark.filterwarnings("error:invalid value encountered in cast:RuntimeWarning")
+def test_build_cube_masked_values(tmp_path):
+    store = tmp_path / "cube.zarr"
+    build_cube(make_catalog(2), resolution="24km", lon=LON, lat=LAT, store=store,
+               buffer=IMS24Grid.nrow, opener=masked_opener)
+    with load_cube(store=store) as ds:
+        # Masked first row of the descending file is the last row of the cube
+        np.testing.assert_array_equal(ds.surface_cover.isel(y=-1).values, 0)
+        np.testing.assert_array_equal(ds.surface_cover.isel(y=0, x=0).values, [1, 2])
+
+
+def test_station_bbox_contains_land_pixels():
+    cols, rows = IMS24Grid.lonlat_to_index(LON, LAT)
+    mask = np.zeros((IMS24Grid.nrow, IMS24Grid.ncol), dtype=bool)
+    mask[rows.max() + 3, cols.max() + 2] = True
+    col0, col1, row0, row1 = station_bbox(IMS24Grid, LON, LAT, buffer=0)
+    assert (col1, row1) == (cols.max() + 1, rows.max() + 1)
+    col0, col1, row0, row1 = station_bbox(IMS24Grid, LON, LAT, buffer=0, land_mask=mask)
+    assert (col0, row0) == (cols.min(), rows.min())
+    assert (col1, row1) == (cols.max() + 3, rows.max() + 4)
@@ -0,0 +1,86 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from ros_database.ims_snow.ims_crs import IMS24Grid
+from ros_database.ims_snow.latlon import open_latlon, raw_filepath
+
+
+# Centres of IMS 24 km cells (col, row, latitude, longitude): the four corners,
+# the cell next to the pole and an interior cell.  Values are from the
+# spherical polar stereographic formulas for the parameters in Ims24km.gpd,
+# independent of Grid
+KNOWN_CELLS = [
+    (0, 0, -20.484920, -125.000000),
+    (1023, 0, -20.485458, -34.999425),
+    (0, 1023, -20.485458, 144.999425),
+    (1023, 1023, -20.485996, 55.000000),
+    (511, 511, 89.840231, -125.000000),
+    (100, 900, -6.855573, 146.646066),
+]
+
+
+@pytest.fixture
+def latlon_files(tmp_path):
+    """Writes 24 km latitude and longitude files that are NaN except for
+    KNOWN_CELLS"""
+    cols, rows, lat, lon = (np.array(values) for values in zip(*KNOWN_CELLS))
+    files = []
+    for name, values in [("imslat_24km.bin.gz", lat), ("imslon_24km.bin.gz", lon)]:
+        grid = np.full((1024, 1024), np.nan, dtype="<f4")
+        grid[rows, cols] = values
+        with gzip.open(tmp_path / name, "wb") as f:
+            f.write(grid.tobytes())
+        files.append(tmp_path / name)
+    return files
+
+
+def test_open_latlon(latlon_files):
+    latfile, lonfile = latlon_files
+    latitude = open_latlon(latfile)
+    longitude = open_latlon(lonfile)
+    assert isinstance(latitude, np.memmap)
+    assert latitude.shape == (1024, 1024)
+    assert raw_filepath(latfile).exists()
+    cols, rows, lat, lon = (np.array(values) for values in zip(*KNOWN_CELLS))
+    np.testing.assert_allclose(latitude[rows, cols], lat, atol=1e-5)
+    np.testing.assert_allclose(longitude[rows, cols], lon, atol=1e-4)
+
+
+def test_check_lonlat(latlon_files):
+    latitude, longitude = (open_latlon(fp) for fp in latlon_files)
+    cols, rows = [cell[0] for cell in KNOWN_CELLS], [cell[1] for cell in KNOWN_CELLS]
+    dlon, dlat = IMS24Grid.check_lonlat(latitude, longitude, cols, rows)
+    assert dlon < 1e-4
+    assert dlat < 1e-4
+
+
+@pytest.mark.parametrize(
+    "lon,lat,expected",
+    [
+        ([-80.], [90.], ([511], [511])),
+        ([-80., 100.], [90., -30.], ([511, -1], [511, -1])),
+    ]
+)
+def test_lonlat_to_index(lon, lat, expected):
+    cols, rows = IMS24Grid.lonlat_to_index(lon, lat, check_bounds=False)
+    np.testing.assert_array_equal(cols, expected[0])
+    np.testing.assert_array_equal(rows, expected[1])
+    np.testing.assert_array_equal(IMS24Grid.flat_index(cols, rows),
+                                  np.where(cols >= 0, rows * 1024 + cols, -1))
+
+
+def test_xy_to_index_matches_lonlat_to_index():
+    lon, lat = np.array([-80., 20., -150.]), np.array([90., 60., 45.])
+    expected = IMS24Grid.lonlat_to_index(lon, lat)
+    result = IMS24Grid.xy_to_index(*IMS24Grid.lonlat_to_xy(lon, lat))
+    np.testing.assert_array_equal(result, expected)
+    # A grid made from pixel centre coordinates has the same indices
+    grid = IMS24Grid.from_xy(IMS24Grid.x, IMS24Grid.y)
+    np.testing.assert_array_equal(grid.xy_to_index(*IMS24Grid.lonlat_to_xy(lon, lat)), expected)
+
+
+def test_lonlat_to_index_out_of_bounds():
+    with pytest.raises(ValueError):
+        IMS24Grid.lonlat_to_index([100.], [-30.])
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from ros_database.ims_snow import land_mask
+from ros_database.ims_snow.get_snow_cover import (coords_to_colrow, extract_from_dataset,
+                                                  extract_windows_from_dataset)
+from ros_database.ims_snow.sampling import window_indices, gather, window_statistics
+from ros_database.ims_snow.codes import MISSING, OPEN_SEA, LAND, SEA_ICE, SNOW
+from ros_database.ims_snow.ims_crs import Grid, IMS24Grid
+
+GRID = Grid.from_xy(np.arange(5.), np.arange(5.))
+
+
+@pytest.mark.parametrize(
+    "col,row,expected",
+    [
+        (2, 2, [6, 7, 8, 11, 12, 13, 16, 17, 18]),
+        (0, 0, [-1, -1, -1, -1, 0, 1, -1, 5, 6]),
+        (4, 4, [18, 19, -1, 23, 24, -1, -1, -1, -1]),
+        (-1, -1, [-1] * 9),
+    ]
+)
+def test_window_indices(col, row, expected):
+    result = window_indices(np.array([col]), np.array([row]), GRID, size=3)
+    np.testing.assert_array_equal(result[0], expected)
+
+
+def test_gather_keeps_leading_dimensions():
+    grid = np.arange(2 * 5 * 5).reshape(2, 5, 5)
+    flat_index = window_indices(np.array([2, 0]), np.array([2, 0]), GRID, size=3)
+    result = gather(grid, flat_index, fill=-1)
+    assert result.shape == (2, 2, 9)
+    np.testing.assert_array_equal(result[1, 0], 25 + flat_index[0])
+    assert (result[:, 1, flat_index[1] < 0] == -1).all()
+
+
+@pytest.mark.parametrize(
+    "samples,majority,snow_fraction",
+    [
+        ([SNOW] * 5 + [LAND] * 3 + [OPEN_SEA], SNOW, 5 / 8),
+        ([SEA_ICE] * 6 + [SNOW] + [LAND] * 2, SEA_ICE, 1 / 3),
+        ([OPEN_SEA] * 9, OPEN_SEA, np.nan),
+        ([MISSING] * 9, MISSING, np.nan),
+    ]
+)
+def test_window_statistics(samples, majority, snow_fraction):
+    result_majority, result_fraction = window_statistics(np.array([samples]))
+    assert result_majority[0] == majority
+    np.testing.assert_allclose(result_fraction[0], snow_fraction)
+
+
+def make_ims_dataset():
+    """Two day 6 x 6 IMS dataset with y descending.  On day one the top three
+    rows are snow and the bottom three rows land, on day two all pixels are
+    open sea"""
+    x = np.arange(6) * 100.
+    y = np.arange(6)[::-1] * 100.
+    day1 = np.full((6, 6), LAND, dtype=np.int8)
+    day1[:3] = SNOW
+    day2 = np.full((6, 6), OPEN_SEA, dtype=np.int8)
+    return xr.Dataset({"IMS_Surface_Values": (("time", "y", "x"), np.stack([day1, day2]))},
+                      coords={"time": pd.date_range("2020-01-01", periods=2),
+                              "x": x, "y": y})
+
+
+def make_station_coords(xy):
+    stations = [f"STN{i}" for i in range(len(xy))]
+    x = xr.DataArray([p[0] for p in xy], dims="station", coords={"station": stations})
+    y = xr.DataArray([p[1] for p in xy], dims="station", coords={"station": stations})
+    return x, y
+
+
+def test_coords_to_colrow():
+    x, y = make_station_coords([(100., 400.), (410., 190.), (0., 0.)])
+    cols, rows = coords_to_colrow(make_ims_dataset(), x, y)
+    np.testing.assert_array_equal(cols, [1, 4, 0])
+    np.testing.assert_array_equal(rows, [1, 3, 5])
+
+
+def test_extract_windows_from_dataset():
+    x, y = make_station_coords([(100., 400.), (410., 190.), (0., 0.)])
+    df = extract_windows_from_dataset(make_ims_dataset(), x, y, size=3)
+    np.testing.assert_array_equal(df["majority"].iloc[0], [SNOW, LAND, LAND])
+    np.testing.assert_allclose(df["snow_fraction"].iloc[0], [1., 1 / 3, 0.])
+    np.testing.assert_array_equal(df["majority"].iloc[1], [OPEN_SEA] * 3)
+    assert df["snow_fraction"].iloc[1].isna().all()
+
+
+@pytest.fixture
+def coastal_dataset(monkeypatch):
+    """One day 24 km IMS dataset with y descending that is open sea except for
+    one land pixel, and a land mask with the same land pixel"""
+    mask = np.zeros((IMS24Grid.nrow, IMS24Grid.ncol), dtype=bool)
+    mask[500, 510] = True
+    monkeypatch.setattr(land_mask, "load_land_mask", lambda resolution: mask)
+    surface = np.where(mask, LAND, OPEN_SEA).astype(np.int8)[::-1]
+    return xr.Dataset({"IMS_Surface_Values": (("time", "y", "x"), surface[np.newaxis])},
+                      coords={"time": pd.date_range("2020-01-01", periods=1),
+                              "x": IMS24Grid.x, "y": IMS24Grid.y[::-1], "projection": 0})
+
+
+@pytest.mark.parametrize("land_remap,expected", [(False, OPEN_SEA), (True, LAND)])
+def test_extract_with_land_remap(coastal_dataset, land_remap, expected):
+    x, y = make_station_coords([IMS24Grid.colrow_to_xy(512.2, 501.7)])
+    df = extract_from_dataset(coastal_dataset, x, y, land_remap=land_remap)
+    assert df.iloc[0, 0] == expected
+    df = extract_windows_from_dataset(coastal_dataset, x, y, size=1, land_remap=land_remap)
+    assert df["majority"].iloc[0, 0] == expected
@@ -0,0 +1,73 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from ros_database.ims_snow import land_mask
+from ros_database.ims_snow.ims_crs import Grid, IMS24Grid
+from ros_database.ims_snow.land_mask import (nearest_land_pixel, rasterize_land, make_land_mask,
+                                             load_land_mask, land_mask_filepath, remap_xy_to_land)
+
+MASK = np.zeros((10, 10), dtype=bool)
+MASK[:5, :5] = True
+MASK_GRID = Grid.from_xy(np.arange(10.), np.arange(10.))
+
+
+@pytest.mark.parametrize(
+    "col,row,expected",
+    [
+        (2, 2, (2, 2, 0.)),
+        (7, 2, (4, 2, 3.)),
+        (6, 6, (4, 4, np.sqrt(8.))),
+        (9, 9, (9, 9, np.nan)),
+    ]
+)
+def test_nearest_land_pixel(col, row, expected):
+    cols, rows, distance = nearest_land_pixel(MASK, MASK_GRID, np.array([col]),
+                                              np.array([row]), max_distance=3)
+    assert (cols[0], rows[0]) == expected[:2]
+    np.testing.assert_allclose(distance[0], expected[2])
+
+
+def scandinavia():
+    """Land polygon roughly covering Scandinavia, in geographic coordinates"""
+    return gpd.GeoDataFrame(geometry=[box(5., 56., 30., 71.)], crs=4326)
+
+
+def test_rasterize_land():
+    mask = rasterize_land(scandinavia(), IMS24Grid)
+    assert mask.shape == (IMS24Grid.nrow, IMS24Grid.ncol)
+    # Masks are indexed [row, col] in grid image coordinates
+    cols, rows = IMS24Grid.lonlat_to_index([18., 18., -40.], [65., 50., 72.])
+    np.testing.assert_array_equal(mask[rows, cols], [True, False, False])
+
+
+def test_make_land_mask_is_cached(tmp_path, monkeypatch):
+    coastline_file = tmp_path / "coastline.gpkg"
+    scandinavia().to_file(coastline_file)
+    fp = make_land_mask(coastline_file, resolution="24km", path=tmp_path)
+    assert fp == land_mask_filepath("24km", path=tmp_path)
+
+    # An existing mask is not rasterized again unless clobber is set
+    def fail(*args, **kwargs):
+        raise AssertionError("rasterized again")
+    monkeypatch.setattr(land_mask, "rasterize_land", fail)
+    assert make_land_mask(coastline_file, resolution="24km", path=tmp_path) == fp
+    with pytest.raises(AssertionError):
+        make_land_mask(coastline_file, resolution="24km", path=tmp_path, clobber=True)
+
+    mask = load_land_mask("24km", path=tmp_path)
+    assert mask.dtype == bool
+    assert not mask.flags.writeable
+    assert load_land_mask("24km", path=tmp_path) is mask
+    np.testing.assert_array_equal(mask, rasterize_land(scandinavia(), IMS24Grid))
+
+
+def test_remap_xy_to_land():
+    mask = np.zeros((IMS24Grid.nrow, IMS24Grid.ncol), dtype=bool)
+    mask[500, 510] = True
+    x, y = IMS24Grid.colrow_to_xy(np.array([512.2, 900.5]), np.array([501.7, 900.5]))
+    land_x, land_y = remap_xy_to_land(x, y, resolution="24km", mask=mask)
+    # First point moves to the land pixel centre, second has no land nearby
+    np.testing.assert_allclose(IMS24Grid.xy_to_colrow(land_x, land_y),
+                               [[510.5, 900.5], [500.5, 900.5]])
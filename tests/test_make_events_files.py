@@ -0,0 +1,67 @@
+"""Tests for the station runner in scripts/make_events_files.py"""
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ros_database.processing.extract_precip_events import PTYPES, find_events
+from ros_database.processing.surface import load_station_combined_data
+
+SCRIPT = Path(__file__).parents[1] / "scripts" / "make_events_files.py"
+
+
+@pytest.fixture(scope="module")
+def events_script():
+    spec = importlib.util.spec_from_file_location("make_events_files", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so process_station can be pickled for worker processes
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_combined_file(path, station, seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    df = pd.DataFrame({"station": station,
+                       "t2m": rng.normal(0., 3., n).round(1),
+                       "p01i": rng.random(n).round(1)},
+                      index=pd.date_range("2020-01-01", periods=n, freq="h", name="timestamp"))
+    for ptype in PTYPES:
+        df[ptype] = rng.random(n) < 0.2
+    df["sog"] = rng.random(n) < 0.5
+    fp = path / f"{station}.hourly.combined.csv"
+    df.to_csv(fp)
+    return fp
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_make_events_files(tmp_path, capsys, events_script, jobs):
+    hourly_path = tmp_path / "combined"
+    outpath = tmp_path / "events"
+    hourly_path.mkdir()
+    good = [make_combined_file(hourly_path, station, seed)
+            for seed, station in enumerate(["AAAA", "CCCC"])]
+    # Malformed file without precipitation type columns
+    (hourly_path / "BBBB.hourly.combined.csv").write_text("timestamp,x\n2020-01-01 00:00,1\n")
+
+    summary = events_script.make_events_files(jobs=jobs, hourly_path=hourly_path,
+                                              outpath=outpath)
+    assert list(summary.index) == ["AAAA", "BBBB", "CCCC"]
+    assert summary.error[["AAAA", "CCCC"]].isna().all()
+    assert summary.error["BBBB"].startswith("KeyError")
+    assert summary.events.isna().tolist() == [False, True, False]
+
+    for fp in good:
+        expected = find_events(load_station_combined_data(fp))
+        assert summary.events[fp.name.split(".")[0]] == len(expected)
+        assert (outpath / fp.name.replace("hourly.combined", "event")).exists()
+    assert not (outpath / "BBBB.event.csv").exists()
+
+    events_script.print_summary(summary, 1.)
+    out = capsys.readouterr().out
+    assert "Failed BBBB: KeyError" in out
+    assert "Processed 3 stations, 1 failed" in out
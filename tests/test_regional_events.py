@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ros_database.processing.regional_events import make_regional_events, neighbour_pairs
+
+# Stations A and B are about 110 km apart, C is far away
+COORDS = {"A": (65.0, -150.0), "B": (66.0, -150.0), "C": (60.0, 25.0)}
+
+
+def make_events(rows):
+    records = []
+    for station, start, hours in rows:
+        start = pd.Timestamp(start)
+        lat, lon = COORDS[station]
+        records.append({"station": station, "start": start,
+                        "end": start + pd.Timedelta(hours=hours - 1),
+                        "latitude": lat, "longitude": lon, "RA": hours, "FZRA": 0})
+    return pd.DataFrame(records)
+
+
+def test_neighbour_pairs():
+    lat, lon = zip(*COORDS.values())
+    pairs = neighbour_pairs(lat, lon, max_distance=200.)
+    np.testing.assert_array_equal(pairs, [[0, 1]])
+
+
+@pytest.mark.parametrize(
+    "rows,expected",
+    [
+        # A and B overlap, C is distant
+        ([("A", "2020-01-01 00:00", 3), ("B", "2020-01-01 02:00", 2),
+          ("C", "2020-01-01 01:00", 3)], [0, 1, 0]),
+        # A and B separated by more than the gap
+        ([("A", "2020-01-01 00:00", 1), ("B", "2020-01-01 12:00", 1)], [0, 1]),
+        # A and B linked through a chain of events
+        ([("A", "2020-01-01 00:00", 2), ("B", "2020-01-01 04:00", 4),
+          ("A", "2020-01-01 10:00", 1)], [0, 0, 0]),
+    ]
+)
+def test_cluster_events(rows, expected):
+    events, regional = make_regional_events(make_events(rows), max_distance=200.,
+                                            max_time_gap="3h")
+    assert events.regional_event.tolist() == expected
+    assert regional.nevent.sum() == len(rows)
@@ -0,0 +1,54 @@
+"""Tests for merging snow on ground from multiple sources"""
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from ros_database.processing.snow_on_ground import (merge_snow_on_ground,
+                                                    make_snow_on_ground,
+                                                    station_snow_on_ground)
+
+# Sources in priority order for four cases
+stack = np.array([
+    [1, -1, 0, -1],
+    [0, 0, 1, -1],
+    [0, 1, 1, -1],
+], dtype=np.int8)
+
+
+@pytest.mark.parametrize(
+    "rule, expected_sog, expected_source",
+    [
+        ("priority", [1, 0, 0, -1], [1, 2, 1, 0]),
+        ("consensus", [0, 0, 1, -1], [4, 2, 4, 0]),
+    ]
+)
+def test_merge_snow_on_ground(rule, expected_sog, expected_source):
+    sog, source = merge_snow_on_ground(stack, rule=rule)
+    np.testing.assert_array_equal(sog, expected_sog)
+    np.testing.assert_array_equal(source, expected_source)
+
+
+@pytest.mark.parametrize("rule", ["priority", "consensus"])
+def test_merge_snow_on_ground_single_source(rule):
+    # Only the third source is valid
+    single = np.array([[-1, -1], [-1, -1], [1, 0]], dtype=np.int8)
+    sog, source = merge_snow_on_ground(single, rule=rule)
+    np.testing.assert_array_equal(sog, [1, 0])
+    np.testing.assert_array_equal(source, [3, 3])
+
+
+def test_make_snow_on_ground():
+    days = pd.date_range("2020-01-01", periods=2, freq="D")
+    hours = pd.date_range("2020-01-01", periods=48, freq="h")
+    sources = {
+        "ims": pd.DataFrame({"A": [1, -1], "B": [0, 0]}, index=days, dtype=np.int8),
+        "era5_sd": pd.DataFrame({"A": np.zeros(48, dtype=np.int8)}, index=hours),
+    }
+    ds = make_snow_on_ground(sources)
+    assert ds.sog.shape == (48, 2)
+    sog = station_snow_on_ground(ds, "A", hours)
+    assert sog.iloc[:24].all()
+    assert not sog.iloc[24:].any()
+    assert (ds.sog_source.sel(station="A").values == np.repeat([1, 2], 24)).all()
+    assert (ds.sog_source.sel(station="B").values == 1).all()
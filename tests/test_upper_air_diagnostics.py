@@ -0,0 +1,82 @@
+"""Tests for upper air diagnostics"""
+import pytest
+
+import numpy as np
+import xarray as xr
+
+import ros_database.reanalysis.upper_air_diagnostics as diag
+
+# Heights (m) and pressures (hPa) for a four level profile from the bottom up
+height = np.array([0., 1000., 2000., 3000.])
+pressure = np.array([1000., 900., 800., 700.])
+
+
+@pytest.mark.parametrize(
+    "t, expected",
+    [
+        ([5., 1., -3., -10.], 1250.),  # single crossing
+        ([-5., 5., -5., -10.], 1500.),  # warm nose, highest crossing
+        ([-5., -6., -7., -10.], np.nan),  # below freezing
+        ([5., 4., 3., 2.], np.nan),  # above freezing
+    ]
+)
+def test_freezing_level_height(t, expected):
+    result = diag.freezing_level_height(np.array(t), height)
+    np.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize(
+    "t, expected",
+    [
+        ([5., 1., -3., -10.], 1250.),
+        ([-5., 5., -5., -10.], 1000.),
+        ([-5., -6., -7., -10.], 0.),
+        ([5., 4., 3., 2.], 3000.),
+    ]
+)
+def test_warm_layer_depth(t, expected):
+    result = diag.warm_layer_depth(np.array(t), height)
+    np.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize(
+    "t, expected",
+    [
+        ([5., 1., -3., -10.], False),
+        ([-5., 5., -5., -10.], True),
+        ([-5., -6., 1., -10.], True),
+        ([5., 4., 3., 2.], False),
+    ]
+)
+def test_warm_nose(t, expected):
+    assert diag.warm_nose(np.array(t)) == expected
+
+
+def test_precipitable_water():
+    q = np.full(4, 0.001)
+    expected = 0.001 * 300. * 100. / diag.G
+    np.testing.assert_allclose(diag.precipitable_water(q, pressure), expected)
+
+
+def test_profile_diagnostics_matches_profiles():
+    """Checks batched diagnostics match single profile calculations, with levels
+    stored top down"""
+    rng = np.random.default_rng(0)
+    ntime, nstation = 5, 3
+    t = rng.uniform(-10., 10., (ntime, nstation, len(pressure)))
+    dims = ("time", "station", "level")
+    coords = {"level": pressure[::-1]}
+    ta = xr.DataArray(t[..., ::-1] + diag.T0, dims=dims, coords=coords)
+    z = xr.DataArray(np.broadcast_to(height[::-1] * diag.G, t.shape), dims=dims, coords=coords)
+    q = xr.DataArray(np.full(t.shape, 0.001), dims=dims, coords=coords)
+
+    ds = diag.profile_diagnostics(ta.chunk({"time": 2}), z, q).compute()
+    for i in range(ntime):
+        for j in range(nstation):
+            np.testing.assert_allclose(ds.freezing_level_height[i, j],
+                                       diag.freezing_level_height(t[i, j], height),
+                                       rtol=1e-5)
+            np.testing.assert_allclose(ds.warm_layer_depth[i, j],
+                                       diag.warm_layer_depth(t[i, j], height),
+                                       rtol=1e-5)
+            assert ds.warm_nose[i, j] == diag.warm_nose(t[i, j])